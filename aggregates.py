@@ -0,0 +1,170 @@
+"""
+==============================================================================
+Athletic Nutrition Planner
+Running Totals
+
+Description:
+    Keeps running calorie and macro totals up to date as meals are logged,
+    so reports and deficit checks read one small record instead of adding
+    up every meal in the log each time they are shown.
+
+    final.py keeps one totals record per day in data["totals"].
+    nutrition_planner.py keeps the totals of daily_log.txt in
+    daily_totals.json, together with the size of the log they cover so
+    a log edited by hand is detected and re-added once.
+
+    Text logs are streamed (read_lines / read_meals): the file is read a
+    chunk at a time and parsed meals are handed out one by one, so a
+    report makes one pass over even a multi-gigabyte log in constant
+    memory. Malformed lines are skipped.
+==============================================================================
+"""
+
+import datetime
+import json
+import os
+
+MACROS = ("calories", "protein", "carbs", "fat")
+
+# Text logs are read READ_CHUNK bytes at a time; a line longer than
+# MAX_LINE bytes cannot be a meal and is dropped while it is read
+READ_CHUNK = 1024 * 1024
+MAX_LINE = 64 * 1024
+
+
+# ==========================================
+# Totals Records
+# ==========================================
+def today():
+    """Return today's date as YYYY-MM-DD (the key used for daily totals)."""
+    return datetime.date.today().isoformat()
+
+
+def new_totals():
+    """Return an empty totals record."""
+    return {"calories": 0, "protein": 0, "carbs": 0, "fat": 0, "meals": 0}
+
+
+def add_meal(totals, meal):
+    """Add one meal's calories and macros to a totals record."""
+    for key in MACROS:
+        totals[key] = totals[key] + meal[key]
+    totals["meals"] = totals["meals"] + 1
+
+
+def add_to_day(totals_by_day, day, meal):
+    """Add one meal to the totals record of the given day."""
+    if day not in totals_by_day:
+        totals_by_day[day] = new_totals()
+    add_meal(totals_by_day[day], meal)
+
+
+def day_totals(totals_by_day, day):
+    """Return the totals of a day (an empty record if nothing was logged)."""
+    if day in totals_by_day:
+        return totals_by_day[day]
+    return new_totals()
+
+
+def build_day_totals(log):
+    """Add up a whole log into per-day totals (used once for old data files)."""
+    # A columnar log can group its arrays directly
+    if hasattr(log, "totals_by_day"):
+        return log.totals_by_day()
+    totals_by_day = {}
+    for meal in log:
+        add_to_day(totals_by_day, meal["date"], meal)
+    return totals_by_day
+
+
+# ==========================================
+# Streaming a Text Log
+# ==========================================
+def read_lines(file, chunk_size=READ_CHUNK, max_line=MAX_LINE):
+    """
+    Yield the lines (bytes, without the newline) of a file opened in
+    binary mode, reading chunk_size bytes at a time. Lines longer than
+    max_line are skipped without ever being held whole.
+    """
+    tail = b""
+    skipping = False
+    while True:
+        chunk = file.read(chunk_size)
+        if not chunk:
+            break
+        lines = chunk.split(b"\n")
+        first = 0
+        if skipping:
+            if len(lines) == 1:
+                # Still inside the over-long line
+                continue
+            first = 1
+            skipping = False
+        else:
+            lines[0] = tail + lines[0]
+        tail = lines.pop()
+        for i in range(first, len(lines)):
+            if len(lines[i]) <= max_line:
+                yield lines[i]
+        if len(tail) > max_line:
+            tail = b""
+            skipping = True
+    if len(tail) > 0 and not skipping:
+        yield tail
+
+
+def read_meals(file, parse_line):
+    """
+    Yield the meals of a text log opened in binary mode, one at a time.
+    parse_line turns a line into a meal dict, or None for a malformed line,
+    which is skipped; bytes that are not valid UTF-8 are replaced.
+    """
+    for line in read_lines(file):
+        meal = parse_line(line.decode("utf-8", "replace"))
+        if meal is not None:
+            yield meal
+
+
+# ==========================================
+# Saved Totals for a Text Log
+# ==========================================
+def load_log_totals(totals_path, log_path, parse_line):
+    """
+    Return the saved totals of a text log, or None if the log is missing.
+
+    If the saved totals do not cover exactly the current log file, the
+    log is read once with parse_line (line -> meal dict or None) and the
+    totals are saved again.
+    """
+    if not os.path.exists(log_path):
+        return None
+    log_size = os.path.getsize(log_path)
+
+    try:
+        with open(totals_path, "r") as file:
+            saved = json.load(file)
+        if saved["log_size"] == log_size:
+            return saved
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+
+    saved = {"log_size": 0, "totals": new_totals()}
+    with open(log_path, "rb") as file:
+        for meal in read_meals(file, parse_line):
+            add_meal(saved["totals"], meal)
+        saved["log_size"] = file.tell()
+    save_log_totals(totals_path, saved)
+    return saved
+
+
+def save_log_totals(totals_path, saved):
+    """Write the totals of a text log back to disk."""
+    try:
+        # Replace the file in one step so readers never see half of it
+        temp_path = totals_path + ".tmp"
+        with open(temp_path, "w") as file:
+            json.dump(saved, file)
+        os.replace(temp_path, totals_path)
+    except OSError:
+        # The totals can always be rebuilt from the log
+        print("Warning: Could not save daily totals.")
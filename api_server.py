@@ -0,0 +1,294 @@
+"""
+==============================================================================
+Athletic Nutrition Planner
+HTTP/JSON API Server
+
+Description:
+    A small local HTTP server (asyncio, standard library only) that lets
+    many clients use one shared planner store at the same time (see
+    planner_service.py).
+
+    All requests run on one event loop. A change is checked against the
+    store, written to disk in a worker thread and only then applied to
+    memory on the loop, all while holding a lock for that athlete (one
+    lock for the shared foods). Writes for one athlete happen in order
+    while other athletes keep going, and a change that cannot be written
+    leaves memory as it was. Reads never wait for a lock: they see every
+    change that has been applied, never one still being written.
+
+Endpoints (request and response bodies are JSON):
+    GET    /foods?q=TEXT&limit=N           search foods (all foods if no q)
+    POST   /foods                          {"name", "protein", "carbs", "fat"} (409 if taken)
+    GET    /athletes/NAME/goals
+    PUT    /athletes/NAME/goals            {"mode", "calories"}
+    POST   /athletes/NAME/meals            {"food", "portion", "date" (optional)}
+    DELETE /athletes/NAME/meals?date=DAY   clear a day (default today)
+    GET    /athletes/NAME/report?date=DAY  meals, totals, goals (default today)
+    GET    /athletes/NAME/trends?date=DAY  7/28/90-day averages, adherence, weekly trend
+    GET    /athletes/NAME/plan?items=N&max_grams=G&exclude=A,B
+                                           portions that fill the rest of today
+    GET    /metrics?format=prometheus      call counts, timings and I/O of the hot
+                                           paths (JSON by default; see metrics.py)
+
+Usage:
+    python api_server.py [--host HOST] [--port PORT] [--team-dir DIR] [--metrics FILE]
+==============================================================================
+"""
+
+import asyncio
+import json
+import sqlite3
+import sys
+from urllib.parse import parse_qs, unquote, urlsplit
+
+import meal_optimizer
+import metrics
+import planner_service
+
+HOST = "127.0.0.1"
+PORT = 8080
+MAX_BODY = 1024 * 1024
+
+REASONS = {200: "OK", 201: "Created", 400: "Bad Request", 404: "Not Found",
+           405: "Method Not Allowed", 409: "Conflict", 413: "Payload Too Large",
+           500: "Internal Server Error"}
+
+
+class HttpError(Exception):
+    """An error response (status code and message)."""
+
+    def __init__(self, status, message):
+        Exception.__init__(self, message)
+        self.status = status
+
+
+# ==========================================
+# Writes
+# ==========================================
+_locks = {}
+
+
+def get_lock(record):
+    """Return the lock for the athlete a change belongs to (or the foods lock)."""
+    key = record["athlete"] or ""
+    if key not in _locks:
+        _locks[key] = asyncio.Lock()
+    return _locks[key]
+
+
+async def commit(store, record):
+    """Check a change, write it to disk, then apply it in memory, one change at a time per athlete."""
+    async with get_lock(record):
+        # Checked under the lock: an earlier change may have been waiting to be written
+        try:
+            planner_service.check_change(store, record)
+        except ValueError as error:
+            raise HttpError(409, str(error))
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.run_in_executor(None, planner_service.persist_change, store, record)
+        except (OSError, sqlite3.Error) as error:
+            raise HttpError(500, "Could not save data: " + str(error))
+        planner_service.apply_change(store, record)
+    return record
+
+
+# ==========================================
+# Routing
+# ==========================================
+async def route(store, method, path, query, body):
+    """Return (status, response dictionary or text) for one request."""
+    parts = [unquote(part) for part in path.strip("/").split("/")]
+
+    if parts == ["metrics"]:
+        if method != "GET":
+            raise HttpError(405, "Use GET.")
+        if query.get("format") == "prometheus":
+            return 200, metrics.to_prometheus()
+        return 200, {"enabled": metrics.enabled(), "metrics": metrics.snapshot()}
+
+    if parts == ["foods"]:
+        if method == "GET":
+            limit = int(query.get("limit", "10"))
+            return 200, {"foods": planner_service.find_foods(store, query.get("q", ""), limit)}
+        if method == "POST":
+            record = planner_service.food_change(store, body.get("name", ""), body.get("protein"),
+                                                 body.get("carbs"), body.get("fat"))
+            return 201, {"food": (await commit(store, record))["food"]}
+        raise HttpError(405, "Use GET or POST.")
+
+    if len(parts) != 3 or parts[0] != "athletes":
+        raise HttpError(404, "Unknown path: " + path)
+    athlete = parts[1]
+
+    if parts[2] == "goals":
+        if method == "GET":
+            return 200, {"goals": planner_service.get_goals(store, athlete)}
+        if method == "PUT":
+            record = planner_service.goals_change(store, athlete, body.get("mode"), body.get("calories"))
+            return 200, {"goals": (await commit(store, record))["goals"]}
+        raise HttpError(405, "Use GET or PUT.")
+
+    if parts[2] == "meals":
+        if method == "POST":
+            record = planner_service.meal_change(store, athlete, body.get("food"), body.get("portion"),
+                                                 body.get("date"))
+            return 201, {"entry": (await commit(store, record))["entry"]}
+        if method == "DELETE":
+            record = planner_service.reset_change(store, athlete, query.get("date"))
+            await commit(store, record)
+            return 200, {"cleared": record["date"]}
+        raise HttpError(405, "Use POST or DELETE.")
+
+    if parts[2] == "report":
+        if method == "GET":
+            return 200, planner_service.get_report(store, athlete, query.get("date"))
+        raise HttpError(405, "Use GET.")
+
+    if parts[2] == "trends":
+        if method == "GET":
+            return 200, planner_service.get_trends(store, athlete, query.get("date"))
+        raise HttpError(405, "Use GET.")
+
+    if parts[2] == "plan":
+        if method == "GET":
+            exclude = [name for name in query.get("exclude", "").split(",") if name.strip() != ""]
+            return 200, planner_service.get_plan(store, athlete,
+                                                 query.get("items", meal_optimizer.MAX_ITEMS),
+                                                 query.get("max_grams", meal_optimizer.MAX_GRAMS), exclude)
+        raise HttpError(405, "Use GET.")
+
+    raise HttpError(404, "Unknown path: " + path)
+
+
+async def respond(store, method, target, body_bytes):
+    """Run one request and return (status, response dictionary)."""
+    url = urlsplit(target)
+    query = {}
+    for key, values in parse_qs(url.query).items():
+        query[key] = values[0]
+    try:
+        body = {}
+        if len(body_bytes) > 0:
+            body = json.loads(body_bytes)
+            if not isinstance(body, dict):
+                raise ValueError("Request body must be a JSON object.")
+        return await route(store, method, url.path, query, body)
+    except HttpError as error:
+        return error.status, {"error": str(error)}
+    except ValueError as error:
+        return 400, {"error": str(error)}
+    except (OSError, sqlite3.Error) as error:
+        return 500, {"error": "Could not read data: " + str(error)}
+
+
+# ==========================================
+# HTTP Connection Handling
+# ==========================================
+async def read_request(reader):
+    """Read one request; return (method, target, headers, body) or None at end of stream."""
+    line = await reader.readline()
+    if not line:
+        return None
+    try:
+        method, target, version = line.decode("latin-1").split()
+    except ValueError:
+        raise HttpError(400, "Malformed request line.")
+
+    headers = {"version": version}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+
+    try:
+        length = int(headers.get("content-length", "0"))
+    except ValueError:
+        raise HttpError(400, "Bad Content-Length.")
+    if length > MAX_BODY:
+        raise HttpError(413, "Request body is too large.")
+    body = await reader.readexactly(length)
+    return method.upper(), target, headers, body
+
+
+def write_response(writer, status, payload, keep_alive):
+    """Send a response: JSON for a dictionary, plain text for a string."""
+    content_type = "application/json"
+    if isinstance(payload, str):
+        body = payload.encode("utf-8")
+        content_type = "text/plain; version=0.0.4"
+    else:
+        body = json.dumps(payload).encode("utf-8")
+    head = ("HTTP/1.1 " + str(status) + " " + REASONS.get(status, "") + "\r\n"
+            "Content-Type: " + content_type + "\r\n"
+            "Content-Length: " + str(len(body)) + "\r\n"
+            "Connection: " + ("keep-alive" if keep_alive else "close") + "\r\n\r\n")
+    writer.write(head.encode("latin-1") + body)
+
+
+async def handle_client(store, reader, writer):
+    """Serve requests on one connection until the client closes it."""
+    try:
+        while True:
+            try:
+                request = await read_request(reader)
+            except HttpError as error:
+                write_response(writer, error.status, {"error": str(error)}, False)
+                break
+            if request is None:
+                break
+            method, target, headers, body = request
+            keep_alive = (headers.get("connection", "").lower() != "close"
+                          and headers["version"] != "HTTP/1.0")
+
+            status, payload = await respond(store, method, target, body)
+            write_response(writer, status, payload, keep_alive)
+            await writer.drain()
+            if not keep_alive:
+                break
+    except (ConnectionError, asyncio.IncompleteReadError):
+        pass
+    finally:
+        writer.close()
+
+
+async def serve(store, host=HOST, port=PORT, ready=None):
+    """Serve forever; ready(port) is called once the server is listening."""
+    server = await asyncio.start_server(lambda reader, writer: handle_client(store, reader, writer),
+                                        host, port)
+    if ready is not None:
+        ready(server.sockets[0].getsockname()[1])
+    async with server:
+        await server.serve_forever()
+
+
+# ==========================================
+# Command Line
+# ==========================================
+def main(args):
+    args = metrics.configure(args)
+    options = {"--host": HOST, "--port": str(PORT), "--team-dir": None}
+    i = 0
+    while i < len(args):
+        if args[i] not in options or i + 1 == len(args):
+            print("Usage: python api_server.py [--host HOST] [--port PORT] [--team-dir DIR]")
+            return 2
+        options[args[i]] = args[i + 1]
+        i += 2
+
+    store = planner_service.open_store(options["--team-dir"])
+
+    def ready(port):
+        print("Serving on http://" + options["--host"] + ":" + str(port), flush=True)
+
+    try:
+        asyncio.run(serve(store, options["--host"], int(options["--port"]), ready))
+    except KeyboardInterrupt:
+        print("Stopped.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
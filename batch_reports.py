@@ -0,0 +1,294 @@
+"""
+==============================================================================
+Athletic Nutrition Planner
+Team Batch Reports
+
+Description:
+    Writes the daily report of every athlete in the team storage (or the
+    SQLite database when final.STORAGE is "sqlite") to an output folder,
+    spread over all CPU cores with a process pool.
+
+    The main process only lists the athletes. Each worker loads one
+    athlete at a time (goals, the report day's meals and the rollups -
+    see rollups.py), renders the reports, writes that athlete's files and
+    sends back one small CSV row, so memory stays flat however big the
+    team is. Rows are written to summary.csv as they arrive, and progress
+    and throughput are printed while the batch runs.
+
+    Athletes are handed out in chunks (--chunk) to keep the cost of
+    passing work between processes small next to the work itself, so the
+    throughput grows roughly with the number of workers until the disk
+    becomes the limit. An athlete that cannot be read is reported and
+    skipped; the rest of the batch keeps going.
+
+Output layout (--out, default reports/):
+    reports/
+    ├── <athlete>.txt      # text report, like View Report + View Trends
+    ├── <athlete>.json     # build_report + trend_report as JSON
+    └── summary.csv        # one row per athlete (in the order they finished)
+
+Usage:
+    python batch_reports.py [--team-dir DIR] [--out DIR] [--date YYYY-MM-DD]
+                            [--formats text,json,csv] [--workers N] [--chunk N]
+==============================================================================
+"""
+
+import csv
+import datetime
+import json
+import multiprocessing
+import os
+import sqlite3
+import sys
+import time
+
+import aggregates
+import final
+import metrics
+import partitions
+import rollups
+import sqlite_store
+
+OUT_DIR = "reports"
+FORMATS = ("text", "json", "csv")
+CHUNK = 16
+
+# Seconds between progress lines
+PROGRESS_EVERY = 1.0
+
+CSV_FIELDS = ["athlete", "date", "mode", "meals", "calories", "protein", "carbs", "fat",
+              "goal_calories", "goal_protein", "goal_carbs", "goal_fat", "remaining",
+              "avg7_calories", "avg28_calories", "avg90_calories", "adherence28_calories"]
+
+USAGE = ("Usage: python batch_reports.py [--team-dir DIR] [--out DIR] [--date YYYY-MM-DD]\n"
+         "                               [--formats text,json,csv] [--workers N] [--chunk N]")
+
+
+# ==========================================
+# Athletes
+# ==========================================
+def list_athletes():
+    """Return the keys of every athlete in the configured storage."""
+    if final.STORAGE == "sqlite":
+        return sqlite_store.list_athletes(final.get_db())
+    return partitions.list_athletes(final.TEAM_DIR)
+
+
+def load_athlete(athlete, day):
+    """Return a final.py style data dictionary with one athlete's goals and day."""
+    if final.STORAGE == "sqlite":
+        db = final.get_db()
+        goals = sqlite_store.load_goals(db, athlete, final.DEFAULT_GOALS)
+        log = sqlite_store.load_day(db, athlete, day)
+    else:
+        goals = partitions.load_goals(final.TEAM_DIR, athlete, final.DEFAULT_GOALS)
+        log = partitions.read_day(final.TEAM_DIR, athlete, day)
+    return {"athlete": athlete, "log": log, "goals": goals,
+            "totals": aggregates.build_day_totals(log)}
+
+
+# ==========================================
+# Rendering
+# ==========================================
+def render_text(athlete, report, trends):
+    """Return an athlete's report as text."""
+    goals = report["goals"]
+    totals = report["totals"]
+    lines = ["=== " + athlete + " - " + report["date"] + " ===",
+             "Mode: " + str(goals["mode"]),
+             ""]
+    if totals["meals"] == 0:
+        lines.append("No meals logged.")
+    else:
+        lines.append("Meals logged:")
+        for meal in report["meals"]:
+            lines.append("  " + meal["name"] + " (" + str(meal["portion"]) + "g): "
+                         + str(meal["calories"]) + " cal")
+        lines.append("")
+        lines.append("Calories: " + str(round(totals["calories"])) + " / " + str(goals["calories"]))
+        for key in aggregates.MACROS[1:]:
+            lines.append((key.capitalize() + ":").ljust(10) + str(round(totals[key], 1)) + "g / "
+                         + str(goals[key]) + "g")
+        if report["remaining"] > 0:
+            lines.append("Deficit: " + str(round(report["remaining"])) + " calories remaining")
+        else:
+            lines.append("Surplus: " + str(abs(round(report["remaining"]))) + " calories over target")
+
+    lines.append("")
+    for window in trends["windows"]:
+        lines.append("Last " + str(window["days"]) + " days: " + str(window["logged_days"])
+                     + " logged, " + str(window["average"]["calories"]) + " cal a day, calories on target "
+                     + str(window["adherence"]["calories"]) + "% of days")
+    change = trends["trend"]["per_week"]
+    lines.append("Trend per week: " + str(change["calories"]) + " cal, " + str(change["protein"])
+                 + "g protein")
+    return "\n".join(lines) + "\n"
+
+
+def csv_row(athlete, report, trends):
+    """Return an athlete's summary.csv row (see CSV_FIELDS)."""
+    goals = report["goals"]
+    totals = report["totals"]
+    windows = trends["windows"]
+    return [athlete, report["date"], goals["mode"], totals["meals"], round(totals["calories"]),
+            round(totals["protein"], 1), round(totals["carbs"], 1), round(totals["fat"], 1),
+            goals["calories"], goals["protein"], goals["carbs"], goals["fat"], round(report["remaining"]),
+            windows[0]["average"]["calories"], windows[1]["average"]["calories"],
+            windows[2]["average"]["calories"], windows[1]["adherence"]["calories"]]
+
+
+# ==========================================
+# Workers
+# ==========================================
+def init_worker(team_dir, storage, database):
+    """Give a worker process the main process's storage settings."""
+    final.TEAM_DIR = team_dir
+    final.STORAGE = storage
+    final.DATABASE = database
+    # Never share a database connection with the parent process
+    final._db = None
+
+
+def report_athlete(job):
+    """
+    Load, render and write one athlete's reports.
+
+    job is (athlete, day, out_dir, formats); returns (athlete, CSV row or
+    None, error message or None).
+    """
+    athlete, day, out_dir, formats = job
+    try:
+        data = load_athlete(athlete, day)
+        report = final.build_report(data, day)
+        trends = rollups.trend_report(final.get_rollups(data), data["goals"], day)
+        if "text" in formats:
+            with open(os.path.join(out_dir, athlete + ".txt"), "w") as file:
+                file.write(render_text(athlete, report, trends))
+        if "json" in formats:
+            with open(os.path.join(out_dir, athlete + ".json"), "w") as file:
+                json.dump({"athlete": athlete, "report": report, "trends": trends}, file)
+        return athlete, csv_row(athlete, report, trends), None
+    except (OSError, ValueError, KeyError, TypeError, sqlite3.Error) as error:
+        # Report it and keep the batch going
+        return athlete, None, str(error)
+
+
+# ==========================================
+# Batch
+# ==========================================
+def run_batch(athletes, day, out_dir=OUT_DIR, formats=FORMATS, workers=None, chunk=CHUNK,
+              progress=print):
+    """
+    Write the reports of athletes (any iterable of athlete keys) for a day.
+
+    workers defaults to the number of CPU cores; with 1 worker everything
+    runs in this process. Returns {"athletes", "errors", "seconds", "per_second"}.
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    os.makedirs(out_dir, exist_ok=True)
+    athletes = list(athletes)
+    jobs = ((athlete, day, out_dir, tuple(formats)) for athlete in athletes)
+
+    summary = None
+    writer = None
+    if "csv" in formats:
+        summary = open(os.path.join(out_dir, "summary.csv"), "w", newline="")
+        writer = csv.writer(summary)
+        writer.writerow(CSV_FIELDS)
+
+    pool = None
+    if workers > 1:
+        pool = multiprocessing.Pool(workers, init_worker,
+                                    (final.TEAM_DIR, final.STORAGE, final.DATABASE))
+        results = pool.imap_unordered(report_athlete, jobs, chunksize=max(1, chunk))
+    else:
+        results = map(report_athlete, jobs)
+
+    start = time.perf_counter()
+    last_progress = start
+    done = 0
+    errors = 0
+    try:
+        for athlete, row, error in results:
+            done += 1
+            if error is not None:
+                errors += 1
+                progress("Error: " + athlete + ": " + error)
+            elif writer is not None:
+                writer.writerow(row)
+
+            now = time.perf_counter()
+            if now - last_progress >= PROGRESS_EVERY:
+                last_progress = now
+                progress("  " + str(done) + "/" + str(len(athletes)) + " athletes ("
+                         + str(round(done * 100 / len(athletes))) + "%), "
+                         + str(round(done / (now - start))) + " per second")
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+        if summary is not None:
+            summary.close()
+
+    seconds = time.perf_counter() - start
+    return {"athletes": done, "errors": errors, "seconds": seconds,
+            "per_second": done / seconds if seconds > 0 else 0.0}
+
+
+# ==========================================
+# Command Line
+# ==========================================
+def main(args):
+    args = metrics.configure(args)
+    options = {"--team-dir": final.TEAM_DIR, "--out": OUT_DIR, "--date": aggregates.today(),
+               "--formats": ",".join(FORMATS), "--workers": str(os.cpu_count() or 1),
+               "--chunk": str(CHUNK)}
+    i = 0
+    while i < len(args):
+        if args[i] not in options or i + 1 == len(args):
+            print(USAGE)
+            return 2
+        options[args[i]] = args[i + 1]
+        i += 2
+
+    formats = [name.strip() for name in options["--formats"].split(",") if name.strip() != ""]
+    try:
+        day = datetime.date.fromisoformat(options["--date"]).isoformat()
+        workers = int(options["--workers"])
+        chunk = int(options["--chunk"])
+        for name in formats:
+            if name not in FORMATS:
+                raise ValueError("unknown format " + name)
+        if workers < 1 or chunk < 1:
+            raise ValueError("workers and chunk must be at least 1")
+    except ValueError as error:
+        print("Error: " + str(error))
+        print(USAGE)
+        return 2
+
+    final.TEAM_DIR = options["--team-dir"]
+    athletes = list_athletes()
+    if final.STORAGE == "sqlite":
+        # Workers open their own connections
+        final.get_db().close()
+        final._db = None
+    if len(athletes) == 0:
+        print("No athletes found.")
+        return 0
+
+    print("Writing " + day + " reports for " + str(len(athletes)) + " athletes to "
+          + options["--out"] + " with " + str(workers) + " worker(s)")
+    try:
+        stats = run_batch(athletes, day, options["--out"], formats, workers, chunk)
+    except OSError as error:
+        print("Error: Could not write reports: " + str(error))
+        return 1
+    print("Done: " + str(stats["athletes"] - stats["errors"]) + " reports, "
+          + str(stats["errors"]) + " errors in " + str(round(stats["seconds"], 2)) + "s ("
+          + str(round(stats["per_second"])) + " athletes per second)")
+    return 0 if stats["errors"] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
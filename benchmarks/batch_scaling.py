@@ -0,0 +1,98 @@
+"""
+==============================================================================
+Athletic Nutrition Planner
+Batch Report Scaling
+
+Description:
+    Writes a synthetic team (--athletes athletes with --meals meals each,
+    spread back from today) into a temporary folder, then runs
+    batch_reports.py over it with 1, 2, 4, ... workers up to the number
+    of CPU cores and prints the reports per second and the speed-up over
+    one worker.
+
+    The first run also builds every athlete's rollup files, so it is
+    repeated untimed before the measured runs.
+
+Usage:
+    python benchmarks/batch_scaling.py [--athletes N] [--meals N]
+                                       [--workers N,N,...] [--formats LIST]
+==============================================================================
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import aggregates
+import batch_reports
+import final
+import partitions
+import synthetic
+
+FOOD_COUNT = 200
+
+
+def write_team(root, athlete_count, meal_count):
+    """Write athlete_count athletes with goals and meal_count meals each."""
+    for i in range(athlete_count):
+        athlete = "athlete_" + str(i)
+        partitions.save_goals(root, athlete, dict(final.DEFAULT_GOALS))
+        partitions.append_meals(root, athlete,
+                                list(synthetic.make_log(meal_count, FOOD_COUNT, synthetic.SEED + i)))
+
+
+def default_workers():
+    counts = []
+    count = 1
+    while count < (os.cpu_count() or 1):
+        counts.append(count)
+        count *= 2
+    counts.append(os.cpu_count() or 1)
+    return counts
+
+
+def main(args):
+    options = {"--athletes": "2000", "--meals": "300", "--workers": None, "--formats": "text,json,csv"}
+    i = 0
+    while i < len(args):
+        if args[i] not in options or i + 1 == len(args):
+            print("Usage: python benchmarks/batch_scaling.py [--athletes N] [--meals N] "
+                  "[--workers N,N,...] [--formats LIST]")
+            return 2
+        options[args[i]] = args[i + 1]
+        i += 2
+    workers = default_workers()
+    if options["--workers"] is not None:
+        workers = [int(count) for count in options["--workers"].split(",")]
+    formats = options["--formats"].split(",")
+
+    folder = tempfile.mkdtemp(prefix="nutrition_batch_")
+    try:
+        final.TEAM_DIR = os.path.join(folder, "team_data")
+        out_dir = os.path.join(folder, "reports")
+        print("Writing " + options["--athletes"] + " athletes with " + options["--meals"] + " meals each...")
+        write_team(final.TEAM_DIR, int(options["--athletes"]), int(options["--meals"]))
+        athletes = partitions.list_athletes(final.TEAM_DIR)
+        day = aggregates.today()
+        batch_reports.run_batch(athletes, day, out_dir, formats, max(workers), progress=lambda line: None)
+
+        print(f"{'workers':>8}{'athletes':>10}{'seconds':>10}{'per sec':>10}{'speed-up':>10}")
+        base = None
+        for count in workers:
+            stats = batch_reports.run_batch(athletes, day, out_dir, formats, count,
+                                            progress=lambda line: None)
+            if base is None:
+                base = stats["per_second"]
+            print(f"{count:>8}{stats['athletes']:>10}{stats['seconds']:>10.2f}"
+                  f"{stats['per_second']:>10.0f}{stats['per_second'] / base:>10.2f}")
+    finally:
+        shutil.rmtree(folder)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,159 @@
+"""
+==============================================================================
+Athletic Nutrition Planner
+API Load Test
+
+Description:
+    Starts api_server.py on a free port with an empty team folder, then
+    runs 1, 8 and 64 concurrent clients against it for a fixed time and
+    prints the requests per second and latency percentiles of each run.
+
+    Every client keeps one connection open and sends report reads and
+    meal writes (--write-percent of the requests) for its own athlete,
+    with 16 athletes shared by all clients. The clients run in one
+    process, so at high concurrency they can be the bottleneck rather
+    than the server.
+
+Usage:
+    python benchmarks/load_test.py [--clients N,N,...] [--seconds S]
+                                   [--write-percent P] [--output FILE]
+==============================================================================
+"""
+
+import asyncio
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ATHLETES = 16
+
+
+# ==========================================
+# Server Process
+# ==========================================
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(team_dir, port):
+    """Start api_server.py and wait until it accepts connections."""
+    server = subprocess.Popen([sys.executable, os.path.join(ROOT, "api_server.py"),
+                               "--port", str(port), "--team-dir", team_dir],
+                              stdout=subprocess.DEVNULL)
+    deadline = time.monotonic() + 10
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.2).close()
+            return server
+        except OSError:
+            time.sleep(0.05)
+    server.kill()
+    raise RuntimeError("api_server.py did not start")
+
+
+# ==========================================
+# Clients
+# ==========================================
+async def request(reader, writer, method, path, payload=None):
+    """Send one request on an open connection and return (status, body)."""
+    body = b"" if payload is None else json.dumps(payload).encode("utf-8")
+    head = (method + " " + path + " HTTP/1.1\r\nHost: localhost\r\n"
+            "Content-Type: application/json\r\nContent-Length: " + str(len(body)) + "\r\n\r\n")
+    writer.write(head.encode("latin-1") + body)
+
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line == b"\r\n":
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        if name.lower() == "content-length":
+            length = int(value)
+    return status, await reader.readexactly(length)
+
+
+async def client(port, number, stop_at, write_percent, latencies, errors):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    rng = random.Random(number)
+    athlete = "/athletes/athlete-" + str(number % ATHLETES)
+    while time.perf_counter() < stop_at:
+        start = time.perf_counter()
+        if rng.randrange(100) < write_percent:
+            status, body = await request(reader, writer, "POST", athlete + "/meals",
+                                         {"food": "Eggs", "portion": 100})
+        else:
+            status, body = await request(reader, writer, "GET", athlete + "/report")
+        latencies.append(time.perf_counter() - start)
+        if status >= 400:
+            errors.append(status)
+    writer.close()
+
+
+async def run_clients(port, count, seconds, write_percent):
+    latencies = []
+    errors = []
+    started = time.perf_counter()
+    await asyncio.gather(*[client(port, i, started + seconds, write_percent, latencies, errors)
+                           for i in range(count)])
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "clients": count,
+        "requests": len(latencies),
+        "errors": len(errors),
+        "requests_per_sec": len(latencies) / elapsed,
+        "p50_ms": latencies[len(latencies) // 2] * 1000,
+        "p99_ms": latencies[int(len(latencies) * 0.99)] * 1000
+    }
+
+
+# ==========================================
+# Command Line
+# ==========================================
+def main(args):
+    options = {"--clients": "1,8,64", "--seconds": "5", "--write-percent": "20", "--output": None}
+    i = 0
+    while i < len(args):
+        if args[i] not in options or i + 1 == len(args):
+            print("Usage: python benchmarks/load_test.py [--clients N,N,...] [--seconds S] "
+                  "[--write-percent P] [--output FILE]")
+            return 2
+        options[args[i]] = args[i + 1]
+        i += 2
+
+    team_dir = tempfile.mkdtemp(prefix="nutrition_load_")
+    port = free_port()
+    server = start_server(team_dir, port)
+    results = []
+    try:
+        print(f"{'clients':>8}{'requests':>10}{'errors':>8}{'req/s':>10}{'p50 ms':>9}{'p99 ms':>9}")
+        for count in options["--clients"].split(","):
+            result = asyncio.run(run_clients(port, int(count), float(options["--seconds"]),
+                                             int(options["--write-percent"])))
+            print(f"{result['clients']:>8}{result['requests']:>10}{result['errors']:>8}"
+                  f"{result['requests_per_sec']:>10.0f}{result['p50_ms']:>9.2f}{result['p99_ms']:>9.2f}")
+            results.append(result)
+    finally:
+        server.terminate()
+        server.wait()
+        shutil.rmtree(team_dir)
+
+    if options["--output"] is not None:
+        with open(options["--output"], "w") as file:
+            json.dump({"write_percent": int(options["--write-percent"]), "results": results}, file, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
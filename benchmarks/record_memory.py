@@ -0,0 +1,79 @@
+"""
+==============================================================================
+Athletic Nutrition Planner
+Record Memory
+
+Description:
+    Measures how many bytes one meal entry, one food and one set of goals
+    take in memory with each final.py LOG_BACKEND: dictionaries ("list"),
+    __slots__ records ("records", see records.py) and, for meals, typed
+    arrays ("columnar", see columnar_log.py).
+
+    The entries are parsed from JSON first, like a real start-up, so
+    every dictionary has its own copy of each food name and date. Memory
+    is measured with tracemalloc and includes the list holding them.
+
+Usage:
+    python benchmarks/record_memory.py [--meals N] [--foods N]
+==============================================================================
+"""
+
+import json
+import os
+import sys
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import columnar_log
+import final
+import records
+import synthetic
+
+
+def measure(build, text):
+    """Return the bytes still allocated after building a value from JSON text."""
+    tracemalloc.start()
+    value = build(json.loads(text))
+    used = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del value
+    return used
+
+
+def main(args):
+    options = {"--meals": "200000", "--foods": "20000"}
+    i = 0
+    while i < len(args):
+        if args[i] not in options or i + 1 == len(args):
+            print("Usage: python benchmarks/record_memory.py [--meals N] [--foods N]")
+            return 2
+        options[args[i]] = args[i + 1]
+        i += 2
+    meal_count = int(options["--meals"])
+    food_count = int(options["--foods"])
+
+    meals = json.dumps(list(synthetic.make_log(meal_count, food_count)))
+    foods = json.dumps(list(synthetic.make_foods(food_count)))
+    goals = json.dumps([final.DEFAULT_GOALS] * food_count)
+
+    rows = [
+        ("meal", "list", meal_count, measure(lambda value: value, meals)),
+        ("meal", "records", meal_count, measure(lambda value: records.RecordList(records.MealEntry, value), meals)),
+        ("meal", "columnar", meal_count, measure(columnar_log.ColumnarLog, meals)),
+        ("food", "list", food_count, measure(lambda value: value, foods)),
+        ("food", "records", food_count, measure(lambda value: records.RecordList(records.Food, value), foods)),
+        ("goals", "list", food_count, measure(lambda value: value, goals)),
+        ("goals", "records", food_count, measure(lambda value: [records.Goals.from_dict(item) for item in value], goals)),
+    ]
+
+    print("Python " + sys.version.split()[0])
+    print(f"{'record':<8}{'backend':<10}{'count':>10}{'MB':>10}{'bytes each':>12}")
+    for kind, backend, count, used in rows:
+        print(f"{kind:<8}{backend:<10}{count:>10}{used / 1e6:>10.1f}{used / count:>12.0f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
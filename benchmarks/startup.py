@@ -0,0 +1,79 @@
+"""
+==============================================================================
+Athletic Nutrition Planner
+Start-up Benchmark
+
+Description:
+    Times final.load_data on a synthetic data file, once with a cold
+    start (JSON parse, cache rebuilt) and once with a warm start (cache
+    valid, foods and log not read yet), and prints the median of each.
+
+Usage:
+    python benchmarks/startup.py [--foods N] [--meals N] [--runs N] [--max-warm-ms MS]
+
+    With --max-warm-ms the script exits with status 1 when the warm
+    start is slower than MS milliseconds.
+==============================================================================
+"""
+
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import final
+import synthetic
+
+
+def time_load(runs, cold):
+    """Return load_data timings in milliseconds."""
+    timings = []
+    for i in range(runs):
+        if cold and os.path.exists(final.CACHE_FILE):
+            os.remove(final.CACHE_FILE)
+        start = time.perf_counter()
+        final.load_data()
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def main(args):
+    options = {"--foods": 10000, "--meals": 200000, "--runs": 5, "--max-warm-ms": None}
+    i = 0
+    while i < len(args):
+        if args[i] not in options or i + 1 == len(args):
+            print("Usage: python benchmarks/startup.py [--foods N] [--meals N] [--runs N] [--max-warm-ms MS]")
+            return 2
+        options[args[i]] = float(args[i + 1])
+        i += 2
+
+    folder = tempfile.mkdtemp(prefix="nutrition_startup_")
+    old_dir = os.getcwd()
+    os.chdir(folder)
+    try:
+        size = synthetic.write_data_file(final.DATA_FILE, int(options["--foods"]), int(options["--meals"]),
+                                         final.DEFAULT_GOALS)
+
+        cold = time_load(int(options["--runs"]), True)
+        warm = time_load(int(options["--runs"]), False)
+    finally:
+        os.chdir(old_dir)
+        shutil.rmtree(folder)
+
+    print("Data file: " + str(size // 1024) + " KB")
+    print("Cold start: " + str(round(statistics.median(cold), 2)) + " ms (median)")
+    print("Warm start: " + str(round(statistics.median(warm), 2)) + " ms (median)")
+
+    limit = options["--max-warm-ms"]
+    if limit is not None and statistics.median(warm) > limit:
+        print("Error: Warm start is slower than " + str(limit) + " ms")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
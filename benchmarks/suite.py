@@ -0,0 +1,405 @@
+"""
+==============================================================================
+Athletic Nutrition Planner
+Benchmark Suite
+
+Description:
+    Times the hot paths of both programs on synthetic data:
+
+        calculateCalories - nutrition_planner.py, one food lookup + log write
+        log_meal          - final.py, search + select + journal one meal
+        save_data         - final.py, write the whole data file
+        load_data (cold)  - final.py, parse the JSON file (no start-up cache)
+        load_data (warm)  - final.py, start from the start-up cache
+        view_report       - final.py, today's report
+        plan_meals        - final.py, plan three foods for the rest of today
+        view_trends       - final.py, 7/28/90-day averages and weekly trend
+        daily_nutrition   - nutrition_planner.py, list and add up the daily log
+
+    Lookups, logging and meal plans are run against catalogs of every
+    --foods size; saving, loading, reports and trends against logs of
+    every --meals size. Each benchmark is repeated (after one untimed warm-up run) and reports
+    throughput and latency percentiles. Menu prompts are answered by the
+    script and printed output is discarded.
+
+    Every run takes place in a new temporary folder, so the data files
+    in the current folder are never touched.
+
+Usage:
+    python benchmarks/suite.py [--foods N,N,...] [--meals N,N,...] [--full]
+                               [--only NAME,...] [--runs N] [--max-seconds S]
+                               [--backend list|records|columnar]
+                               [--output FILE] [--compare FILE]
+
+    --full        foods 10^3 to 10^6 and meals 10^2 to 10^7
+    --output      write the results as JSON, e.g. to compare commits
+    --compare     print the change against results saved with --output
+==============================================================================
+"""
+
+import builtins
+import contextlib
+import datetime
+import io
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import aggregates
+import final
+import journal
+import nutrition_planner
+import snapshot_cache
+import synthetic
+
+RESULTS_VERSION = 1
+DEFAULT_FOODS = [1000, 10000]
+DEFAULT_MEALS = [100, 10000]
+FULL_FOODS = [1000, 10000, 100000, 1000000]
+FULL_MEALS = [100, 1000, 10000, 100000, 1000000, 10000000]
+
+
+# ==========================================
+# Benchmark Setups
+# ==========================================
+# Each setup prepares the current (temporary) folder and returns the
+# operation to time. Operations take the run number.
+
+def setup_calculate_calories(food_count, meal_count):
+    synthetic.write_food_database("food_database.txt", food_count)
+    synthetic.write_daily_log(nutrition_planner.DAILY_LOG, meal_count, food_count)
+
+    def run(i):
+        name = synthetic.food_name(i * 7919 % food_count).replace(" ", "_")
+        nutrition_planner.calculateCalories(name, 150.0)
+    return run
+
+
+def setup_log_meal(food_count, meal_count):
+    data = synthetic.make_data(food_count, meal_count, final.DEFAULT_GOALS)
+    data["log"] = final.new_log(data["log"])
+    data["totals"] = aggregates.build_day_totals(data["log"])
+
+    def run(i):
+        answers = iter([synthetic.food_name(i * 7919 % food_count), "1", "150"])
+        with scripted_input(answers):
+            final.log_meal(data)
+    return run
+
+
+def setup_save_data(food_count, meal_count):
+    write_data(food_count, meal_count)
+    data = final.load_data()
+    snapshot_cache.load_all(data)
+
+    def run(i):
+        final.save_data(data)
+    return run
+
+
+def setup_load_cold(food_count, meal_count):
+    write_data(food_count, meal_count)
+
+    def run(i):
+        if os.path.exists(final.CACHE_FILE):
+            os.remove(final.CACHE_FILE)
+        final.load_data()
+    return run
+
+
+def setup_load_warm(food_count, meal_count):
+    write_data(food_count, meal_count)
+    final.load_data()
+
+    def run(i):
+        final.load_data()
+    return run
+
+
+def setup_view_report(food_count, meal_count):
+    write_data(food_count, meal_count)
+    data = final.load_data()
+
+    def run(i):
+        final.view_report(data)
+    return run
+
+
+def setup_plan_meals(food_count, meal_count):
+    data = synthetic.make_data(food_count, 0, final.DEFAULT_GOALS)
+    data["log"] = final.new_log(data["log"])
+    data["totals"] = aggregates.build_day_totals(data["log"])
+
+    def run(i):
+        # Exclude a different food each run so no two plans are the same
+        answers = iter(["3", "400", synthetic.food_name(i % food_count)])
+        with scripted_input(answers):
+            final.plan_meals(data)
+    return run
+
+
+def setup_view_trends(food_count, meal_count):
+    write_data(food_count, meal_count)
+    data = final.load_data()
+    # Built once for older data files, then kept up to date
+    final.get_rollups(data)
+
+    def run(i):
+        final.view_trends(data)
+    return run
+
+
+def setup_daily_nutrition(food_count, meal_count):
+    synthetic.write_daily_log(nutrition_planner.DAILY_LOG, meal_count, 1000)
+
+    def run(i):
+        nutrition_planner.calculateDailyNutrition()
+    return run
+
+
+# name -> (setup, which size list it is run over)
+BENCHMARKS = {
+    "calculateCalories": (setup_calculate_calories, "foods"),
+    "log_meal": (setup_log_meal, "foods"),
+    "save_data": (setup_save_data, "meals"),
+    "load_data (cold)": (setup_load_cold, "meals"),
+    "load_data (warm)": (setup_load_warm, "meals"),
+    "view_report": (setup_view_report, "meals"),
+    "plan_meals": (setup_plan_meals, "foods"),
+    "view_trends": (setup_view_trends, "meals"),
+    "daily_nutrition": (setup_daily_nutrition, "meals"),
+}
+
+
+def write_data(food_count, meal_count):
+    """Write a synthetic nutrition_data.json (as final.py saves it) into the current folder."""
+    synthetic.write_data_file(final.DATA_FILE, food_count, meal_count, final.DEFAULT_GOALS)
+    final.write_snapshot(final.load_data())
+
+
+@contextlib.contextmanager
+def scripted_input(answers):
+    """Answer input() prompts from an iterator instead of the keyboard."""
+    real_input = builtins.input
+    builtins.input = lambda prompt="": next(answers)
+    try:
+        yield
+    finally:
+        builtins.input = real_input
+
+
+def reset_modules():
+    """Forget the indexes and open files cached by both programs."""
+    if final._journal is not None:
+        journal.close_journal(final._journal)
+    final._journal = None
+    final._search["foods"] = None
+    final._search["index"] = None
+    final._plan["foods"] = None
+    store = nutrition_planner._food_store
+    if store is not None and store["catalog"] is not None:
+        store["catalog"].close()
+    nutrition_planner._food_store = None
+    nutrition_planner._search_index = None
+
+
+# ==========================================
+# Timing
+# ==========================================
+def percentile(sorted_values, percent):
+    """Return a percentile of sorted values (nearest rank)."""
+    rank = int(round(percent / 100 * (len(sorted_values) - 1)))
+    return sorted_values[rank]
+
+
+def run_benchmark(name, food_count, meal_count, runs, max_seconds):
+    """Run one benchmark in a temporary folder and return its result dictionary."""
+    setup = BENCHMARKS[name][0]
+    folder = tempfile.mkdtemp(prefix="nutrition_bench_")
+    old_dir = os.getcwd()
+    os.chdir(folder)
+    try:
+        reset_modules()
+        timings = []
+        with contextlib.redirect_stdout(io.StringIO()):
+            op = setup(food_count, meal_count)
+            op(runs)
+            # At least 3 runs, then stop early once the time budget is used up
+            started = time.perf_counter()
+            for i in range(runs):
+                start = time.perf_counter()
+                op(i)
+                timings.append(time.perf_counter() - start)
+                if i >= 2 and time.perf_counter() - started > max_seconds:
+                    break
+    finally:
+        reset_modules()
+        os.chdir(old_dir)
+        shutil.rmtree(folder)
+
+    total = sum(timings)
+    timings.sort()
+    return {
+        "name": name,
+        "foods": food_count,
+        "meals": meal_count,
+        "runs": len(timings),
+        "ops_per_sec": len(timings) / total if total > 0 else 0.0,
+        "mean_ms": statistics.mean(timings) * 1000,
+        "p50_ms": percentile(timings, 50) * 1000,
+        "p90_ms": percentile(timings, 90) * 1000,
+        "p99_ms": percentile(timings, 99) * 1000,
+        "max_ms": timings[-1] * 1000
+    }
+
+
+def run_suite(names, food_sizes, meal_sizes, runs, max_seconds):
+    """Run every selected benchmark over its sizes and return the results."""
+    results = []
+    for name in names:
+        if BENCHMARKS[name][1] == "foods":
+            cases = [(count, meal_sizes[0]) for count in food_sizes]
+        else:
+            cases = [(food_sizes[0], count) for count in meal_sizes]
+        for food_count, meal_count in cases:
+            result = run_benchmark(name, food_count, meal_count, runs, max_seconds)
+            print_result(result)
+            results.append(result)
+    return results
+
+
+# ==========================================
+# Reporting and Comparing
+# ==========================================
+def print_header():
+    print(f"{'benchmark':<20}{'foods':>9}{'meals':>10}{'runs':>6}{'ops/s':>11}"
+          f"{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}")
+    print("-" * 86)
+
+
+def print_result(result):
+    print(f"{result['name']:<20}{result['foods']:>9}{result['meals']:>10}{result['runs']:>6}"
+          f"{result['ops_per_sec']:>11.1f}{result['p50_ms']:>10.3f}{result['p90_ms']:>10.3f}"
+          f"{result['p99_ms']:>10.3f}")
+
+
+def git_commit():
+    """Return the current git commit, or None outside a git checkout."""
+    try:
+        output = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                                capture_output=True, text=True, check=True).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return output.strip()
+
+
+def save_results(path, results):
+    """Write the results with enough context to compare them later."""
+    report = {
+        "version": RESULTS_VERSION,
+        "commit": git_commit(),
+        "date": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "log_backend": final.LOG_BACKEND,
+        "results": results
+    }
+    with open(path, "w") as file:
+        json.dump(report, file, indent=2)
+
+
+def compare_results(path, results):
+    """Print the change in median latency against a saved results file."""
+    with open(path, "r") as file:
+        baseline = json.load(file)
+    old = {}
+    for result in baseline["results"]:
+        old[(result["name"], result["foods"], result["meals"])] = result
+
+    print("\nCompared with " + path + " (commit " + str(baseline.get("commit")) + "):")
+    for result in results:
+        before = old.get((result["name"], result["foods"], result["meals"]))
+        if before is None or before["p50_ms"] == 0:
+            continue
+        change = (result["p50_ms"] - before["p50_ms"]) / before["p50_ms"] * 100
+        print(f"{result['name']:<20}{result['foods']:>9}{result['meals']:>10}"
+              f"{before['p50_ms']:>12.3f} ms ->{result['p50_ms']:>10.3f} ms ({change:+.1f}%)")
+
+
+# ==========================================
+# Command Line
+# ==========================================
+USAGE = ("Usage: python benchmarks/suite.py [--foods N,N,...] [--meals N,N,...] [--full]\n"
+         "       [--only NAME,...] [--runs N] [--max-seconds S] [--backend list|records|columnar]\n"
+         "       [--output FILE] [--compare FILE]")
+
+
+def parse_sizes(text):
+    return [int(float(size)) for size in text.split(",")]
+
+
+def main(args):
+    options = {"--foods": DEFAULT_FOODS, "--meals": DEFAULT_MEALS, "--only": list(BENCHMARKS),
+               "--runs": 200, "--max-seconds": 10.0, "--backend": final.LOG_BACKEND,
+               "--output": None, "--compare": None}
+    i = 0
+    try:
+        while i < len(args):
+            if args[i] == "--full":
+                options["--foods"] = FULL_FOODS
+                options["--meals"] = FULL_MEALS
+                i += 1
+                continue
+            if args[i] not in options or i + 1 == len(args):
+                raise ValueError(args[i])
+            value = args[i + 1]
+            if args[i] in ("--foods", "--meals"):
+                value = parse_sizes(value)
+            elif args[i] == "--only":
+                value = value.split(",")
+            elif args[i] == "--runs":
+                value = int(value)
+            elif args[i] == "--max-seconds":
+                value = float(value)
+            options[args[i]] = value
+            i += 2
+    except ValueError:
+        print(USAGE)
+        return 2
+
+    for name in options["--only"]:
+        if name not in BENCHMARKS:
+            print("Error: Unknown benchmark '" + name + "'. Choose from: " + ", ".join(BENCHMARKS))
+            return 2
+    if options["--backend"] not in ("list", "records", "columnar"):
+        print(USAGE)
+        return 2
+    final.LOG_BACKEND = options["--backend"]
+
+    print_header()
+    results = run_suite(options["--only"], options["--foods"], options["--meals"],
+                        options["--runs"], options["--max-seconds"])
+
+    if options["--output"] is not None:
+        save_results(options["--output"], results)
+        print("\nResults written to " + options["--output"])
+    if options["--compare"] is not None:
+        try:
+            compare_results(options["--compare"], results)
+        except (OSError, ValueError, KeyError) as error:
+            print("Error: Could not read " + options["--compare"] + ": " + str(error))
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,97 @@
+"""
+==============================================================================
+Athletic Nutrition Planner
+Synthetic Benchmark Data
+
+Description:
+    Generators for food catalogs and meal logs of any size, in the
+    formats both programs read: nutrition_data.json for final.py and
+    food_database.txt / daily_log.txt for nutrition_planner.py.
+
+    Everything is generated from a fixed seed, so the same sizes always
+    give the same files and results can be compared between commits.
+==============================================================================
+"""
+
+import datetime
+import json
+import random
+
+SEED = 5001
+DAYS = 3 * 365
+
+
+def food_name(i):
+    """Return the name of synthetic food number i."""
+    return "food " + str(i)
+
+
+def make_foods(count, seed=SEED):
+    """Yield count food dictionaries (macros per 100g)."""
+    rng = random.Random(seed)
+    for i in range(count):
+        yield {"name": food_name(i),
+               "protein": round(rng.uniform(0, 35), 1),
+               "carbs": round(rng.uniform(0, 80), 1),
+               "fat": round(rng.uniform(0, 30), 1)}
+
+
+def make_log(count, food_count, seed=SEED):
+    """
+    Yield count final.py log entries (worked out from the foods of
+    make_foods like final.make_entry does) spread over the last three years.
+
+    The newest entries are dated today, so reports always have meals.
+    """
+    foods = list(make_foods(food_count, seed))
+    rng = random.Random(seed)
+    per_day = max(1, count // DAYS)
+    today = datetime.date.today()
+    first = today - datetime.timedelta(days=(count - 1) // per_day)
+    for i in range(count):
+        food = foods[rng.randrange(food_count)]
+        portion = float(rng.randrange(50, 400))
+        ratio = portion / 100
+        protein = food["protein"] * ratio
+        carbs = food["carbs"] * ratio
+        fat = food["fat"] * ratio
+        yield {"name": food["name"],
+               "portion": portion,
+               "calories": round((protein * 4) + (carbs * 4) + (fat * 9)),
+               "protein": round(protein, 1),
+               "carbs": round(carbs, 1),
+               "fat": round(fat, 1),
+               "date": (first + datetime.timedelta(days=i // per_day)).isoformat()}
+
+
+def make_data(food_count, meal_count, goals, seed=SEED):
+    """Return a nutrition_data.json style dictionary."""
+    return {"foods": list(make_foods(food_count, seed)),
+            "log": list(make_log(meal_count, food_count, seed)),
+            "goals": dict(goals),
+            "seq": 0}
+
+
+def write_data_file(path, food_count, meal_count, goals, seed=SEED):
+    """Write a nutrition_data.json file and return its size in bytes."""
+    text = json.dumps(make_data(food_count, meal_count, goals, seed))
+    with open(path, "w") as file:
+        file.write(text)
+    return len(text)
+
+
+def write_food_database(path, count, seed=SEED):
+    """Write a food_database.txt file (names in lower case with underscores)."""
+    with open(path, "w") as file:
+        for food in make_foods(count, seed):
+            name = food["name"].replace(" ", "_")
+            file.write(f"{name},{food['protein']},{food['carbs']},{food['fat']}\n")
+
+
+def write_daily_log(path, count, food_count, seed=SEED):
+    """Write a daily_log.txt file with count meals."""
+    with open(path, "w") as file:
+        for meal in make_log(count, food_count, seed):
+            name = meal["name"].replace(" ", "_")
+            file.write(f"{name},{meal['portion']},{meal['calories']:.1f},{meal['protein']:.1f},"
+                       f"{meal['carbs']:.1f},{meal['fat']:.1f}\n")
@@ -0,0 +1,244 @@
+"""
+==============================================================================
+Athletic Nutrition Planner
+Binary Food Catalog
+
+Description:
+    A compact, read-only file format for large food catalogs. The file is
+    opened with mmap and records are only decoded when they are looked
+    at, so opening a catalog of hundreds of thousands of foods takes
+    almost no time or memory (compared with building a Python dict for
+    every food).
+
+File layout (little-endian):
+    header   8s magic, uint32 version, uint32 record count,
+             uint32 hash table size, uint64 size of the text database
+             the catalog was built from
+    records  one 20-byte record per food, sorted by name:
+             uint32 name offset, uint16 name length, 2 bytes padding,
+             float32 protein, float32 carbs, float32 fat (per 100g)
+    table    hash table of uint32 record numbers (0xFFFFFFFF = empty),
+             slot = crc32(name) mod table size, linear probing
+    strings  all names, UTF-8, back to back
+
+    Looking up a food hashes its name and usually checks a single
+    record, without decoding anything else.
+
+Usage:
+    python binary_catalog.py food_database.txt        # -> food_database.bin
+    python binary_catalog.py nutrition_data.json foods.bin
+==============================================================================
+"""
+
+import json
+import mmap
+import os
+import struct
+import sys
+import zlib
+
+import metrics
+
+MAGIC = b"NPFOODS\x00"
+VERSION = 1
+HEADER = struct.Struct("<8sIIIQ")
+RECORD = struct.Struct("<IHxxfff")
+SLOT = struct.Struct("<I")
+EMPTY = 0xFFFFFFFF
+
+
+# ==========================================
+# Reading
+# ==========================================
+class BinaryCatalog:
+    """A food catalog file opened through mmap; foods are decoded on access."""
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "rb")
+        try:
+            self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self.file.close()
+            raise ValueError(path + " is not a food catalog")
+
+        if len(self.map) < HEADER.size:
+            self.close()
+            raise ValueError(path + " is not a food catalog")
+        magic, version, count, table_size, source_size = HEADER.unpack_from(self.map, 0)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError(path + " is not a food catalog (or was written by another version)")
+
+        self.count = count
+        self.table_size = table_size
+        self.source_size = source_size
+        self.table_at = HEADER.size + count * RECORD.size
+        self.strings_at = self.table_at + table_size * SLOT.size
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, i):
+        if i < 0:
+            i = i + self.count
+        if i < 0 or i >= self.count:
+            raise IndexError("food index out of range")
+        offset, length, protein, carbs, fat = RECORD.unpack_from(self.map, HEADER.size + i * RECORD.size)
+        start = self.strings_at + offset
+        return {
+            "name": self.map[start:start + length].decode("utf-8"),
+            "protein": _clean(protein),
+            "carbs": _clean(carbs),
+            "fat": _clean(fat)
+        }
+
+    def __iter__(self):
+        for i in range(self.count):
+            yield self[i]
+
+    def _name_bytes(self, i):
+        """Return the raw UTF-8 name of record i (no decoding)."""
+        offset, length = struct.unpack_from("<IH", self.map, HEADER.size + i * RECORD.size)
+        start = self.strings_at + offset
+        return self.map[start:start + length]
+
+    def names(self):
+        """Yield every food name in sorted order."""
+        for i in range(self.count):
+            yield self._name_bytes(i).decode("utf-8")
+
+    def find(self, name):
+        """Return the record number of a food (exact name), or -1."""
+        if self.table_size == 0:
+            return -1
+        key = name.encode("utf-8")
+        slot = zlib.crc32(key) % self.table_size
+        while True:
+            i = SLOT.unpack_from(self.map, self.table_at + slot * SLOT.size)[0]
+            if i == EMPTY:
+                return -1
+            if self._name_bytes(i) == key:
+                return i
+            slot = (slot + 1) % self.table_size
+
+    def lookup(self, name):
+        """Return (protein, carbs, fat) per 100g for a food, or None."""
+        i = self.find(name)
+        if i < 0:
+            return None
+        offset, length, protein, carbs, fat = RECORD.unpack_from(self.map, HEADER.size + i * RECORD.size)
+        return _clean(protein), _clean(carbs), _clean(fat)
+
+    def close(self):
+        """Release the mmap and the file."""
+        if getattr(self, "map", None) is not None:
+            self.map.close()
+            self.map = None
+        self.file.close()
+
+
+def _clean(value):
+    """Undo float32 noise (3.6 is stored as 3.5999999) for per-100g values."""
+    return round(value, 4)
+
+
+# ==========================================
+# Writing
+# ==========================================
+def write_catalog(path, foods, source_size=0):
+    """
+    Write (name, protein, carbs, fat) tuples to a catalog file.
+
+    When a name appears more than once the first copy is kept, matching
+    the top-to-bottom search of the text database. The file is written
+    to a temp file and renamed, so readers never see half a catalog.
+    """
+    unique = {}
+    for name, protein, carbs, fat in foods:
+        encoded = name.encode("utf-8")
+        if len(encoded) > 0xFFFF:
+            raise ValueError("food name too long: " + name[:40] + "...")
+        if encoded not in unique:
+            unique[encoded] = (protein, carbs, fat)
+
+    names = sorted(unique)
+    records = bytearray()
+    strings = bytearray()
+    for encoded in names:
+        protein, carbs, fat = unique[encoded]
+        records += RECORD.pack(len(strings), len(encoded), protein, carbs, fat)
+        strings += encoded
+
+    # Keep the hash table at most half full so probes stay short
+    table_size = 2 * len(names) + 1
+    table = [EMPTY] * table_size
+    for i in range(len(names)):
+        slot = zlib.crc32(names[i]) % table_size
+        while table[slot] != EMPTY:
+            slot = (slot + 1) % table_size
+        table[slot] = i
+
+    temp_path = path + ".tmp"
+    with open(temp_path, "wb") as file:
+        file.write(HEADER.pack(MAGIC, VERSION, len(names), table_size, source_size))
+        file.write(records)
+        file.write(struct.pack("<" + str(table_size) + "I", *table))
+        file.write(strings)
+    os.replace(temp_path, path)
+
+
+# ==========================================
+# Converters
+# ==========================================
+def convert_json(json_path, catalog_path):
+    """Build a catalog from the foods in final.py's nutrition_data.json."""
+    with open(json_path, "r") as file:
+        data = json.load(file)
+    foods = [(food["name"], food["protein"], food["carbs"], food["fat"]) for food in data["foods"]]
+    write_catalog(catalog_path, foods)
+    return len(foods)
+
+
+def convert_text(db_path, catalog_path):
+    """Build a catalog from nutrition_planner.py's food_database.txt."""
+    import food_store
+
+    foods = []
+    with open(db_path, "r") as file:
+        for line in file:
+            parsed = food_store.parse_food_line(line)
+            if parsed is not None:
+                foods.append((parsed[0],) + parsed[1])
+    write_catalog(catalog_path, foods, os.path.getsize(db_path))
+    return len(foods)
+
+
+def main(args):
+    args = metrics.configure(args)
+    if len(args) == 0:
+        print("Usage: python binary_catalog.py SOURCE [CATALOG]")
+        print("  SOURCE is food_database.txt or nutrition_data.json")
+        return 1
+
+    source = args[0]
+    if len(args) > 1:
+        target = args[1]
+    else:
+        target = os.path.splitext(source)[0] + ".bin"
+
+    try:
+        if source.endswith(".json"):
+            count = convert_json(source, target)
+        else:
+            count = convert_text(source, target)
+    except (OSError, ValueError, KeyError) as error:
+        print("Error: Could not convert " + source + ": " + str(error))
+        return 1
+
+    print("Wrote " + str(count) + " foods to " + target + " (" + str(os.path.getsize(target)) + " bytes)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
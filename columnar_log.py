@@ -0,0 +1,201 @@
+"""
+==============================================================================
+Athletic Nutrition Planner
+Columnar Meal Log
+
+Description:
+    An optional, compact storage backend for the meal log in final.py.
+
+    The normal log is a list of dictionaries, one per meal, which costs a
+    few hundred bytes per entry. ColumnarLog keeps the same information
+    in typed arrays instead:
+
+        food      - food id (index into an interned list of food names)
+        portion   - grams (float64)
+        calories, protein, carbs, fat - float32
+        date      - day number (datetime.date.toordinal)
+
+    so an entry costs about 32 bytes. It still behaves like a list of
+    meal dictionaries (append, len, indexing, slicing, iteration), so the
+    rest of final.py does not need to know which backend is in use.
+
+    Sums and group-by-day / group-by-food totals use NumPy when it is
+    installed and fall back to plain loops over the arrays otherwise.
+==============================================================================
+"""
+
+import datetime
+from array import array
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+MACROS = ("calories", "protein", "carbs", "fat")
+
+
+class ColumnarLog:
+    """A meal log stored as one typed array per field."""
+
+    def __init__(self, entries=()):
+        self.names = []        # food id -> name
+        self.name_ids = {}     # name -> food id
+        self.food = array("I")
+        self.portion = array("d")
+        self.calories = array("f")
+        self.protein = array("f")
+        self.carbs = array("f")
+        self.fat = array("f")
+        self.date = array("i")
+        self.extend(entries)
+
+    # ==========================================
+    # List-of-dictionaries API
+    # ==========================================
+    def append(self, entry):
+        """Add one meal dictionary to the end of the log."""
+        name = entry["name"]
+        food_id = self.name_ids.get(name)
+        if food_id is None:
+            food_id = len(self.names)
+            self.names.append(name)
+            self.name_ids[name] = food_id
+
+        self.food.append(food_id)
+        self.portion.append(entry["portion"])
+        self.calories.append(entry["calories"])
+        self.protein.append(entry["protein"])
+        self.carbs.append(entry["carbs"])
+        self.fat.append(entry["fat"])
+        self.date.append(datetime.date.fromisoformat(entry["date"]).toordinal())
+
+    def extend(self, entries):
+        """Add several meal dictionaries."""
+        for entry in entries:
+            self.append(entry)
+
+    def __len__(self):
+        return len(self.food)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self.entry(i) for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index = index + len(self)
+        if index < 0 or index >= len(self):
+            raise IndexError("meal index out of range")
+        return self.entry(index)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self.entry(i)
+
+    def entry(self, i):
+        """Rebuild the meal dictionary stored at position i."""
+        # Values were rounded when logged; undo float32 noise the same way
+        return {
+            "name": self.names[self.food[i]],
+            "portion": self.portion[i],
+            "calories": round(self.calories[i]),
+            "protein": round(self.protein[i], 1),
+            "carbs": round(self.carbs[i], 1),
+            "fat": round(self.fat[i], 1),
+            "date": datetime.date.fromordinal(self.date[i]).isoformat()
+        }
+
+    def to_list(self):
+        """Return the log as a plain list of meal dictionaries (for JSON)."""
+        return list(self)
+
+    def positions(self, name):
+        """Return the positions of every meal of one food."""
+        food_id = self.name_ids.get(name)
+        if food_id is None:
+            return []
+        if numpy is not None:
+            return numpy.flatnonzero(_as_numpy(self.food) == food_id).tolist()
+        return [i for i in range(len(self)) if self.food[i] == food_id]
+
+    def set_macros(self, positions, columns):
+        """Overwrite the calories, protein, carbs and fat (columns in MACROS order) at positions."""
+        for key, values in zip(MACROS, columns):
+            column = getattr(self, key)
+            if numpy is not None:
+                _as_numpy(column)[positions] = values
+            else:
+                for i, value in zip(positions, values):
+                    column[i] = value
+
+    # ==========================================
+    # Vectorized Totals
+    # ==========================================
+    def sum_macros(self):
+        """Return calorie and macro totals (plus meal count) of the whole log."""
+        totals = {"meals": len(self)}
+        for key in MACROS:
+            column = getattr(self, key)
+            if numpy is not None:
+                totals[key] = float(_as_numpy(column).sum(dtype=numpy.float64))
+            else:
+                totals[key] = sum(column)
+        return totals
+
+    def totals_by_day(self):
+        """Return {"YYYY-MM-DD": totals} for every day in the log."""
+        groups = self._group_by(self.date)
+        return {datetime.date.fromordinal(day).isoformat(): totals
+                for day, totals in groups.items()}
+
+    def totals_by_food(self):
+        """Return {food name: totals} for every food in the log."""
+        groups = self._group_by(self.food)
+        return {self.names[food_id]: totals for food_id, totals in groups.items()}
+
+    def _group_by(self, keys):
+        """Add up every macro column grouped by the values of a key column."""
+        if len(self) == 0:
+            return {}
+
+        if numpy is not None:
+            unique, inverse = numpy.unique(_as_numpy(keys), return_inverse=True)
+            counts = numpy.bincount(inverse)
+            sums = {}
+            for key in MACROS:
+                sums[key] = numpy.bincount(inverse, weights=_as_numpy(getattr(self, key)))
+            groups = {}
+            for i in range(len(unique)):
+                totals = {key: float(sums[key][i]) for key in MACROS}
+                totals["meals"] = int(counts[i])
+                groups[int(unique[i])] = totals
+            return groups
+
+        groups = {}
+        columns = [getattr(self, key) for key in MACROS]
+        for i in range(len(self)):
+            totals = groups.get(keys[i])
+            if totals is None:
+                totals = {"calories": 0.0, "protein": 0.0, "carbs": 0.0, "fat": 0.0, "meals": 0}
+                groups[keys[i]] = totals
+            for key, column in zip(MACROS, columns):
+                totals[key] += column[i]
+            totals["meals"] += 1
+        return groups
+
+    def memory_bytes(self):
+        """Return the approximate bytes used by the column arrays."""
+        columns = (self.food, self.portion, self.calories, self.protein,
+                   self.carbs, self.fat, self.date)
+        return sum(column.itemsize * len(column) for column in columns)
+
+
+def _as_numpy(column):
+    """View an array.array as a NumPy array without copying it."""
+    return numpy.frombuffer(column, dtype=column.typecode)
+
+
+def to_json(value):
+    """json.dump default= hook that writes a ColumnarLog as a plain list."""
+    if isinstance(value, ColumnarLog):
+        return value.to_list()
+    raise TypeError("Object of type " + type(value).__name__ + " is not JSON serializable")
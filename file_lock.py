@@ -0,0 +1,84 @@
+"""
+==============================================================================
+Athletic Nutrition Planner
+File Locks
+
+Description:
+    Advisory locks that let several processes (or threads) share one
+    data folder. A lock on a data file is taken on a separate file next
+    to it (nutrition_data.json -> nutrition_data.json.lock), so the data
+    file itself can still be replaced with os.replace while locked.
+
+    Uses fcntl.flock on Linux/macOS and msvcrt.locking on Windows. If
+    neither is available, locked() does nothing and the programs behave
+    as they did before (one process at a time).
+
+Usage:
+    with file_lock.locked("nutrition_data.json"):
+        ... read, change and write the file ...
+
+    The lock is not re-entrant: do not take the same lock twice in one
+    thread.
+==============================================================================
+"""
+
+import contextlib
+import time
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+try:
+    import msvcrt
+except ImportError:
+    msvcrt = None
+
+LOCK_SUFFIX = ".lock"
+
+# Windows only: how long to keep retrying before giving up
+TIMEOUT = 30.0
+
+
+def lock_path(path):
+    """Return the lock file that guards a data file."""
+    return path + LOCK_SUFFIX
+
+
+@contextlib.contextmanager
+def locked(path):
+    """Hold an exclusive lock on path for the duration of a with block."""
+    file = open(lock_path(path), "a+b")
+    try:
+        _acquire(file)
+        try:
+            yield
+        finally:
+            _release(file)
+    finally:
+        file.close()
+
+
+def _acquire(file):
+    if fcntl is not None:
+        fcntl.flock(file.fileno(), fcntl.LOCK_EX)
+    elif msvcrt is not None:
+        # msvcrt only waits about 10 seconds per call, so keep trying
+        deadline = time.monotonic() + TIMEOUT
+        file.seek(0)
+        while True:
+            try:
+                msvcrt.locking(file.fileno(), msvcrt.LK_LOCK, 1)
+                return
+            except OSError:
+                if time.monotonic() > deadline:
+                    raise
+
+
+def _release(file):
+    if fcntl is not None:
+        fcntl.flock(file.fileno(), fcntl.LOCK_UN)
+    elif msvcrt is not None:
+        file.seek(0)
+        msvcrt.locking(file.fileno(), msvcrt.LK_UNLCK, 1)
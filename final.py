@@ -19,13 +19,62 @@ Core Concepts Used:
 ==============================================================================
 """
 
+import datetime
 import json
 import os
+import sys
+
+import aggregates
+import columnar_log
+import file_lock
+import food_refs
+import food_search
+import journal
+import meal_optimizer
+import metrics
+import partitions
+import portions
+import records
+import rollups
+import snapshot_cache
+import sqlite_store
 
 # ==========================================
 # Global Variables
 # ==========================================
 DATA_FILE = "nutrition_data.json"
+JOURNAL_FILE = "nutrition_data.journal"
+
+# Binary copy of DATA_FILE for fast start-up; goals and the daily totals
+# are read right away, the foods, the meal log and the rollups only when
+# first used (see snapshot_cache.py)
+CACHE_FILE = "nutrition_data.cache"
+LAZY_SECTIONS = ("foods", "log", "rollups")
+
+# How meals are written to DATA_FILE: "food_ids" (food id, portion and day;
+# calories and macros are worked out again when loading - see food_refs.py)
+# or "entries" (every meal in full, as older versions wrote them)
+LOG_FORMAT = "food_ids"
+
+# Journal mode: append each change to JOURNAL_FILE instead of rewriting
+# DATA_FILE, and fold the journal into DATA_FILE every COMPACT_EVERY changes
+USE_JOURNAL = True
+COMPACT_EVERY = 500
+
+# Meal log storage: "list" (list of dictionaries), "records" (compact
+# Food / MealEntry / Goals records instead of dictionaries - see records.py)
+# or "columnar" (typed arrays, smallest for very long logs - see columnar_log.py)
+LOG_BACKEND = "list"
+
+# Storage: "json" (DATA_FILE + journal, or TEAM_DIR in team mode) or
+# "sqlite" (everything in DATABASE, one small transaction per change -
+# see sqlite_store.py; python sqlite_store.py migrates existing files)
+STORAGE = "json"
+DATABASE = "nutrition_data.db"
+
+# Team mode (python final.py --athlete NAME): foods, goals and meals are
+# kept under TEAM_DIR, split by athlete and by day (see partitions.py)
+TEAM_DIR = partitions.TEAM_DIR
 
 # Default foods (per 100g)
 DEFAULT_FOODS = [
@@ -42,47 +91,489 @@ DEFAULT_GOALS = {"calories": 2500, "protein": 200, "carbs": 250, "fat": 83, "mod
 # ==========================================
 # Function 1: Load Data from File
 # ==========================================
-def load_data():
+@metrics.timed("final.load_data")
+def load_data(athlete=None):
     """Load saved data from JSON file, or return defaults if file missing."""
+    if STORAGE == "sqlite":
+        return load_sqlite_data(athlete)
+    if athlete is not None:
+        return load_athlete_data(athlete)
+    
+    # Another process may be compacting the journal right now
+    with file_lock.locked(DATA_FILE):
+        return read_data()
+
+
+def read_data():
+    """Load the snapshot and replay the journal (the caller holds the data lock)."""
+    # Remember which snapshot this is, so changes by other processes can be detected
+    _disk["stamp"] = snapshot_stamp()
+    
+    # Warm start: read the cache instead of parsing the JSON file
+    data = load_cached_data()
+    if data is None:
+        data = load_json_data()
+    
+    # Replay changes journaled since the snapshot was written
+    records, _disk["offset"] = journal.read_from(JOURNAL_FILE, 0)
+    for record in records:
+        if record["seq"] > data["seq"]:
+            apply_change(data, record)
+    if _journal is not None:
+        _journal["count"] = len(records)
+    return data
+
+
+def load_json_data():
+    """Parse DATA_FILE (or use the defaults) and refresh the start-up cache."""
+    data = None
     if os.path.exists(DATA_FILE):
         try:
             file = open(DATA_FILE, "r")
             data = json.load(file)
             file.close()
-            return data
         except:
             print("Error loading file, using defaults.")
     
-    # Return default data if no file
-    return {"foods": DEFAULT_FOODS, "log": [], "goals": DEFAULT_GOALS}
+    # Use default data if no file
+    loaded = data is not None
+    if data is None:
+        data = {"foods": list(DEFAULT_FOODS), "log": [], "goals": dict(DEFAULT_GOALS)}
+    data.setdefault("seq", 0)
+    
+    # Older files have no dates or daily totals: count their meals as today's
+    if "totals" not in data:
+        for meal in data["log"]:
+            if isinstance(meal, dict):
+                meal.setdefault("date", aggregates.today())
+    data["foods"] = new_foods(unique_foods(data["foods"]))
+    data["log"] = new_log(food_refs.decode_log(data["log"], data["foods"], data.get("food_history", {})))
+    data["goals"] = new_goals(data["goals"])
+    if "totals" not in data:
+        data["totals"] = aggregates.build_day_totals(data["log"])
+    
+    if loaded:
+        write_data_cache(data)
+    return data
+
+
+def load_cached_data():
+    """Load goals and daily totals from the cache, or return None if it is out of date."""
+    if not os.path.exists(DATA_FILE):
+        return None
+    cache = snapshot_cache.open_cache(DATA_FILE, CACHE_FILE)
+    if cache is None:
+        return None
+    
+    # The other sections are read the first time they are used
+    loaders = {
+        "foods": lambda: new_foods(snapshot_cache.read_section(cache, "foods")),
+        "log": lambda: new_log(snapshot_cache.read_section(cache, "log"))
+    }
+    if "rollups" in cache["sections"]:
+        loaders["rollups"] = lambda: snapshot_cache.read_section(cache, "rollups")
+    data = snapshot_cache.LazyData(cache["eager"], loaders, cache["file"])
+    data["goals"] = new_goals(data["goals"])
+    return data
+
+
+def write_data_cache(data):
+    """Write the start-up cache for the data currently in DATA_FILE."""
+    eager = {}
+    sections = {}
+    for key in data:
+        if key in LAZY_SECTIONS:
+            sections[key] = data[key]
+        else:
+            eager[key] = data[key]
+    snapshot_cache.write_cache(DATA_FILE, CACHE_FILE, eager, sections)
 
 
 # ==========================================
 # Function 2: Save Data to File
 # ==========================================
+@metrics.timed("final.save_data")
 def save_data(data):
     """Save current data to JSON file."""
     try:
-        file = open(DATA_FILE, "w")
-        json.dump(data, file)
-        file.close()
+        if STORAGE == "sqlite":
+            sqlite_store.save_data(get_db(), db_athlete(data), data)
+            print("Data saved.")
+            return True
+        with file_lock.locked(DATA_FILE):
+            # Keep the changes other processes made since we loaded
+            sync_data(data)
+            write_snapshot(data)
+        print("Data saved.")
+        return True
+    except:
+        print("Error: Could not save data.")
+        return False
+
+
+def write_snapshot(data):
+    """Write data to DATA_FILE (raises OSError if it cannot be written)."""
+    # Foods and log may not have been read from the cache yet
+    snapshot_cache.load_all(data)
+    stored = stored_data(data)
+    
+    # Write a temp file first so a crash never leaves a half-written snapshot
+    temp_file = DATA_FILE + ".tmp"
+    file = open(temp_file, "w")
+    # json.dumps encodes in C; json.dump to a file goes through the Python encoder
+    file.write(json.dumps(stored, default=to_json))
+    file.flush()
+    os.fsync(file.fileno())
+    file.close()
+    os.replace(temp_file, DATA_FILE)
+    _disk["stamp"] = snapshot_stamp()
+    # The cache keeps the meals as they are in memory, which is faster to read back
+    write_data_cache(data)
+
+
+def stored_data(data):
+    """Return data in the form it is written to DATA_FILE (see LOG_FORMAT)."""
+    if LOG_FORMAT != "food_ids":
+        return data
+    stored = dict(data)
+    stored["log"] = food_refs.encode_log(data["log"], data["foods"], data.get("food_history", {}))
+    return stored
+
+
+# ==========================================
+# Sharing the Data Files Between Processes
+# ==========================================
+# Several copies of the program may use the same data files. Every write
+# takes the data lock (see file_lock.py) and first catches up with what
+# the others wrote: seq works as a version number, so records appended
+# to the journal by another process are replayed, and a snapshot written
+# by another process (a compaction) is reloaded. Only then is the change
+# given the next seq and appended, so contended writes never rewrite the
+# whole file.
+_disk = {"stamp": None, "offset": 0}
+
+
+def snapshot_stamp():
+    """Return (mtime, size) of DATA_FILE, or None if there is no file yet."""
+    try:
+        info = os.stat(DATA_FILE)
+    except OSError:
+        return None
+    return info.st_mtime_ns, info.st_size
+
+
+def sync_data(data):
+    """Bring data up to date with the files (the caller holds the data lock)."""
+    if snapshot_stamp() != _disk["stamp"]:
+        snapshot_cache.replace_data(data, read_data())
+        return
+    
+    records, _disk["offset"] = journal.read_from(JOURNAL_FILE, _disk["offset"])
+    for record in records:
+        if record["seq"] > data.get("seq", 0):
+            apply_change(data, record)
+    if _journal is not None:
+        _journal["count"] += len(records)
+
+
+def load_athlete_data(athlete):
+    """Load the shared foods plus one athlete's goals and today's meals (team mode)."""
+    # Only today's file is read; other days and other athletes stay on disk
+    log = new_log(partitions.read_day(TEAM_DIR, athlete, aggregates.today()))
+    return {
+        "athlete": athlete,
+        "foods": new_foods(unique_foods(partitions.load_foods(TEAM_DIR, DEFAULT_FOODS))),
+        "log": log,
+        "goals": new_goals(partitions.load_goals(TEAM_DIR, athlete, DEFAULT_GOALS)),
+        "totals": aggregates.build_day_totals(log),
+        "seq": 0
+    }
+
+
+def save_athlete_change(data, record):
+    """Write one change to the team storage, touching only the files it affects."""
+    athlete = data["athlete"]
+    op = record["op"]
+    if op == "add_food":
+        partitions.append_food(TEAM_DIR, record["food"], DEFAULT_FOODS)
+    elif op == "add_foods":
+        partitions.append_foods(TEAM_DIR, record["foods"], DEFAULT_FOODS)
+    elif op == "log_meal":
+        partitions.append_meals(TEAM_DIR, athlete, [record["entry"]])
+    elif op == "log_meals":
+        partitions.append_meals(TEAM_DIR, athlete, record["entries"])
+    elif op == "set_goals":
+        partitions.save_goals(TEAM_DIR, athlete, record["goals"])
+    elif op == "reset_log":
+        partitions.clear_day(TEAM_DIR, athlete, record["date"])
+
+
+# ==========================================
+# SQLite Storage
+# ==========================================
+_db = None
+
+
+def get_db():
+    """Open the SQLite database on first use."""
+    global _db
+    if _db is None:
+        _db = sqlite_store.open_db(DATABASE)
+    return _db
+
+
+def db_athlete(data):
+    """Return the athlete key rows of data are stored under."""
+    if "athlete" in data:
+        return partitions.safe_name(data["athlete"])
+    return sqlite_store.DEFAULT_ATHLETE
+
+
+def load_sqlite_data(athlete):
+    """Load data from the SQLite database (only today's meals in team mode)."""
+    since = ""
+    key = sqlite_store.DEFAULT_ATHLETE
+    if athlete is not None:
+        since = aggregates.today()
+        key = partitions.safe_name(athlete)
+    data = sqlite_store.load_data(get_db(), key, DEFAULT_FOODS, DEFAULT_GOALS, since)
+    data["foods"] = new_foods(unique_foods(data["foods"]))
+    data["log"] = new_log(data["log"])
+    data["goals"] = new_goals(data["goals"])
+    if athlete is not None:
+        data["athlete"] = athlete
+    return data
+
+
+def new_log(entries=()):
+    """Return a meal log using the configured LOG_BACKEND."""
+    if LOG_BACKEND == "columnar":
+        if isinstance(entries, columnar_log.ColumnarLog):
+            return entries
+        return columnar_log.ColumnarLog(entries)
+    if LOG_BACKEND == "records":
+        if isinstance(entries, records.RecordList):
+            return entries
+        return records.RecordList(records.MealEntry, entries)
+    if isinstance(entries, records.RecordList):
+        return entries.to_list()
+    if isinstance(entries, list):
+        return entries
+    return list(entries)
+
+
+def new_foods(foods):
+    """Return a food list in the form the configured LOG_BACKEND uses."""
+    if LOG_BACKEND == "records":
+        if isinstance(foods, records.RecordList):
+            return foods
+        return records.RecordList(records.Food, foods)
+    if isinstance(foods, records.RecordList):
+        return foods.to_list()
+    return foods
+
+
+def new_goals(goals):
+    """Return goals in the form the configured LOG_BACKEND uses."""
+    if LOG_BACKEND == "records":
+        return records.Goals.from_dict(goals)
+    if isinstance(goals, records.Goals):
+        return goals.to_dict()
+    return goals
+
+
+def to_json(value):
+    """json.dump default= hook for the compact log backends."""
+    if isinstance(value, records.Record):
+        return records.to_json(value)
+    return columnar_log.to_json(value)
+
+
+# ==========================================
+# Journal: Record and Replay Changes
+# ==========================================
+_journal = None
+
+
+def get_journal():
+    """Open the journal file on first use."""
+    global _journal
+    if _journal is None:
+        _journal = journal.open_journal(JOURNAL_FILE)
+    return _journal
+
+
+def apply_change(data, record):
+    """
+    Apply one journal record (add_food(s), edit_food, correct_food,
+    log_meal(s), set_goals, reset_log) to data.
+    """
+    op = record["op"]
+    if op == "add_food":
+        # A name that is already in the catalog keeps its first copy
+        if find_food(data, record["food"]["name"]) is None:
+            data["foods"].append(record["food"])
+    elif op == "add_foods":
+        # A bulk import: the search index is built again once, on next use
+        keys = get_food_keys(data)
+        for food in record["foods"]:
+            if food_key(food["name"]) not in keys:
+                data["foods"].append(food)
+                keys = get_food_keys(data)
+        _search["foods"] = None
+    elif op == "edit_food":
+        # A new version of a food; meals already logged keep their values
+        position = find_food(data, record["food"]["name"])
+        old = data["foods"][position]
+        history = data.setdefault("food_history", {})
+        history.setdefault(str(position), []).append([old["protein"], old["carbs"], old["fat"]])
+        food = dict(record["food"])
+        food["name"] = old["name"]
+        data["foods"][position] = food
+        _plan["foods"] = None
+    elif op == "correct_food":
+        # New values for the food and for every meal logged with it
+        food = record["food"]
+        foods = data["foods"]
+        for i in range(len(foods)):
+            if foods[i]["name"] == food["name"]:
+                foods[i] = food
+        recompute_meals(data, food)
+        _plan["foods"] = None
+    elif op == "log_meal":
+        data["log"].append(record["entry"])
+        aggregates.add_to_day(data["totals"], record["entry"]["date"], record["entry"])
+    elif op == "log_meals":
+        for entry in record["entries"]:
+            data["log"].append(entry)
+            aggregates.add_to_day(data["totals"], entry["date"], entry)
+    elif op == "set_goals":
+        data["goals"] = new_goals(record["goals"])
+    elif op == "reset_log" and "date" in record:
+        # Clear one day and keep the rest of the history
+        day = record["date"]
+        data["log"] = new_log([meal for meal in data["log"] if meal["date"] != day])
+        data["totals"].pop(day, None)
+    elif op == "reset_log":
+        data["log"] = new_log()
+        data["totals"] = {}
+    
+    # Rollups are only kept in data once they have been built (see get_rollups)
+    if has_section(data, "rollups"):
+        rollups.apply_change(data["rollups"], record)
+    data["seq"] = record["seq"]
+
+
+def has_section(data, key):
+    """Return True if data has key, loaded or still waiting in the start-up cache."""
+    return key in data or key in getattr(data, "loaders", {})
+
+
+def record_change(data, record):
+    """Apply a change to data and persist it (journal append or full save)."""
+    try:
+        commit_change(data, record)
+    except:
+        print("Error: Could not save data.")
+        return
+    print("Data saved.")
+
+
+@metrics.timed("final.commit_change")
+def commit_change(data, record):
+    """Give a change the next seq, apply it and persist it (raises OSError)."""
+    if "athlete" in data or STORAGE == "sqlite":
+        # The team storage and SQLite lock what they write themselves
+        record["seq"] = data.get("seq", 0) + 1
+        apply_change(data, record)
+        persist_change(data, record)
+        return
+    
+    with file_lock.locked(DATA_FILE):
+        sync_data(data)
+        record["seq"] = data.get("seq", 0) + 1
+        apply_change(data, record)
+        persist_change(data, record)
+
+
+@metrics.timed("final.persist_change")
+def persist_change(data, record):
+    """
+    Write a change that has already been applied to data.
+    
+    SQLite storage writes one transaction. Team mode appends to the
+    athlete's files, otherwise the change goes to the journal (or the
+    whole file is saved when USE_JOURNAL is off) and the caller must hold
+    the data lock. Raises OSError (sqlite3.Error for SQLite) if it cannot
+    be written.
+    """
+    if STORAGE == "sqlite":
+        sqlite_store.save_change(get_db(), db_athlete(data), record)
+        return
+    
+    if "athlete" in data:
+        save_athlete_change(data, record)
+        return
+    
+    if not USE_JOURNAL:
+        write_snapshot(data)
+        return
+    
+    log = get_journal()
+    journal.append_record(log, record)
+    _disk["offset"] = log["file"].tell()
+    if log["count"] >= COMPACT_EVERY:
+        fold_journal(data)
+
+
+def compact_journal(data):
+    """Fold the journal into the snapshot file and empty the journal."""
+    try:
+        with file_lock.locked(DATA_FILE):
+            sync_data(data)
+            fold_journal(data)
         print("Data saved.")
     except:
         print("Error: Could not save data.")
 
 
+def fold_journal(data):
+    """Write the snapshot and empty the journal (the caller holds the data lock)."""
+    # The snapshot remembers the last seq it contains, so if we crash
+    # before the journal is emptied, replay skips the records it already has
+    write_snapshot(data)
+    journal.truncate_journal(get_journal())
+    _disk["offset"] = 0
+
+
 # ==========================================
 # Function 3: Add New Food (addFood)
 # ==========================================
 def add_food(data):
-    """Add a new food to the database."""
+    """Add a new food to the database (or a new version of one already in it)."""
     print("\n--- Add New Food ---")
     
     name = input("Enter food name: ")
-    if name == "":
+    if name.strip() == "":
         print("Error: Name cannot be empty.")
         return
     
+    # Every name is in the catalog once: offer to update an existing food instead
+    position = find_food(data, name)
+    if position is not None:
+        food = data["foods"][position]
+        print(food["name"] + " is already in the database (P:" + str(food["protein"]) + " C:"
+              + str(food["carbs"]) + " F:" + str(food["fat"]) + ").")
+        if "athlete" in data or STORAGE == "sqlite":
+            # Like edit_food: the team storage and SQLite keep no food versions
+            print("Foods can only be edited in " + DATA_FILE + ".")
+            return
+        answer = input("Save new values as version " + str(food_version(data, position) + 1)
+                       + "? Meals already logged keep theirs. (y/n): ")
+        if answer.strip().lower() != "y":
+            print("Food not changed.")
+            return
+    
     try:
         protein = float(input("Protein per 100g: "))
         carbs = float(input("Carbs per 100g: "))
@@ -91,27 +582,207 @@ def add_food(data):
         print("Error: Please enter numbers only.")
         return
     
-    if protein < 0 or carbs < 0 or fat < 0:
-        print("Error: Values cannot be negative.")
-        return
-    
     # Create new food and add to list
-    new_food = {"name": name, "protein": protein, "carbs": carbs, "fat": fat}
-    data["foods"].append(new_food)
-    save_data(data)
+    try:
+        new_food = make_food(name, protein, carbs, fat)
+    except ValueError as error:
+        print("Error: " + str(error))
+        return
+    if position is not None:
+        record_change(data, {"op": "edit_food", "food": new_food})
+        print("Updated " + data["foods"][position]["name"] + " (version "
+              + str(food_version(data, position)) + ").")
+        return
+    record_change(data, {"op": "add_food", "food": new_food})
     print("Added " + name + " to database!")
 
 
+def make_food(name, protein, carbs, fat):
+    """Build a food (macros per 100g), raising ValueError if it is invalid."""
+    if name.strip() == "":
+        raise ValueError("Name cannot be empty.")
+    if protein < 0 or carbs < 0 or fat < 0:
+        raise ValueError("Values cannot be negative.")
+    return {"name": name, "protein": protein, "carbs": carbs, "fat": fat}
+
+
+# ==========================================
+# Food Catalog: One Food per Name
+# ==========================================
+_catalog = {"foods": None, "count": 0, "keys": {}}
+
+
+def food_key(name):
+    """Return the catalog key of a food name (case, spaces and underscores do not matter)."""
+    return food_search.normalize(name)
+
+
+def get_food_keys(data):
+    """Return {food key: position in data["foods"]}, adding foods added since last time."""
+    foods = data["foods"]
+    if _catalog["foods"] is not foods or _catalog["count"] > len(foods):
+        _catalog["foods"] = foods
+        _catalog["count"] = 0
+        _catalog["keys"] = {}
+    
+    keys = _catalog["keys"]
+    for i in range(_catalog["count"], len(foods)):
+        keys.setdefault(food_key(foods[i]["name"]), i)
+    _catalog["count"] = len(foods)
+    return keys
+
+
+def find_food(data, name):
+    """Return the position of a food in data["foods"] by name, or None."""
+    return get_food_keys(data).get(food_key(name))
+
+
+def unique_foods(foods):
+    """Return foods with only the first copy of each name (older files may repeat names)."""
+    seen = set()
+    unique = []
+    for food in foods:
+        key = food_key(food["name"])
+        if key not in seen:
+            seen.add(key)
+            unique.append(food)
+    if len(unique) == len(foods):
+        return foods
+    return unique
+
+
+def add_foods(data, foods):
+    """
+    Add many foods (make_food dictionaries) as one change, for bulk
+    imports; names already in the catalog (or repeated in foods) keep
+    their first copy. Returns the number of foods added. Raises OSError
+    (sqlite3.Error for SQLite) if they cannot be saved.
+    """
+    keys = get_food_keys(data)
+    seen = set()
+    new = []
+    for food in foods:
+        key = food_key(food["name"])
+        if key not in keys and key not in seen:
+            seen.add(key)
+            new.append(food)
+    if len(new) > 0:
+        commit_change(data, {"op": "add_foods", "foods": new})
+    return len(new)
+
+
+def food_version(data, position):
+    """Return the version number of a food (1 until it is first edited)."""
+    return len(data.get("food_history", {}).get(str(position), ())) + 1
+
+
+def edit_food(data, name, protein, carbs, fat):
+    """
+    Save new macros (per 100g) for a food as its next version; meals
+    already logged keep their values. Raises ValueError (unknown food,
+    invalid values, team or SQLite storage) or OSError if it cannot be saved.
+    """
+    if "athlete" in data or STORAGE == "sqlite":
+        raise ValueError("Foods can only be edited in " + DATA_FILE + ".")
+    food = make_food(name, protein, carbs, fat)
+    if find_food(data, name) is None:
+        raise ValueError("Unknown food: " + name)
+    commit_change(data, {"op": "edit_food", "food": food})
+
+
+def correct_food(data, name, protein, carbs, fat):
+    """
+    Correct the macros (per 100g) of a food and re-derive every meal
+    logged with it. Only for the single-user data file: the team storage
+    and SQLite keep history that is not loaded. Raises ValueError (unknown
+    food, invalid values, other storage) or OSError if it cannot be saved.
+    """
+    if "athlete" in data or STORAGE == "sqlite":
+        raise ValueError("Foods can only be corrected in " + DATA_FILE + ".")
+    food = make_food(name, protein, carbs, fat)
+    if not any(item["name"] == name for item in data["foods"]):
+        raise ValueError("Unknown food: " + name)
+    commit_change(data, {"op": "correct_food", "food": food})
+
+
+def recompute_meals(data, food):
+    """
+    Re-derive every logged meal of a food from its current values, all
+    portions at once, keeping the daily totals and the rollups in step.
+    Returns the number of meals changed.
+    """
+    log = data["log"]
+    columnar = isinstance(log, columnar_log.ColumnarLog)
+    if columnar:
+        positions = log.positions(food["name"])
+    else:
+        positions = [i for i in range(len(log)) if log[i]["name"] == food["name"]]
+    if len(positions) == 0:
+        return 0
+    
+    old = [log[i] for i in positions]
+    columns = portions.recompute(food, [meal["portion"] for meal in old])
+    if columnar:
+        log.set_macros(positions, columns)
+    
+    keep_rollups = has_section(data, "rollups")
+    for k in range(len(positions)):
+        meal = old[k]
+        entry = dict(meal)
+        for key, column in zip(aggregates.MACROS, columns):
+            entry[key] = column[k]
+        if not columnar:
+            log[positions[k]] = entry
+        
+        totals = data["totals"].get(meal["date"])
+        if totals is not None:
+            for key in aggregates.MACROS:
+                totals[key] = totals[key] - meal[key] + entry[key]
+        if keep_rollups:
+            rollups.remove_meal(data["rollups"], meal)
+            rollups.add_meal(data["rollups"], entry)
+    return len(positions)
+
+
+# ==========================================
+# Food Search Index
+# ==========================================
+_search = {"foods": None, "index": None}
+
+
+@metrics.timed("final.get_search_index")
+def get_search_index(data):
+    """Return the search index of data["foods"], adding foods added since last time."""
+    foods = data["foods"]
+    if _search["foods"] is not foods:
+        # Different food list (first call or data reloaded): index it all
+        pairs = [(foods[i]["name"], i) for i in range(len(foods))]
+        _search["index"] = food_search.build_index(pairs)
+        _search["foods"] = foods
+    
+    index = _search["index"]
+    for i in range(len(index["names"]), len(foods)):
+        food_search.add_name(index, foods[i]["name"], i)
+    return index
+
+
 # ==========================================
 # Function 4: Log Meal (calculateCalories)
 # ==========================================
 def log_meal(data):
     """Record a meal and calculate its calories."""
     
-    # Show available foods
-    print("\n--- Available Foods ---")
-    for i in range(len(data["foods"])):
-        food = data["foods"][i]
+    # Search the foods instead of listing all of them
+    query = input("Search food (name or part of it): ")
+    matches = food_search.search(get_search_index(data), query, 10)
+    if len(matches) == 0:
+        print("Error: No foods match '" + query + "'.")
+        return
+    
+    # Show matching foods
+    print("\n--- Matching Foods ---")
+    for i in range(len(matches)):
+        food = data["foods"][matches[i]]
         print(str(i + 1) + ". " + food["name"])
     
     # Get user choice
@@ -123,7 +794,7 @@ def log_meal(data):
         return
     
     # Check if choice is valid
-    if choice < 1 or choice > len(data["foods"]):
+    if choice < 1 or choice > len(matches):
         print("Error: Invalid food number.")
         return
     
@@ -132,32 +803,73 @@ def log_meal(data):
         return
     
     # Get selected food
-    selected = data["foods"][choice - 1]
+    selected = data["foods"][matches[choice - 1]]
     
-    # Calculate nutrition based on portion
-    # Formula: (value per 100g * portion) / 100
-    ratio = portion / 100
-    protein = selected["protein"] * ratio
-    carbs = selected["carbs"] * ratio
-    fat = selected["fat"] * ratio
-    
-    # Calculate calories
-    # Protein: 4 cal/g, Carbs: 4 cal/g, Fat: 9 cal/g
-    calories = (protein * 4) + (carbs * 4) + (fat * 9)
+    entry = make_entry(selected, portion, aggregates.today())
+    record_change(data, {"op": "log_meal", "entry": entry})
+    print("Logged " + str(portion) + "g of " + selected["name"])
+
+
+def make_entry(food, portion, date):
+    """Calculate the nutrition of a portion and build its log entry."""
+    # Formula: (value per 100g * portion) / 100, calories 4/4/9 per gram
+    # (cached, so a repeated food and portion is only worked out once)
+    calories, protein, carbs, fat = portions.food_entry_values(food, portion)
     
     # Create log entry
-    entry = {
-        "name": selected["name"],
+    return {
+        "name": food["name"],
         "portion": portion,
-        "calories": round(calories),
-        "protein": round(protein, 1),
-        "carbs": round(carbs, 1),
-        "fat": round(fat, 1)
+        "calories": calories,
+        "protein": protein,
+        "carbs": carbs,
+        "fat": fat,
+        "date": date
     }
+
+
+@metrics.timed("final.log_meals")
+def log_meals(data, meals):
+    """
+    Log many meals at once with a single save.
     
-    data["log"].append(entry)
-    save_data(data)
-    print("Logged " + str(portion) + "g of " + selected["name"])
+    Each meal is a dictionary with "food" (name, any case), "portion" in
+    grams and an optional "date" (YYYY-MM-DD, default today). Invalid
+    meals are skipped. Returns (logged entries, errors) where each error
+    is (position in meals, message).
+    """
+    # Food names are matched with the catalog's keys (see food_key)
+    foods = data["foods"]
+    keys = get_food_keys(data)
+    
+    today = aggregates.today()
+    entries = []
+    errors = []
+    for i in range(len(meals)):
+        meal = meals[i]
+        position = keys.get(food_key(str(meal.get("food", ""))))
+        if position is None:
+            errors.append((i, "unknown food: " + str(meal.get("food", ""))))
+            continue
+        
+        try:
+            portion = portions.check_grams(meal.get("portion"))
+        except ValueError as error:
+            errors.append((i, str(error)))
+            continue
+        
+        try:
+            date = meal.get("date") or today
+            datetime.date.fromisoformat(date)
+        except (TypeError, ValueError):
+            errors.append((i, "invalid date"))
+            continue
+        
+        entries.append(make_entry(foods[position], portion, date))
+    
+    if len(entries) > 0:
+        record_change(data, {"op": "log_meals", "entries": entries})
+    return entries, errors
 
 
 # ==========================================
@@ -172,25 +884,12 @@ def set_goals(data):
     
     mode_choice = input("Select mode (1-3): ")
     
-    # Set ratios based on choice
-    if mode_choice == "1":
-        mode = "bulking"
-        p_ratio = 0.30
-        c_ratio = 0.50
-        f_ratio = 0.20
-    elif mode_choice == "2":
-        mode = "cutting"
-        p_ratio = 0.40
-        c_ratio = 0.30
-        f_ratio = 0.30
-    elif mode_choice == "3":
-        mode = "maintain"
-        p_ratio = 0.30
-        c_ratio = 0.40
-        f_ratio = 0.30
-    else:
+    # Modes in menu order
+    modes = list(GOAL_RATIOS)
+    if mode_choice not in ("1", "2", "3"):
         print("Error: Invalid choice.")
         return
+    mode = modes[int(mode_choice) - 1]
     
     # Get calorie target
     try:
@@ -199,61 +898,73 @@ def set_goals(data):
         print("Error: Please enter a number.")
         return
     
-    if calories <= 0:
-        print("Error: Calories must be positive.")
+    try:
+        goals = make_goals(mode, calories)
+    except ValueError as error:
+        print("Error: " + str(error))
         return
+    record_change(data, {"op": "set_goals", "goals": goals})
+    
+    print("\nGoals set for " + mode + ":")
+    print("  Calories: " + str(goals["calories"]))
+    print("  Protein: " + str(goals["protein"]) + "g")
+    print("  Carbs: " + str(goals["carbs"]) + "g")
+    print("  Fat: " + str(goals["fat"]) + "g")
+
+
+# (protein, carbs, fat) share of calories for each mode
+GOAL_RATIOS = {
+    "bulking": (0.30, 0.50, 0.20),
+    "cutting": (0.40, 0.30, 0.30),
+    "maintain": (0.30, 0.40, 0.30),
+}
+
+
+def make_goals(mode, calories):
+    """Build the goals for a mode and calorie target, raising ValueError if invalid."""
+    if mode not in GOAL_RATIOS:
+        raise ValueError("Mode must be one of: " + ", ".join(GOAL_RATIOS) + ".")
+    if calories <= 0:
+        raise ValueError("Calories must be positive.")
+    p_ratio, c_ratio, f_ratio = GOAL_RATIOS[mode]
     
     # Calculate macro targets
     # Protein and carbs = 4 calories per gram
     # Fat = 9 calories per gram
-    protein_g = int((calories * p_ratio) / 4)
-    carbs_g = int((calories * c_ratio) / 4)
-    fat_g = int((calories * f_ratio) / 9)
-    
-    # Save goals
-    data["goals"]["calories"] = int(calories)
-    data["goals"]["protein"] = protein_g
-    data["goals"]["carbs"] = carbs_g
-    data["goals"]["fat"] = fat_g
-    data["goals"]["mode"] = mode
-    
-    save_data(data)
-    
-    print("\nGoals set for " + mode + ":")
-    print("  Calories: " + str(int(calories)))
-    print("  Protein: " + str(protein_g) + "g")
-    print("  Carbs: " + str(carbs_g) + "g")
-    print("  Fat: " + str(fat_g) + "g")
+    return {
+        "calories": int(calories),
+        "protein": int((calories * p_ratio) / 4),
+        "carbs": int((calories * c_ratio) / 4),
+        "fat": int((calories * f_ratio) / 9),
+        "mode": mode
+    }
 
 
 # ==========================================
 # Function 6: View Report (generateReport + calculateDeficit)
 # ==========================================
+@metrics.timed("final.view_report")
 def view_report(data):
     """Show daily nutrition report with progress."""
     print("\n--- Daily Report ---")
     print("Mode: " + data["goals"]["mode"])
     
+    report = build_report(data, aggregates.today())
+    totals = report["totals"]
+    
     # Check if any meals logged
-    if len(data["log"]) == 0:
+    if totals["meals"] == 0:
         print("No meals logged today.")
         return
     
-    # Calculate totals using loop
-    total_cal = 0
-    total_p = 0
-    total_c = 0
-    total_f = 0
-    
-    for meal in data["log"]:
-        total_cal = total_cal + meal["calories"]
-        total_p = total_p + meal["protein"]
-        total_c = total_c + meal["carbs"]
-        total_f = total_f + meal["fat"]
+    total_cal = totals["calories"]
+    total_p = totals["protein"]
+    total_c = totals["carbs"]
+    total_f = totals["fat"]
     
     # Print each meal
     print("\nMeals logged:")
-    for meal in data["log"]:
+    for meal in report["meals"]:
         print("  " + meal["name"] + " (" + str(meal["portion"]) + "g): " + str(meal["calories"]) + " cal")
     
     # Print totals
@@ -272,15 +983,45 @@ def view_report(data):
     
     # Calculate deficit or surplus
     print("\n--- Status ---")
-    diff = data["goals"]["calories"] - total_cal
+    diff = report["remaining"]
     if diff > 0:
         print("Deficit: " + str(diff) + " calories remaining")
     else:
         print("Surplus: " + str(abs(diff)) + " calories over target")
 
 
+@metrics.timed("final.build_report")
+def build_report(data, day):
+    """Return a day's meals, totals, goals and calories remaining (negative = surplus)."""
+    # The day's totals are kept up to date by log_meal
+    totals = aggregates.day_totals(data["totals"], day)
+    
+    # Find the day's meals, searching back from the newest entry
+    meals = []
+    i = len(data["log"]) - 1
+    while i >= 0 and len(meals) < totals["meals"]:
+        if data["log"][i]["date"] == day:
+            # Plain dictionaries, whatever the log backend
+            meals.append(dict(data["log"][i]))
+        i = i - 1
+    meals.reverse()
+    
+    return {
+        "date": day,
+        "meals": meals,
+        "totals": dict(totals),
+        "goals": dict(data["goals"]),
+        "remaining": data["goals"]["calories"] - totals["calories"]
+    }
+
+
 def show_progress(label, current, goal):
     """Helper function to display a progress bar."""
+    print(progress_bar(label, current, goal))
+
+
+def progress_bar(label, current, goal):
+    """Return the progress bar line of show_progress."""
     if goal <= 0:
         percent = 0
     else:
@@ -295,21 +1036,115 @@ def show_progress(label, current, goal):
     empty = bar_length - filled
     
     bar = "[" + "#" * filled + "-" * empty + "]"
-    print(label + ": " + bar + " " + str(percent) + "%")
+    return label + ": " + bar + " " + str(percent) + "%"
 
 
 # ==========================================
 # Function 7: Reset Log
 # ==========================================
 def reset_log(data):
-    """Clear the daily log."""
-    confirm = input("Clear all logged meals? (y/n): ")
+    """Clear today's meals (earlier days are kept)."""
+    confirm = input("Clear all of today's logged meals? (y/n): ")
     if confirm == "y" or confirm == "Y":
-        data["log"] = []
-        save_data(data)
+        record_change(data, {"op": "reset_log", "date": aggregates.today()})
         print("Log cleared.")
 
 
+# ==========================================
+# Function 8: Plan Meals
+# ==========================================
+def plan_meals(data):
+    """Suggest portions of a few foods that fill the rest of today's goals."""
+    print("\n--- Plan Meals ---")
+    try:
+        max_items = int(input("Number of foods (default " + str(meal_optimizer.MAX_ITEMS) + "): ") or meal_optimizer.MAX_ITEMS)
+        max_grams = float(input("Max grams per food (default " + str(meal_optimizer.MAX_GRAMS) + "): ") or meal_optimizer.MAX_GRAMS)
+    except ValueError:
+        print("Error: Please enter valid numbers.")
+        return
+    if max_items <= 0 or max_grams <= 0:
+        print("Error: Values must be greater than 0.")
+        return
+    exclude = input("Foods to leave out (comma separated, optional): ").split(",")
+    
+    totals = aggregates.day_totals(data["totals"], aggregates.today())
+    plan = meal_optimizer.plan_meals(get_plan_table(data), data["goals"], totals,
+                                     max_items, max_grams, exclude)
+    if len(plan["items"]) == 0:
+        print("Nothing to add - today's goals are already met.")
+        return
+    
+    for item in plan["items"]:
+        print(str(item["grams"]) + "g " + item["name"] + " - " + str(item["calories"]) + " cal"
+              + " (P:" + str(item["protein"]) + " C:" + str(item["carbs"]) + " F:" + str(item["fat"]) + ")")
+    after = plan["after"]
+    print("Left after the plan - Calories: " + str(after["calories"]) + " Protein: " + str(after["protein"])
+          + "g Carbs: " + str(after["carbs"]) + "g Fat: " + str(after["fat"]) + "g")
+
+
+# Macro table of data["foods"] for the optimizer, rebuilt when foods change
+_plan = {"foods": None, "count": 0, "table": None}
+
+
+@metrics.timed("final.get_plan_table")
+def get_plan_table(data):
+    """Return the optimizer's macro table of data["foods"]."""
+    foods = data["foods"]
+    if _plan["foods"] is not foods or _plan["count"] != len(foods):
+        _plan["table"] = meal_optimizer.build_table(foods)
+        _plan["foods"] = foods
+        _plan["count"] = len(foods)
+    return _plan["table"]
+
+
+# ==========================================
+# Function 9: View Trends
+# ==========================================
+@metrics.timed("final.view_trends")
+def view_trends(data):
+    """Show 7/28/90-day averages, goal adherence, weekly trends and top foods."""
+    report = rollups.trend_report(get_rollups(data), data["goals"])
+    goals = data["goals"]
+    
+    print("\n--- Trends up to " + report["date"] + " ---")
+    for window in report["windows"]:
+        average = window["average"]
+        print("\nLast " + str(window["days"]) + " days (" + str(window["logged_days"]) + " logged)")
+        if window["logged_days"] == 0:
+            print("  No meals logged.")
+            continue
+        for key in aggregates.MACROS:
+            unit = "" if key == "calories" else "g"
+            print("  " + (key.capitalize() + ":").ljust(10) + str(average[key]) + unit + " / "
+                  + str(goals[key]) + unit + " a day, on target "
+                  + str(window["adherence"][key]) + "% of days")
+        foods = [food["name"] + " " + str(food["share"]) + "%" for food in window["top_foods"]]
+        print("  Top foods (calories): " + ", ".join(foods))
+    
+    print("\n--- Weekly Calories (average per logged day) ---")
+    trend = report["trend"]
+    for week in trend["weeks"]:
+        calories = week["average"]["calories"]
+        bar = "#" * int(min(calories / max(goals["calories"], 1), 2) * 20)
+        print(week["week"] + " " + str(round(calories)).rjust(5) + " " + bar)
+    change = trend["per_week"]
+    print("Trend per week - Calories: " + str(change["calories"]) + " Protein: " + str(change["protein"])
+          + "g Carbs: " + str(change["carbs"]) + "g Fat: " + str(change["fat"]) + "g")
+
+
+def get_rollups(data):
+    """Return the daily/weekly/monthly meal summaries of data (see rollups.py)."""
+    if STORAGE == "sqlite":
+        return sqlite_store.load_rollups(get_db(), db_athlete(data))
+    if "athlete" in data:
+        # Team storage keeps the rollups of the athlete's whole history
+        return partitions.load_rollups(TEAM_DIR, data["athlete"])
+    if not has_section(data, "rollups"):
+        # Older data files: add up the log once, then keep it up to date
+        data["rollups"] = rollups.build_rollups(data["log"])
+    return data["rollups"]
+
+
 # ==========================================
 # Main Program
 # ==========================================
@@ -319,8 +1154,23 @@ def main():
     print("  CS5001 Final Project - Hongkun Yi")
     print("==============================================")
     
+    # Team mode: python final.py --athlete NAME
+    args = metrics.configure(sys.argv[1:])
+    athlete = None
+    if "--athlete" in args:
+        position = args.index("--athlete")
+        if position + 1 >= len(args):
+            print("Usage: python final.py [--athlete NAME] [--metrics FILE] [--profile cpu|memory]")
+            return
+        athlete = args[position + 1]
+        print("Athlete: " + athlete)
+    
     # Load data from file
-    data = load_data()
+    try:
+        data = load_data(athlete)
+    except ValueError as error:
+        print("Error: " + str(error))
+        return
     
     # Main menu loop
     running = True
@@ -332,7 +1182,9 @@ def main():
         print("4. Set Goals")
         print("5. View Report")
         print("6. Reset Log")
-        print("7. Exit")
+        print("7. Plan Meals")
+        print("8. View Trends")
+        print("9. Exit")
         
         choice = input("Enter choice: ")
         
@@ -358,6 +1210,15 @@ def main():
             reset_log(data)
         
         elif choice == "7":
+            plan_meals(data)
+        
+        elif choice == "8":
+            view_trends(data)
+        
+        elif choice == "9":
+            # Fold the journal into the data file before leaving
+            if athlete is None and STORAGE == "json" and USE_JOURNAL and journal.count_records(JOURNAL_FILE) > 0:
+                compact_journal(data)
             print("Goodbye!")
             running = False
         
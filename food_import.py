@@ -0,0 +1,415 @@
+"""
+==============================================================================
+Athletic Nutrition Planner
+Bulk Food Import
+
+Description:
+    Loads large nutrient tables (hundreds of thousands of foods from
+    public-domain datasets) into the food database, instead of adding
+    foods one at a time with Add Food.
+
+    The file is streamed in batches of BATCH_ROWS rows. A pool of worker
+    processes parses and checks each batch (numbers, no negative values -
+    the checks of final.make_food - and nothing that is not a finite
+    number), while the main process keeps reading and inserts the checked
+    foods. Foods are inserted in bulk with a single index rebuild at the
+    end: one change for final.py (final.add_foods), one write per batch
+    and one index update for nutrition_planner.py (addFoods / indexFoods).
+    A name already in the database, or repeated in the file, keeps its
+    first copy.
+
+    CSV files need a header row. The columns are found by name, without
+    regard to case or units ("Protein (g)" is protein):
+
+        name:    name, food, description
+        protein: protein
+        carbs:   carbs, carbohydrates, carbohydrate
+        fat:     fat, total_fat, total_lipid
+
+    or named with --columns (for example --columns name=Food,fat="Total
+    lipid (fat) (g)"). JSON files hold one object per line (.jsonl) or a
+    list of objects (.json, split into objects by the main process) with
+    the same keys.
+
+Usage:
+    python food_import.py FILE [--planner] [--workers N] [--columns KEY=COLUMN,...]
+==============================================================================
+"""
+
+import collections
+import csv
+import json
+import math
+import multiprocessing
+import os
+import sys
+import time
+
+import final
+import metrics
+
+# Rows parsed and checked by one worker task
+BATCH_ROWS = 5000
+
+# Bytes of a JSON list decoded at a time
+READ_CHUNK = 1024 * 1024
+
+# Longest piece of JSON (a number, true/false/null or \uXXXX escape) that
+# stops decoding a few characters before its end when the chunk cuts it
+PARTIAL_TOKEN = 8
+
+# Column names recognised for each field (see column_key)
+COLUMNS = {
+    "name": ("name", "food", "description"),
+    "protein": ("protein",),
+    "carbs": ("carbs", "carbohydrates", "carbohydrate"),
+    "fat": ("fat", "total_fat", "total_lipid"),
+}
+
+USAGE = "Usage: python food_import.py FILE [--planner] [--workers N] [--columns KEY=COLUMN,...]"
+
+
+# ==========================================
+# Reading Food Files
+# ==========================================
+def column_key(title):
+    """Return the lookup key of a column title: "Protein (g)" -> "protein"."""
+    return title.split("(")[0].strip().lower().replace(" ", "_").replace("-", "_")
+
+
+def find_columns(titles, columns=None):
+    """
+    Return {field: column key} for a file's column titles (or JSON keys),
+    raising ValueError if a field has no column. columns maps fields to
+    column titles chosen by the user.
+    """
+    keys = [column_key(title) for title in titles]
+    found = {}
+    for field in COLUMNS:
+        if columns is not None and field in columns:
+            names = (column_key(columns[field]),)
+        else:
+            names = COLUMNS[field]
+        for name in names:
+            if name in keys:
+                found[field] = name
+                break
+        if field not in found:
+            raise ValueError("no " + field + " column (tried " + ", ".join(names) + ")")
+    return found
+
+
+def read_batches(path, columns=None, batch_rows=BATCH_ROWS):
+    """
+    Yield work for the workers from a food file, one batch at a time:
+    (format, first line number, column map or None, raw rows). Raises
+    OSError if the file cannot be read, ValueError if a CSV header lacks
+    a column.
+    """
+    if path.endswith(".json"):
+        yield from _json_list_batches(path, columns, batch_rows)
+        return
+
+    with open(path, "r", newline="", encoding="utf-8-sig", errors="replace") as file:
+        if path.endswith(".jsonl"):
+            kind = "jsonl"
+            found = None
+            line_number = 0
+        else:
+            kind = "csv"
+            header = next(csv.reader([file.readline()]), [])
+            found = find_columns(header, columns)
+            # Position of each field's column in a row
+            keys = [column_key(title) for title in header]
+            found = {field: keys.index(key) for field, key in found.items()}
+            line_number = 1
+
+        rows = []
+        first = line_number + 1
+        quoted = False
+        for line in file:
+            line_number += 1
+            rows.append(line)
+            # A quoted CSV field can hold a line break: only cut batches between rows
+            if kind == "csv" and line.count('"') % 2 == 1:
+                quoted = not quoted
+            if len(rows) >= batch_rows and not quoted:
+                yield kind, first, found, rows
+                rows = []
+                first = line_number + 1
+        if len(rows) > 0:
+            yield kind, first, found, rows
+
+
+def _json_list_batches(path, columns, batch_rows):
+    """read_batches for a JSON list of objects, decoded a chunk at a time."""
+    decoder = json.JSONDecoder()
+    with open(path, "r", encoding="utf-8-sig", errors="replace") as file:
+        buffer = file.read(READ_CHUNK).lstrip()
+        if not buffer.startswith("["):
+            raise ValueError("a .json food file must hold a list of objects")
+        position = 1
+        items = []
+        number = 1
+        while True:
+            # Skip commas and white space between items
+            while position < len(buffer) and buffer[position] in " \t\r\n,":
+                position += 1
+            if position < len(buffer) and buffer[position] == "]":
+                break
+            try:
+                item, end = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError as error:
+                # Reading on can only fix an item the end of the chunk cut off;
+                # invalid JSON earlier in the chunk is reported straight away
+                cut = (error.pos + PARTIAL_TOKEN >= len(buffer)
+                       or error.msg.startswith("Unterminated string"))
+                more = file.read(READ_CHUNK) if cut else ""
+                if more == "":
+                    raise ValueError("item " + str(number + len(items)) + " of the JSON list "
+                                     + ("ends early" if cut else "is not valid JSON: " + error.msg))
+                buffer = buffer[position:] + more
+                position = 0
+                continue
+            if end == len(buffer):
+                # A number may go on in the next chunk: decode it again with more text
+                more = file.read(READ_CHUNK)
+                if more != "":
+                    buffer = buffer[position:] + more
+                    position = 0
+                    continue
+            items.append(item)
+            position = end
+            if len(items) >= batch_rows:
+                yield "objects", number, columns, items
+                number += len(items)
+                items = []
+        if len(items) > 0:
+            yield "objects", number, columns, items
+
+
+# ==========================================
+# Checking Foods (in the workers)
+# ==========================================
+def check_batch(task, planner=False):
+    """
+    Parse and check one batch; return (foods, rejected) where rejected
+    holds (line number, message) pairs. planner: names also may not hold
+    a comma (nutrition_planner.py's database is comma separated).
+    """
+    kind, first, found, rows = task
+    foods = []
+    rejected = []
+    if kind == "csv":
+        reader = csv.reader(rows)
+        for row in reader:
+            number = first + reader.line_num - 1
+            if len(row) == 0:
+                continue
+            try:
+                values = {field: row[index] for field, index in found.items()}
+            except IndexError:
+                rejected.append((number, "missing columns"))
+                continue
+            _check_food(values, number, planner, foods, rejected)
+        return foods, rejected
+
+    for i in range(len(rows)):
+        item = rows[i]
+        if kind == "jsonl":
+            if item.strip() == "":
+                continue
+            try:
+                item = json.loads(item)
+            except ValueError:
+                rejected.append((first + i, "could not parse line"))
+                continue
+        if not isinstance(item, dict):
+            rejected.append((first + i, "not an object"))
+            continue
+        try:
+            keys = find_columns(item.keys(), found)
+        except ValueError as error:
+            rejected.append((first + i, str(error)))
+            continue
+        by_key = {column_key(title): value for title, value in item.items()}
+        _check_food({field: by_key[key] for field, key in keys.items()}, first + i, planner,
+                    foods, rejected)
+    return foods, rejected
+
+
+def _check_food(values, number, planner, foods, rejected):
+    """Check one food's values and add it to foods or its problem to rejected."""
+    if not isinstance(values["name"], str):
+        rejected.append((number, "name must be text"))
+        return
+    name = values["name"].strip()
+    if planner and "," in name:
+        rejected.append((number, "name cannot contain a comma"))
+        return
+    try:
+        macros = [float(values[field]) for field in ("protein", "carbs", "fat")]
+    except (TypeError, ValueError):
+        rejected.append((number, "protein, carbs and fat must be numbers"))
+        return
+    if not all(math.isfinite(value) for value in macros):
+        rejected.append((number, "protein, carbs and fat must be numbers"))
+        return
+    try:
+        foods.append(final.make_food(name, macros[0], macros[1], macros[2]))
+    except ValueError as error:
+        rejected.append((number, str(error)))
+
+
+def _check_planner_batch(task):
+    return check_batch(task, True)
+
+
+# ==========================================
+# Importing
+# ==========================================
+def import_foods(path, add_batch, key, workers=None, columns=None, planner=False):
+    """
+    Stream a food file through a pool of workers into add_batch.
+
+    add_batch(foods) inserts a list of checked foods with no name seen
+    before and returns how many it added; key(name) is the name as the
+    database compares it. Returns {"rows", "added", "repeated" (names
+    seen earlier in the file), "duplicates" (names already in the
+    database), "rejected": [(line number, message)]}.
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    check = _check_planner_batch if planner else check_batch
+    stats = {"rows": 0, "added": 0, "repeated": 0, "duplicates": 0, "rejected": []}
+    seen = set()
+
+    def insert(result):
+        foods, rejected = result
+        stats["rows"] += len(foods) + len(rejected)
+        stats["rejected"].extend(rejected)
+        batch = []
+        for food in foods:
+            name = key(food["name"])
+            if name not in seen:
+                seen.add(name)
+                batch.append(food)
+        added = add_batch(batch) if len(batch) > 0 else 0
+        stats["added"] += added
+        stats["repeated"] += len(foods) - len(batch)
+        stats["duplicates"] += len(batch) - added
+
+    if workers == 1:
+        for task in read_batches(path, columns):
+            insert(check(task))
+    else:
+        with multiprocessing.Pool(workers) as pool:
+            # A few batches per worker in flight keeps memory flat; results
+            # are taken in file order, so the first copy of a name wins
+            pending = collections.deque()
+            for task in read_batches(path, columns):
+                pending.append(pool.apply_async(check, (task,)))
+                if len(pending) >= 2 * workers:
+                    insert(pending.popleft().get())
+            while len(pending) > 0:
+                insert(pending.popleft().get())
+    stats["rejected"].sort()
+    return stats
+
+
+# ==========================================
+# Command Line
+# ==========================================
+def main(args):
+    args = metrics.configure(args)
+    options = {"--workers": str(os.cpu_count() or 1), "--columns": None}
+    planner = False
+    paths = []
+    i = 0
+    while i < len(args):
+        if args[i] in options and i + 1 < len(args):
+            options[args[i]] = args[i + 1]
+            i += 2
+        elif args[i] == "--planner":
+            planner = True
+            i += 1
+        elif args[i].startswith("--"):
+            print(USAGE)
+            return 2
+        else:
+            paths.append(args[i])
+            i += 1
+
+    try:
+        if len(paths) != 1:
+            raise ValueError("give one food file")
+        workers = int(options["--workers"])
+        if workers < 1:
+            raise ValueError("workers must be at least 1")
+        columns = None
+        if options["--columns"] is not None:
+            columns = {}
+            for pair in options["--columns"].split(","):
+                field, _, title = pair.partition("=")
+                if field.strip() not in COLUMNS or title.strip() == "":
+                    raise ValueError("columns must be KEY=COLUMN with KEY one of " + ", ".join(COLUMNS))
+                columns[field.strip()] = title.strip()
+    except ValueError as error:
+        print("Error: " + str(error))
+        print(USAGE)
+        return 2
+
+    path = paths[0]
+    if planner:
+        import nutrition_planner
+        nutrition_planner.initialize_files()
+
+        def add_batch(foods):
+            return nutrition_planner.addFoods(foods, reindex=False)
+
+        def key(name):
+            return name.strip().lower()
+    else:
+        data = final.load_data()
+        new_foods = []
+
+        def add_batch(foods):
+            # Collected and saved as one change after the last batch
+            keys = final.get_food_keys(data)
+            new = [food for food in foods if final.food_key(food["name"]) not in keys]
+            new_foods.extend(new)
+            return len(new)
+
+        key = final.food_key
+
+    start = time.perf_counter()
+    try:
+        stats = import_foods(path, add_batch, key, workers, columns, planner)
+        if planner:
+            nutrition_planner.indexFoods()
+        else:
+            final.add_foods(data, new_foods)
+            if "athlete" not in data and final.STORAGE == "json" and final.USE_JOURNAL:
+                # Fold the (large) change into the data file straight away
+                final.compact_journal(data)
+    except (OSError, ValueError) as error:
+        print("Error: Could not import " + path + ": " + str(error))
+        return 1
+    elapsed = time.perf_counter() - start
+
+    rejected = stats["rejected"]
+    unit = "Item " if path.endswith(".json") else "Line "
+    for line_number, message in rejected[:20]:
+        print(unit + str(line_number) + ": " + message)
+    if len(rejected) > 20:
+        print("... and " + str(len(rejected) - 20) + " more rejected rows")
+
+    rate = stats["rows"] / elapsed if elapsed > 0 else 0
+    print("Imported " + str(stats["added"]) + " foods (" + str(stats["duplicates"]) + " already in the database, "
+          + str(stats["repeated"]) + " repeated in the file, " + str(len(rejected)) + " rejected) from " + str(stats["rows"]) + " rows in "
+          + str(round(elapsed, 2)) + "s, " + str(int(rate)) + " rows/sec")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
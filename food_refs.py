@@ -0,0 +1,274 @@
+"""
+==============================================================================
+Athletic Nutrition Planner
+Food References in the Meal Log
+
+Description:
+    Writes final.py's meal log to nutrition_data.json as references to
+    the food catalog instead of full entries.
+
+    A meal entry repeats the food's name and four rounded values that are
+    all worked out from the food and the portion (see final.make_entry).
+    On disk each meal is stored as a short row instead:
+
+        [food id, portion, day]             the food's first values
+        [food id, portion, day, version]    a later version (final.edit_food)
+
+    food id is the food's position in data["foods"] (foods are only ever
+    added at the end or updated in place), day is the date as a day number
+    (datetime.date.toordinal), and version n > 1 is the food's values after
+    its (n - 1)th edit, so rows keep pointing at the values they were logged
+    with however often the food is edited later. A row takes about 20
+    bytes of JSON instead of about 120.
+
+    When loading, the calories and macros of the whole log are worked out
+    again in one go (portions.entry_columns, NumPy when installed) with
+    the arithmetic make_entry uses, so every entry gets back exactly the
+    values it was logged with. Saving checks each entry the same way: an
+    entry that cannot be rebuilt exactly (an unknown food, values edited
+    by hand, extra fields) is kept in full, so converting a log never
+    changes it.
+
+Usage (rewrites nutrition_data.json in the current folder):
+    python food_refs.py            # meals as food references
+    python food_refs.py --expand   # meals in full, as older versions wrote them
+==============================================================================
+"""
+
+import datetime
+import os
+import sys
+
+import columnar_log
+import metrics
+import portions
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Fields of a meal entry, in final.make_entry order
+FIELDS = ("name", "portion", "calories", "protein", "carbs", "fat", "date")
+
+# Below this, float32 (ColumnarLog) still tells every value with one decimal apart
+FLOAT32_EXACT = 2 ** 17
+
+
+# ==========================================
+# Food Versions
+# ==========================================
+def food_values(foods, history, food_id, version):
+    """Return (protein, carbs, fat) per 100g of one version of a food (0: the current one)."""
+    older = history.get(str(food_id), ())
+    if 0 < version <= len(older):
+        protein, carbs, fat = older[version - 1]
+        return protein, carbs, fat
+    food = foods[food_id]
+    return food["protein"], food["carbs"], food["fat"]
+
+
+# ==========================================
+# Encoding and Decoding
+# ==========================================
+def encode_log(log, foods, history):
+    """Return the rows of a meal log (any iterable of entries) for DATA_FILE."""
+    ids = {}
+    for i in range(len(foods)):
+        ids.setdefault(foods[i]["name"], i)
+    if numpy is not None and isinstance(log, columnar_log.ColumnarLog) and len(log) > 0:
+        return _encode_columns(log, ids, foods, history)
+
+    # Rows are made for each entry's food and day first, then checked
+    # all at once against the values of the food's current version
+    current = {}
+    days = {}
+    rows = []
+    pending = []
+    protein = []
+    carbs = []
+    fat = []
+    for entry in log:
+        food_id = ids.get(entry["name"]) if len(entry) == len(FIELDS) else None
+        day = days.get(entry["date"]) if food_id is not None else None
+        if food_id is not None and day is None:
+            try:
+                day = days[entry["date"]] = datetime.date.fromisoformat(entry["date"]).toordinal()
+            except (TypeError, ValueError):
+                food_id = None
+        if food_id is None:
+            # Anything that cannot be rebuilt exactly is kept as it is
+            rows.append(dict(entry))
+            continue
+
+        values = current.get(food_id)
+        if values is None:
+            values = current[food_id] = food_values(foods, history, food_id, 0)
+        protein.append(values[0])
+        carbs.append(values[1])
+        fat.append(values[2])
+        pending.append(entry)
+        rows.append([food_id, entry["portion"], day])
+
+    try:
+        columns = portions.entry_columns(protein, carbs, fat, [entry["portion"] for entry in pending])
+    except (TypeError, ValueError):
+        # A portion that is not a number: check the entries one at a time
+        columns = ([None] * len(pending),) * 4
+
+    k = 0
+    for i in range(len(rows)):
+        row = rows[i]
+        if type(row) is not list:
+            continue
+        entry = pending[k]
+        values = (entry["calories"], entry["protein"], entry["carbs"], entry["fat"])
+        if values != (columns[0][k], columns[1][k], columns[2][k], columns[3][k]):
+            rows[i] = _encode_older(entry, values, row, foods, history)
+        elif history and str(row[0]) in history:
+            row.append(len(history[str(row[0])]) + 1)
+        k += 1
+    return rows
+
+
+def _encode_columns(log, ids, foods, history):
+    """encode_log for a ColumnarLog, straight from its arrays."""
+    # Food ids of the log's interned names -> positions in foods (-1: unknown)
+    positions = numpy.array([ids.get(name, -1) for name in log.names], dtype="q")[
+        numpy.frombuffer(log.food, dtype="I")]
+    known = positions >= 0
+    used = numpy.unique(positions[known]).tolist()
+    table = numpy.zeros((used[-1] + 1 if len(used) > 0 else 1, 3))
+    for food_id in used:
+        table[food_id] = food_values(foods, history, food_id, 0)
+    values = table[numpy.where(known, positions, 0)]
+    grams = numpy.frombuffer(log.portion, dtype="d")
+    columns = portions.entry_columns(values[:, 0], values[:, 1], values[:, 2], grams)
+
+    # The log keeps macros as float32: compare in float32 where that is exact
+    same = known.copy()
+    for key, column in zip(columnar_log.MACROS, columns):
+        expected = numpy.asarray(column, dtype="d")
+        same &= numpy.frombuffer(getattr(log, key), dtype="f") == expected.astype("f")
+        same &= numpy.abs(expected) < FLOAT32_EXACT
+
+    rows = [[food_id, portion, day] for food_id, portion, day
+            in zip(positions.tolist(), grams.tolist(), numpy.frombuffer(log.date, dtype="i").tolist())]
+    for i in numpy.flatnonzero(~same).tolist():
+        entry = log.entry(i)
+        values = (entry["calories"], entry["protein"], entry["carbs"], entry["fat"])
+        if rows[i][0] < 0:
+            rows[i] = dict(entry)
+        else:
+            rows[i] = _encode_older(entry, values, rows[i][:3], foods, history)
+    for i in numpy.flatnonzero(same).tolist() if len(history) > 0 else ():
+        if str(rows[i][0]) in history:
+            rows[i].append(len(history[str(rows[i][0])]) + 1)
+    return rows
+
+
+def _encode_older(entry, values, row, foods, history):
+    """Return the row of an entry logged with an older version of its food, or the entry itself."""
+    food_id = row[0]
+    for version in range(len(history.get(str(food_id), ())), 0, -1):
+        protein, carbs, fat = food_values(foods, history, food_id, version)
+        try:
+            if portions.entry_values(protein, carbs, fat, entry["portion"]) == values:
+                return row + [version] if version > 1 else row
+        except (TypeError, ValueError):
+            break
+    return dict(entry)
+
+
+def decode_log(rows, foods, history):
+    """Return the meal entries (dictionaries) of rows read from DATA_FILE."""
+    if not isinstance(rows, list):
+        return rows
+
+    foods_seen = {}
+    dates_seen = {}
+    names = []
+    protein = []
+    carbs = []
+    fat = []
+    grams = []
+    dates = []
+    for row in rows:
+        if type(row) is not list:
+            continue
+        key = (row[0], row[3] if len(row) > 3 else 1)
+        food = foods_seen.get(key)
+        if food is None:
+            food = foods_seen[key] = (foods[key[0]]["name"],) + food_values(foods, history, key[0], key[1])
+        date = dates_seen.get(row[2])
+        if date is None:
+            date = dates_seen[row[2]] = datetime.date.fromordinal(row[2]).isoformat()
+        names.append(food[0])
+        protein.append(food[1])
+        carbs.append(food[2])
+        fat.append(food[3])
+        grams.append(row[1])
+        dates.append(date)
+
+    columns = portions.entry_columns(protein, carbs, fat, grams)
+    entries = [{"name": name, "portion": portion, "calories": calories, "protein": protein,
+                "carbs": carbs, "fat": fat, "date": date}
+               for name, portion, calories, protein, carbs, fat, date
+               in zip(names, grams, columns[0], columns[1], columns[2], columns[3], dates)]
+    if len(entries) == len(rows):
+        return entries
+    if len(entries) == 0:
+        return rows
+
+    # Put the entries kept in full back in their places
+    decoded = iter(entries)
+    return [next(decoded) if type(row) is list else row for row in rows]
+
+
+# ==========================================
+# Converter
+# ==========================================
+def convert(expand=False):
+    """Rewrite final.DATA_FILE with meals as food references (or in full); return stats."""
+    # Imported here: final.py imports this module
+    import file_lock
+    import final
+
+    if not os.path.exists(final.DATA_FILE):
+        raise OSError(final.DATA_FILE + " not found")
+    before = os.path.getsize(final.DATA_FILE)
+    if expand:
+        final.LOG_FORMAT = "entries"
+    with file_lock.locked(final.DATA_FILE):
+        data = final.read_data()
+        final.fold_journal(data)
+
+    kept = 0
+    if not expand:
+        stored = encode_log(data["log"], data["foods"], data.get("food_history", {}))
+        kept = sum(1 for row in stored if type(row) is not list)
+    return {"meals": len(data["log"]), "kept": kept, "before": before,
+            "after": os.path.getsize(final.DATA_FILE)}
+
+
+def main(args):
+    args = metrics.configure(args)
+    if len(args) > 1 or (len(args) == 1 and args[0] != "--expand"):
+        print("Usage: python food_refs.py [--expand]")
+        return 2
+
+    try:
+        stats = convert(len(args) == 1)
+    except (OSError, ValueError, KeyError, IndexError) as error:
+        print("Error: Could not convert the meal log: " + str(error))
+        return 1
+
+    print("Rewrote " + str(stats["meals"]) + " meals: " + str(stats["before"]) + " -> "
+          + str(stats["after"]) + " bytes")
+    if stats["kept"] > 0:
+        print(str(stats["kept"]) + " meals could not be matched to their food and were kept in full")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,199 @@
+"""
+==============================================================================
+Athletic Nutrition Planner
+Food Search
+
+Description:
+    Finds foods by name without printing (or scanning) the whole catalog.
+
+    Two lookups are combined:
+      - Prefix search: every name is stored in a sorted list, once for
+        each word it contains ("chicken breast" is stored as "chicken
+        breast" and "breast"), so typing the start of any word finds it
+        with a binary search.
+      - Fuzzy search: names are also indexed by their 3-letter pieces
+        (trigrams). When a query has too few prefix matches (typos such
+        as "brocoli"), the names sharing the most trigrams with it are
+        ranked by trigram similarity. The trigram index is only built
+        the first time a fuzzy search is needed.
+
+    The index is a plain dictionary and foods can be added to it at any
+    time; nothing is ever rebuilt.
+==============================================================================
+"""
+
+import bisect
+import heapq
+
+import metrics
+
+# Fuzzy search: only read the rarest query trigrams (at most
+# FUZZY_POSTINGS names each), and only score the 2 * k names sharing the
+# most trigrams, so common pieces like "ing" stay cheap
+FUZZY_TRIGRAMS = 6
+FUZZY_POSTINGS = 200
+FUZZY_MIN_SIMILARITY = 0.25
+
+
+# ==========================================
+# Building the Index
+# ==========================================
+def normalize(name):
+    """Lower-case a name and turn underscores and repeated spaces into one space."""
+    return " ".join(name.replace("_", " ").lower().split())
+
+
+def trigrams(text):
+    """Return the set of 3-letter pieces of a name (padded so short names work)."""
+    padded = "  " + text + " "
+    pieces = set()
+    for i in range(len(padded) - 2):
+        pieces.add(padded[i:i + 3])
+    return pieces
+
+
+def new_index():
+    """Return an empty search index."""
+    return {
+        "keys": [],       # sorted "word onwards" strings, for prefix search
+        "key_ids": [],    # entry id for each key (same order as keys)
+        "names": [],      # entry id -> normalized name
+        "values": [],     # entry id -> value returned by search()
+        "grams": None,    # trigram -> list of entry ids (built on first use)
+    }
+
+
+def build_index(items):
+    """Build an index from (name, value) pairs, sorting the prefix keys once."""
+    index = new_index()
+    pairs = []
+    for name, value in items:
+        entry_id = _add_entry(index, name, value)
+        for key in word_keys(index["names"][entry_id]):
+            pairs.append((key, entry_id))
+    pairs.sort()
+    index["keys"] = [key for key, entry_id in pairs]
+    index["key_ids"] = [entry_id for key, entry_id in pairs]
+    return index
+
+
+def add_name(index, name, value):
+    """Add one name to the index; search() will return value for it."""
+    entry_id = _add_entry(index, name, value)
+    for key in word_keys(index["names"][entry_id]):
+        position = bisect.bisect_right(index["keys"], key)
+        index["keys"].insert(position, key)
+        index["key_ids"].insert(position, entry_id)
+
+
+def word_keys(text):
+    """Return one prefix key per word: "chicken breast" -> ["chicken breast", "breast"]."""
+    keys = []
+    start = 0
+    for word in text.split(" "):
+        keys.append(text[start:])
+        start += len(word) + 1
+    return keys
+
+
+def _add_entry(index, name, value):
+    """Store a name and its value; return its entry id."""
+    text = normalize(name)
+    entry_id = len(index["names"])
+    index["names"].append(text)
+    index["values"].append(value)
+    if index["grams"] is not None:
+        _add_trigrams(index["grams"], text, entry_id)
+    return entry_id
+
+
+def _add_trigrams(grams, text, entry_id):
+    """Add one name to the trigram index."""
+    for piece in trigrams(text):
+        if piece not in grams:
+            grams[piece] = []
+        grams[piece].append(entry_id)
+
+
+def _trigram_index(index):
+    """Return the trigram index, building it the first time."""
+    if index["grams"] is None:
+        grams = {}
+        for entry_id in range(len(index["names"])):
+            _add_trigrams(grams, index["names"][entry_id], entry_id)
+        index["grams"] = grams
+    return index["grams"]
+
+
+# ==========================================
+# Searching
+# ==========================================
+@metrics.timed("food_search.search")
+def search(index, query, k=10):
+    """Return the values of up to k names matching query, best first."""
+    text = normalize(query)
+    if text == "":
+        return []
+
+    found = []
+    seen = set()
+
+    # Exact name first, then prefix matches in alphabetical order
+    keys = index["keys"]
+    position = bisect.bisect_left(keys, text)
+    while position < len(keys) and len(found) < k and keys[position].startswith(text):
+        entry_id = index["key_ids"][position]
+        if entry_id not in seen:
+            seen.add(entry_id)
+            if index["names"][entry_id] == text:
+                found.insert(0, entry_id)
+            else:
+                found.append(entry_id)
+        position += 1
+
+    # Not enough prefix matches: fill up with the closest fuzzy matches
+    if len(found) < k:
+        for entry_id in _fuzzy(index, text, seen, 2 * k):
+            found.append(entry_id)
+            if len(found) >= k:
+                break
+
+    return [index["values"][entry_id] for entry_id in found]
+
+
+def _fuzzy(index, text, skip, count):
+    """Return entry ids of names close to text (typos), closest first."""
+    grams = _trigram_index(index)
+    query = trigrams(text)
+    pieces = [piece for piece in query if piece in grams]
+    pieces.sort(key=lambda piece: len(grams[piece]))
+
+    # Count shared trigrams, starting with the rarest ones
+    shared = {}
+    for piece in pieces[:FUZZY_TRIGRAMS]:
+        for entry_id in grams[piece][:FUZZY_POSTINGS]:
+            if entry_id not in skip:
+                shared[entry_id] = shared.get(entry_id, 0) + 1
+
+    best = heapq.nlargest(count, shared, key=shared.get)
+    scored = []
+    for entry_id in best:
+        name = index["names"][entry_id]
+        # Compare with the start of every word (one letter longer than the
+        # query, to allow for a missing letter), so "chiken" still finds
+        # "chicken breast" and "nugets" finds "chicken nuggets"
+        score = 0
+        for key in word_keys(name):
+            score = max(score, similarity(query, trigrams(key[:len(text) + 1])))
+        if score >= FUZZY_MIN_SIMILARITY:
+            scored.append((-score, name, entry_id))
+    scored.sort()
+    return [entry_id for score, name, entry_id in scored]
+
+
+def similarity(a, b):
+    """Return the Jaccard similarity of two trigram sets (0 to 1)."""
+    if len(a) == 0 or len(b) == 0:
+        return 0
+    common = len(a & b)
+    return common / (len(a) + len(b) - common)
@@ -0,0 +1,182 @@
+"""
+==============================================================================
+Athletic Nutrition Planner
+Food Store
+
+Description:
+    Keeps the food database (food_database.txt) behind a name -> macros
+    index, so looking up a food no longer re-reads and re-splits the
+    whole text file.
+
+    The index is saved next to the text file as a binary catalog
+    (food_database.bin, see binary_catalog.py) that records how many
+    bytes of the text file it covers. The catalog is opened with mmap,
+    so loading the store does not decode any foods, and only the lines
+    appended after the catalog was written are parsed into a small dict.
+    Foods added with addFood are picked up incrementally the same way.
+
+Store layout (a plain dictionary, like `data` in final.py):
+    {
+        "path":    path of the text database,
+        "catalog": BinaryCatalog covering the start of the file, or None,
+        "foods":   {name: (protein, carbs, fat)} for lines after the catalog,
+        "size":    bytes of the text file already indexed,
+    }
+==============================================================================
+"""
+
+import os
+
+import binary_catalog
+import file_lock
+import metrics
+
+FOOD_DATABASE = "food_database.txt"
+
+
+# ==========================================
+# Parsing
+# ==========================================
+def parse_food_line(line):
+    """Split a 'name,protein,carbs,fat' line into (name, macros), or None."""
+    parts = line.strip().split(",")
+    if len(parts) < 4 or parts[0] == "":
+        return None
+    try:
+        macros = (float(parts[1]), float(parts[2]), float(parts[3]))
+    except ValueError:
+        return None
+    return parts[0], macros
+
+
+def index_path(db_path):
+    """Return the path of the saved catalog that belongs to a database file."""
+    return os.path.splitext(db_path)[0] + ".bin"
+
+
+# ==========================================
+# Loading and Saving the Index
+# ==========================================
+@metrics.timed("food_store.load_store")
+def load_store(db_path=FOOD_DATABASE):
+    """
+    Load the food store for a database file.
+
+    Starts from the saved catalog when it is still valid and only parses
+    the lines appended since it was written. Raises OSError if the
+    database file does not exist.
+    """
+    db_size = os.path.getsize(db_path)
+    store = {"path": db_path, "catalog": _open_catalog(db_path, db_size), "foods": {}, "size": 0}
+    if store["catalog"] is not None:
+        store["size"] = store["catalog"].source_size
+    if refresh_store(store) > 0:
+        save_index(store)
+    return store
+
+
+def _open_catalog(db_path, db_size):
+    """Open the saved catalog, or return None if it is missing or unusable."""
+    try:
+        catalog = binary_catalog.BinaryCatalog(index_path(db_path))
+    except (OSError, ValueError):
+        return None
+
+    # A shorter database means the file was rewritten, so start over
+    if catalog.source_size == 0 or catalog.source_size > db_size:
+        catalog.close()
+        return None
+    return catalog
+
+
+def save_index(store):
+    """Fold the foods parsed since the last save into a new catalog file."""
+    foods = []
+    if store["catalog"] is not None:
+        for food in store["catalog"]:
+            foods.append((food["name"], food["protein"], food["carbs"], food["fat"]))
+    for name, macros in store["foods"].items():
+        foods.append((name,) + macros)
+
+    try:
+        binary_catalog.write_catalog(index_path(store["path"]), foods, store["size"])
+    except (OSError, ValueError):
+        # The catalog is only a cache; the text file is still the source of truth
+        print("Warning: Could not save the food index.")
+        return
+
+    if store["catalog"] is not None:
+        store["catalog"].close()
+    store["catalog"] = binary_catalog.BinaryCatalog(index_path(store["path"]))
+    store["foods"] = {}
+
+
+def refresh_store(store):
+    """
+    Index any lines appended to the database since the last refresh.
+
+    Only complete lines are consumed, so a line that is still being
+    written is picked up on the next refresh. Returns the number of new
+    lines read.
+    """
+    with open(store["path"], "rb") as file:
+        file.seek(store["size"])
+        tail = file.read()
+
+    end = tail.rfind(b"\n") + 1
+    if end == 0:
+        return 0
+
+    foods = store["foods"]
+    catalog = store["catalog"]
+    count = 0
+    for line in tail[:end].decode("utf-8").splitlines():
+        parsed = parse_food_line(line)
+        # Keep the first copy of a name, like the old top-to-bottom scan
+        if parsed is not None and (catalog is None or catalog.find(parsed[0]) < 0):
+            foods.setdefault(parsed[0], parsed[1])
+        count += 1
+
+    store["size"] += end
+    return count
+
+
+# ==========================================
+# Lookup and Insert
+# ==========================================
+@metrics.timed("food_store.lookup_food")
+def lookup_food(store, food_name):
+    """Return (protein, carbs, fat) per 100g for a food, or None."""
+    name = food_name.lower()
+    if store["catalog"] is not None:
+        macros = store["catalog"].lookup(name)
+        if macros is not None:
+            return macros
+    return store["foods"].get(name)
+
+
+def food_names(store):
+    """Yield the name of every food in the store."""
+    if store["catalog"] is not None:
+        for name in store["catalog"].names():
+            yield name
+    for name in store["foods"]:
+        yield name
+
+
+def add_food(store, food_name, protein, carbs, fat):
+    """Append a food to the database file and update the index in place."""
+    append_foods(store, [(food_name, protein, carbs, fat)])
+    refresh_store(store)
+
+
+def append_foods(store, foods):
+    """
+    Append (name, protein, carbs, fat) tuples to the database file in one
+    write, without indexing them: a bulk import calls refresh_store and
+    save_index once at the end instead.
+    """
+    lines = [f"{name},{protein},{carbs},{fat}\n" for name, protein, carbs, fat in foods]
+    with file_lock.locked(store["path"]):
+        with open(store["path"], "a") as file:
+            file.write("".join(lines))
@@ -0,0 +1,121 @@
+"""
+==============================================================================
+Athletic Nutrition Planner
+Write-Ahead Journal
+
+Description:
+    An append-only journal of changes, stored as one JSON object per line.
+    Instead of rewriting the whole data file after every action, final.py
+    appends a small record here and only folds the journal back into the
+    snapshot (nutrition_data.json) once it has grown past a threshold.
+
+    Appends are flushed straight away but fsync'd in batches, so a burst
+    of meal entries costs one disk sync per FSYNC_EVERY records. Any
+    records still waiting for a sync are synced when the program exits.
+==============================================================================
+"""
+
+import atexit
+import json
+import os
+
+# Sync the journal to disk after this many appends
+FSYNC_EVERY = 20
+
+
+# ==========================================
+# Writing
+# ==========================================
+def open_journal(path):
+    """Open a journal for appending and return its state dictionary."""
+    journal = {"path": path, "file": open(path, "a"), "pending": 0, "count": 0}
+    journal["count"] = count_records(path)
+    atexit.register(close_journal, journal)
+    return journal
+
+
+def append_record(journal, record):
+    """Append one record and sync the journal every FSYNC_EVERY records."""
+    journal["file"].write(json.dumps(record, separators=(",", ":")) + "\n")
+    journal["file"].flush()
+    journal["pending"] += 1
+    journal["count"] += 1
+    if journal["pending"] >= FSYNC_EVERY:
+        sync_journal(journal)
+
+
+def sync_journal(journal):
+    """Force any buffered records onto the disk."""
+    if journal["file"].closed:
+        return
+    journal["file"].flush()
+    os.fsync(journal["file"].fileno())
+    journal["pending"] = 0
+
+
+def truncate_journal(journal):
+    """Empty the journal once its records are safely in the snapshot."""
+    journal["file"].truncate(0)
+    sync_journal(journal)
+    journal["count"] = 0
+
+
+def close_journal(journal):
+    """Sync and close the journal (safe to call more than once)."""
+    if journal["file"].closed:
+        return
+    sync_journal(journal)
+    journal["file"].close()
+
+
+# ==========================================
+# Reading
+# ==========================================
+def read_records(path):
+    """
+    Yield the records stored in a journal file, oldest first.
+
+    Reading stops at the first line that is not valid JSON, which is
+    what a write cut short by a crash looks like.
+    """
+    if not os.path.exists(path):
+        return
+    with open(path, "r") as file:
+        for line in file:
+            if not line.endswith("\n"):
+                return
+            try:
+                yield json.loads(line)
+            except ValueError:
+                return
+
+
+def read_from(path, offset):
+    """
+    Return (records, end offset) for the complete records after a byte offset.
+
+    Used to pick up records appended by other processes since the last
+    read; the end offset is where the next read should start.
+    """
+    records = []
+    if not os.path.exists(path):
+        return records, 0
+    with open(path, "rb") as file:
+        file.seek(offset)
+        for line in file:
+            if not line.endswith(b"\n"):
+                break
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                break
+            offset += len(line)
+    return records, offset
+
+
+def count_records(path):
+    """Return the number of complete records in a journal file."""
+    count = 0
+    for _ in read_records(path):
+        count += 1
+    return count
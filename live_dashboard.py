@@ -0,0 +1,345 @@
+"""
+==============================================================================
+Athletic Nutrition Planner
+Live Dashboard
+
+Description:
+    A watch mode of View Report / generateReport for a screen that stays
+    on (a kiosk in the team kitchen): today's progress bars, totals and
+    latest meals, updated as meals are logged from other machines.
+
+    The dashboard follows the files the programs write instead of loading
+    them again:
+
+        - final.py: the journal is read from where the last refresh
+          stopped and only the new records are applied (final.sync_data;
+          the data file is read again only after a compaction),
+        - team mode (--athlete): today's day file is read from the last
+          offset, and goals.json when it changes,
+        - nutrition_planner.py (--planner): daily_log.txt is read from
+          the last offset, and the goals file when it changes.
+
+    Each poll is one os.stat per file when nothing changed. The screen is
+    kept as a list of lines and only the lines that changed are redrawn
+    (ANSI cursor moves), so a refresh costs about the same whatever the
+    size of the history. Polling is used instead of inotify, which needs
+    a third-party package.
+
+Usage:
+    python live_dashboard.py [--athlete NAME | --planner] [--interval SECONDS] [--once]
+==============================================================================
+"""
+
+import collections
+import json
+import os
+import sys
+import time
+
+import aggregates
+import file_lock
+import final
+import metrics
+import nutrition_planner
+import partitions
+
+# Seconds between polls
+POLL_SECONDS = 1.0
+
+# Latest meals shown at the bottom of the screen
+MEAL_LINES = 8
+
+# ANSI: clear the screen, move to a row, clear the rest of the line
+CLEAR_SCREEN = "\x1b[2J"
+MOVE_TO = "\x1b[{row};1H"
+CLEAR_LINE = "\x1b[K"
+
+USAGE = "Usage: python live_dashboard.py [--athlete NAME | --planner] [--interval SECONDS] [--once]"
+
+
+# ==========================================
+# Sources
+# ==========================================
+# A source is a dictionary with the day it shows, the goals (None if not
+# set), the day's totals, the latest meals ({"name", "portion",
+# "calories"}) and whatever its kind needs to follow its files.
+def new_source(kind, **settings):
+    """Return a source of the given kind ("final", "team" or "planner")."""
+    source = {"kind": kind, "day": None, "goals": None, "totals": aggregates.new_totals(),
+              "meals": collections.deque(maxlen=MEAL_LINES), "path": None, "offset": 0,
+              "goals_stamp": None, "data": None}
+    source.update(settings)
+    return source
+
+
+def stamp(path):
+    """Return (mtime, size) of a file, or None if it does not exist."""
+    try:
+        info = os.stat(path)
+    except OSError:
+        return None
+    return info.st_mtime_ns, info.st_size
+
+
+@metrics.timed("live_dashboard.poll")
+def poll(source):
+    """Bring a source up to date with its files; return True if anything changed."""
+    if source["kind"] == "final":
+        return poll_final(source)
+    return poll_log(source)
+
+
+def poll_final(source):
+    """Apply the records journaled by final.py since the last poll."""
+    day = aggregates.today()
+    if source["data"] is None:
+        source["data"] = final.load_data()
+    elif (final.snapshot_stamp() == final._disk["stamp"]
+          and (stamp(final.JOURNAL_FILE) or (0, 0))[1] == final._disk["offset"]
+          and day == source["day"]):
+        return False
+    else:
+        with file_lock.locked(final.DATA_FILE):
+            final.sync_data(source["data"])
+
+    data = source["data"]
+    source["day"] = day
+    source["goals"] = dict(data["goals"])
+    source["totals"] = dict(aggregates.day_totals(data["totals"], day))
+
+    # The day's latest meals, searching back from the newest entry
+    meals = []
+    log = data["log"]
+    i = len(log) - 1
+    while i >= 0 and len(meals) < min(MEAL_LINES, source["totals"]["meals"]):
+        if log[i]["date"] == day:
+            meals.append(display_meal(log[i]["name"], log[i]["portion"], log[i]["calories"]))
+        i = i - 1
+    source["meals"].clear()
+    source["meals"].extend(reversed(meals))
+    return True
+
+
+def poll_log(source):
+    """Read the lines appended to a team day file or the planner's daily log."""
+    changed = False
+    day = aggregates.today()
+    if source["kind"] == "team" and day != source["day"]:
+        # A new day starts with an empty day file
+        source["path"] = partitions.day_path(source["root"], source["athlete"], day)
+        reset_log(source)
+        changed = True
+    source["day"] = day
+
+    goals_stamp = stamp(source["goals_path"])
+    if goals_stamp != source["goals_stamp"] or source["goals"] is None:
+        source["goals_stamp"] = goals_stamp
+        source["goals"] = load_goals(source)
+        changed = True
+
+    log_stamp = stamp(source["path"])
+    size = log_stamp[1] if log_stamp is not None else 0
+    if size < source["offset"]:
+        # The log was cleared (Reset Log): start again from the top
+        reset_log(source)
+        changed = True
+    if size > source["offset"]:
+        for meal in read_new_meals(source):
+            aggregates.add_meal(source["totals"], meal)
+            source["meals"].append(display_meal(meal["name"], meal["portion"], meal["calories"]))
+            changed = True
+    return changed
+
+
+def reset_log(source):
+    """Forget what was read from a source's log."""
+    source["offset"] = 0
+    source["totals"] = aggregates.new_totals()
+    source["meals"].clear()
+
+
+def read_new_meals(source):
+    """Return the complete meals appended to a source's log since its offset, and move the offset."""
+    with open(source["path"], "rb") as file:
+        file.seek(source["offset"])
+        data = file.read()
+    # A line still being written is read on a later poll
+    end = data.rfind(b"\n") + 1
+    source["offset"] += end
+
+    meals = []
+    for line in data[:end].decode("utf-8", "replace").splitlines():
+        meal = parse_meal(source, line)
+        if meal is not None:
+            meals.append(meal)
+    return meals
+
+
+def parse_meal(source, line):
+    """Return one log line as a meal ({"name", "portion", calories and macros}), or None."""
+    if source["kind"] == "planner":
+        meal = nutrition_planner.parse_log_line(line)
+        if meal is None:
+            return None
+        meal["name"] = meal["food"]
+        meal["portion"] = meal["grams"]
+        return meal
+    try:
+        return json.loads(line)
+    except ValueError:
+        return None
+
+
+def load_goals(source):
+    """Return the goals of a team or planner source, or None if none are set."""
+    if source["kind"] == "team":
+        return partitions.load_goals(source["root"], source["athlete"], final.DEFAULT_GOALS)
+    try:
+        mode, calories, protein, carbs, fat = nutrition_planner.read_goal_file()
+    except (OSError, ValueError, IndexError):
+        return None
+    return {"mode": mode, "calories": calories, "protein": protein, "carbs": carbs, "fat": fat}
+
+
+def display_meal(name, portion, calories):
+    """Return what the dashboard shows of one meal."""
+    return {"name": name, "portion": portion, "calories": calories}
+
+
+# ==========================================
+# Screen
+# ==========================================
+def dashboard_lines(source, title):
+    """Return the lines of the dashboard, fixed sections first and the latest meals last."""
+    totals = source["totals"]
+    goals = source["goals"]
+    lines = ["=== " + title + " ===",
+             "Date: " + str(source["day"]) + "   Meals: " + str(totals["meals"]), ""]
+    if goals is None:
+        lines.append("Please set your daily goals first!")
+        return lines
+
+    lines.append("Mode: " + str(goals["mode"]))
+    lines.append("Calories: " + str(round(totals["calories"])) + " / " + str(goals["calories"]))
+    lines.append("Protein:  " + str(round(totals["protein"], 1)) + "g / " + str(goals["protein"]) + "g")
+    lines.append("Carbs:    " + str(round(totals["carbs"], 1)) + "g / " + str(goals["carbs"]) + "g")
+    lines.append("Fat:      " + str(round(totals["fat"], 1)) + "g / " + str(goals["fat"]) + "g")
+    lines.append("")
+    lines.append(final.progress_bar("Calories", totals["calories"], goals["calories"]))
+    lines.append(final.progress_bar("Protein", totals["protein"], goals["protein"]))
+    lines.append(final.progress_bar("Carbs", totals["carbs"], goals["carbs"]))
+    lines.append(final.progress_bar("Fat", totals["fat"], goals["fat"]))
+    lines.append("")
+
+    diff = round(goals["calories"] - totals["calories"])
+    if diff > 0:
+        lines.append("Deficit: " + str(diff) + " calories remaining")
+    else:
+        lines.append("Surplus: " + str(abs(diff)) + " calories over target")
+    lines.append("")
+
+    lines.append("Latest meals:")
+    for meal in source["meals"]:
+        lines.append("  " + str(meal["name"]) + " (" + str(meal["portion"]) + "g): "
+                     + str(round(float(meal["calories"]))) + " cal")
+    return lines
+
+
+def redraw(out, previous, lines):
+    """Write only the lines that differ from the previous screen; return how many were written."""
+    written = 0
+    for row in range(max(len(previous), len(lines))):
+        line = lines[row] if row < len(lines) else ""
+        if row < len(previous) and previous[row] == line:
+            continue
+        out.write(MOVE_TO.format(row=row + 1) + line + CLEAR_LINE)
+        written += 1
+    # Park the cursor below the dashboard
+    out.write(MOVE_TO.format(row=len(lines) + 1))
+    out.flush()
+    return written
+
+
+def watch(source, title, interval=POLL_SECONDS, out=sys.stdout):
+    """Poll a source and redraw the changed lines until Ctrl+C."""
+    out.write(CLEAR_SCREEN)
+    previous = []
+    try:
+        while True:
+            if poll(source) or len(previous) == 0:
+                lines = dashboard_lines(source, title)
+                redraw(out, previous, lines)
+                previous = lines
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        out.write("\n")
+
+
+# ==========================================
+# Command Line
+# ==========================================
+def main(args):
+    args = metrics.configure(args)
+    options = {"--athlete": None, "--interval": str(POLL_SECONDS)}
+    planner = False
+    once = False
+    i = 0
+    while i < len(args):
+        if args[i] in options and i + 1 < len(args):
+            options[args[i]] = args[i + 1]
+            i += 2
+        elif args[i] == "--planner":
+            planner = True
+            i += 1
+        elif args[i] == "--once":
+            once = True
+            i += 1
+        else:
+            print(USAGE)
+            return 2
+
+    try:
+        interval = float(options["--interval"])
+        if interval <= 0:
+            raise ValueError("interval must be more than 0 seconds")
+        if planner and options["--athlete"] is not None:
+            raise ValueError("--athlete and --planner cannot be used together")
+        if (nutrition_planner.STORAGE if planner else final.STORAGE) == "sqlite":
+            raise ValueError("the dashboard follows the data files; SQLite storage is not supported")
+    except ValueError as error:
+        print("Error: " + str(error))
+        print(USAGE)
+        return 2
+
+    if planner:
+        source = new_source("planner", path=nutrition_planner.DAILY_LOG,
+                            goals_path=nutrition_planner.DAILY_GOALS)
+        title = "Live Dashboard - daily log"
+    elif options["--athlete"] is not None:
+        athlete = options["--athlete"]
+        try:
+            folder = partitions.athlete_dir(final.TEAM_DIR, athlete)
+        except ValueError as error:
+            print("Error: " + str(error))
+            return 2
+        source = new_source("team", root=final.TEAM_DIR, athlete=athlete,
+                            goals_path=os.path.join(folder, "goals.json"))
+        title = "Live Dashboard - " + athlete
+    else:
+        source = new_source("final")
+        title = "Live Dashboard"
+
+    try:
+        if once:
+            poll(source)
+            print("\n".join(dashboard_lines(source, title)))
+        else:
+            watch(source, title, interval)
+    except (OSError, ValueError) as error:
+        print("Error: " + str(error))
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
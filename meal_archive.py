@@ -0,0 +1,336 @@
+"""
+==============================================================================
+Athletic Nutrition Planner
+Compressed Meal Archive
+
+Description:
+    Older days of the team storage (see partitions.py) are rolled into
+    one compressed file per week instead of one small file per day, with
+    an index that says which days each week holds and keeps their
+    totals, so:
+
+        - reading an archived day or range only decompresses the weeks it
+          touches (the last week read is kept in memory, so a range reads
+          each week once),
+        - totals of any archived range come from the index (week totals,
+          plus day totals for the ragged ends) without decompressing
+          anything,
+        - a multi-year history takes one file per week, a small fraction
+          of the space of the day files (lzma by default, zlib is faster).
+
+    partitions.archive_days does the rolling (python meal_archive.py runs
+    it for the whole team); a meal logged later for an archived day goes
+    to a day file as usual and is read together with the archive, and is
+    merged into the week the next time the archive runs.
+
+    Every change writes the new week files under a new name first and
+    then replaces the index, so a crash leaves either the old or the new
+    archive. Day files that were archived are listed in the index
+    ("pending", with their sizes) until they are deleted: if a crash
+    leaves one behind it is ignored by readers and deleted by the next
+    write (see partitions.py).
+
+Layout:
+    <athlete>/archive/
+    ├── index.json                   # see new_index
+    └── YYYY-MM-DD.N.jsonl.xz        # the meals of the week starting that Monday,
+                                     # one entry per line (N counts rewrites;
+                                     # .jsonl.zlib with zlib compression)
+
+Usage:
+    python meal_archive.py [--team-dir DIR] [--keep-days N] [--compression lzma|zlib] [ATHLETE ...]
+    python meal_archive.py [--team-dir DIR] --list ATHLETE
+==============================================================================
+"""
+
+import json
+import lzma
+import os
+import sys
+import zlib
+
+import aggregates
+import metrics
+import rollups
+
+ARCHIVE_DIR = "archive"
+INDEX_FILE = "index.json"
+
+# Days younger than KEEP_DAYS stay in day files; older whole weeks are archived
+KEEP_DAYS = 28
+COMPRESSION = "lzma"
+SUFFIXES = {"lzma": ".jsonl.xz", "zlib": ".jsonl.zlib"}
+
+USAGE = ("Usage: python meal_archive.py [--team-dir DIR] [--keep-days N] [--compression lzma|zlib] [ATHLETE ...]\n"
+         "       python meal_archive.py [--team-dir DIR] --list ATHLETE")
+
+# Last index read per athlete and the last week decompressed:
+# path -> ((mtime_ns, size), value)
+_indexes = {}
+_week = {"path": None, "stamp": None, "days": None}
+
+
+# ==========================================
+# Index
+# ==========================================
+def new_index():
+    """
+    Return an empty index:
+
+        {"version": 1,
+         "weeks":   {Monday: {"file", "start", "end", "bytes",
+                              "totals": totals record of the week (see aggregates.py),
+                              "days":   {day: totals record}}},
+         "pending": {day: size of its day file, archived but not deleted yet}}
+    """
+    return {"version": 1, "weeks": {}, "pending": {}}
+
+
+def _stamp(path):
+    try:
+        info = os.stat(path)
+    except OSError:
+        return None
+    return info.st_mtime_ns, info.st_size
+
+
+def load_index(folder, fresh=False):
+    """
+    Return the archive index of an athlete folder (empty if nothing is archived).
+
+    The index is read again only when the file changes; callers that
+    change it must pass fresh=True and get their own copy.
+    """
+    path = os.path.join(folder, ARCHIVE_DIR, INDEX_FILE)
+    stamp = _stamp(path)
+    if stamp is None:
+        return new_index()
+    cached = _indexes.get(path)
+    if not fresh and cached is not None and cached[0] == stamp:
+        return cached[1]
+    with open(path, "r") as file:
+        index = json.load(file)
+    if not fresh:
+        _indexes[path] = (stamp, index)
+    return index
+
+
+def save_index(folder, index):
+    """Replace the index (the caller holds the athlete's meals lock)."""
+    path = os.path.join(folder, ARCHIVE_DIR, INDEX_FILE)
+    temp_path = path + ".tmp"
+    with open(temp_path, "w") as file:
+        json.dump(index, file, separators=(",", ":"))
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temp_path, path)
+
+
+def archived(index, day):
+    """Return True if a day has meals in the archive."""
+    week = index["weeks"].get(rollups.week_start(day))
+    return week is not None and day in week["days"]
+
+
+def archived_days(index):
+    """Return every archived day, oldest first."""
+    days = []
+    for monday in sorted(index["weeks"]):
+        days.extend(sorted(index["weeks"][monday]["days"]))
+    return days
+
+
+def is_leftover(index, day, size):
+    """Return True if a day file of this size was archived and only waits to be deleted."""
+    return index["pending"].get(day) == size
+
+
+def range_totals(index, start, end):
+    """
+    Return the totals of the archived days from start to end (inclusive),
+    from the index alone: whole weeks use the week totals, the days at
+    either end their own.
+    """
+    totals = aggregates.new_totals()
+    for monday in sorted(index["weeks"]):
+        week = index["weeks"][monday]
+        if week["end"] < start or week["start"] > end:
+            continue
+        if start <= week["start"] and week["end"] <= end:
+            parts = [week["totals"]]
+        else:
+            parts = [week["days"][day] for day in week["days"] if start <= day <= end]
+        for part in parts:
+            for key in aggregates.MACROS + ("meals",):
+                totals[key] += part[key]
+    return totals
+
+
+# ==========================================
+# Week Files
+# ==========================================
+def read_week(folder, index, monday):
+    """Return {day: [entries]} of one archived week (empty if it is not archived)."""
+    week = index["weeks"].get(monday)
+    if week is None:
+        return {}
+    path = os.path.join(folder, ARCHIVE_DIR, week["file"])
+    stamp = _stamp(path)
+    if _week["path"] == path and _week["stamp"] == stamp:
+        return _week["days"]
+
+    with open(path, "rb") as file:
+        data = file.read()
+    if path.endswith(SUFFIXES["zlib"]):
+        data = zlib.decompress(data)
+    else:
+        data = lzma.decompress(data)
+    days = {}
+    for line in data.decode("utf-8").splitlines():
+        entry = json.loads(line)
+        days.setdefault(entry["date"], []).append(entry)
+
+    _week["path"] = path
+    _week["stamp"] = stamp
+    _week["days"] = days
+    return days
+
+
+def write_week(folder, index, monday, days, compression=COMPRESSION):
+    """
+    Write the meals of a week ({day: [entries]}) under a new file name and
+    point the index at it (the index is not saved). Returns the name of
+    the file it replaces, or None; the caller deletes it after saving the
+    index. A week left with no meals is taken out of the index.
+    """
+    old = index["weeks"].pop(monday, None)
+    old_file = old["file"] if old is not None else None
+    if sum(len(entries) for entries in days.values()) == 0:
+        return old_file
+
+    lines = []
+    totals = aggregates.new_totals()
+    day_totals = {}
+    for day in sorted(days):
+        for entry in days[day]:
+            lines.append(json.dumps(entry, separators=(",", ":")) + "\n")
+            aggregates.add_meal(totals, entry)
+            aggregates.add_to_day(day_totals, day, entry)
+    data = "".join(lines).encode("utf-8")
+    if compression == "zlib":
+        data = zlib.compress(data, 9)
+    else:
+        data = lzma.compress(data)
+
+    generation = 1
+    if old_file is not None:
+        generation = int(old_file.split(".")[1]) + 1
+    name = monday + "." + str(generation) + SUFFIXES[compression]
+    path = os.path.join(folder, ARCHIVE_DIR, name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as file:
+        file.write(data)
+        file.flush()
+        os.fsync(file.fileno())
+
+    logged = sorted(day_totals)
+    index["weeks"][monday] = {"file": name, "start": logged[0], "end": logged[-1], "bytes": len(data),
+                              "totals": totals, "days": day_totals}
+    return old_file
+
+
+def remove_files(folder, names):
+    """Delete week files that the index no longer points at."""
+    for name in names:
+        if name is None:
+            continue
+        try:
+            os.remove(os.path.join(folder, ARCHIVE_DIR, name))
+        except FileNotFoundError:
+            pass
+
+
+def unused_files(folder, index):
+    """Return the week files the index does not point at (left by an interrupted write)."""
+    directory = os.path.join(folder, ARCHIVE_DIR)
+    if not os.path.isdir(directory):
+        return []
+    used = set(week["file"] for week in index["weeks"].values())
+    names = []
+    for name in os.listdir(directory):
+        if name != INDEX_FILE and not name.endswith(".tmp") and name not in used:
+            names.append(name)
+    return names
+
+
+# ==========================================
+# Command Line
+# ==========================================
+def print_index(index):
+    """Print the archived weeks of an athlete from the index alone."""
+    if len(index["weeks"]) == 0:
+        print("Nothing archived.")
+        return
+    print("week         days                       meals   calories      bytes")
+    for monday in sorted(index["weeks"]):
+        week = index["weeks"][monday]
+        print(monday + "   " + week["start"] + " .. " + week["end"] + "   "
+              + str(week["totals"]["meals"]).rjust(5) + "   "
+              + str(round(week["totals"]["calories"])).rjust(8) + "   " + str(week["bytes"]).rjust(8))
+    days = archived_days(index)
+    totals = range_totals(index, days[0], days[-1])
+    print("Total: " + str(totals["meals"]) + " meals, " + str(round(totals["calories"])) + " calories, "
+          + str(sum(week["bytes"] for week in index["weeks"].values())) + " bytes")
+
+
+def main(args):
+    args = metrics.configure(args)
+    # Imported here: partitions.py imports this module
+    import partitions
+
+    options = {"--team-dir": partitions.TEAM_DIR, "--keep-days": str(KEEP_DAYS),
+               "--compression": COMPRESSION, "--list": None}
+    athletes = []
+    i = 0
+    while i < len(args):
+        if args[i] in options and i + 1 < len(args):
+            options[args[i]] = args[i + 1]
+            i += 2
+        elif args[i].startswith("--"):
+            print(USAGE)
+            return 2
+        else:
+            athletes.append(args[i])
+            i += 1
+
+    root = options["--team-dir"]
+    try:
+        keep_days = int(options["--keep-days"])
+        if keep_days < 0:
+            raise ValueError("keep-days cannot be negative")
+        if options["--compression"] not in SUFFIXES:
+            raise ValueError("unknown compression " + options["--compression"])
+        if options["--list"] is not None:
+            print_index(load_index(partitions.athlete_dir(root, options["--list"])))
+            return 0
+    except (OSError, ValueError) as error:
+        print("Error: " + str(error))
+        return 2
+
+    if len(athletes) == 0:
+        athletes = partitions.list_athletes(root)
+    status = 0
+    for athlete in athletes:
+        try:
+            moved = partitions.archive_days(root, athlete, keep_days=keep_days,
+                                            compression=options["--compression"])
+        except (OSError, ValueError) as error:
+            print("Error: " + athlete + ": " + str(error))
+            status = 1
+            continue
+        print(athlete + ": archived " + str(moved) + " days")
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
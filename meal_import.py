@@ -0,0 +1,163 @@
+"""
+==============================================================================
+Athletic Nutrition Planner
+Bulk Meal Import
+
+Description:
+    Streams meals from a CSV or JSON-lines file into the meal log in
+    batches, so thousands of entries (from wearables or meal-photo
+    pipelines) cost one save per batch instead of one per meal.
+
+    CSV files need a header row with "food" and "portion" columns and
+    may have a "date" column (YYYY-MM-DD). JSON-lines files hold one
+    object per line with the same keys.
+
+Usage:
+    python meal_import.py meals.csv              # into final.py data
+    python meal_import.py meals.jsonl --planner  # into nutrition_planner.py log
+==============================================================================
+"""
+
+import csv
+import json
+import sys
+import time
+
+import metrics
+
+BATCH_SIZE = 1000
+
+
+# ==========================================
+# Reading Meal Files
+# ==========================================
+def read_meals(path):
+    """
+    Yield (line number, meal, problem) from a CSV or JSON-lines file.
+
+    For a line that cannot be imported the meal is None and problem says
+    why, so callers can count it as rejected; otherwise problem is None.
+    """
+    if path.endswith(".jsonl") or path.endswith(".json"):
+        with open(path, "r") as file:
+            line_number = 0
+            for line in file:
+                line_number += 1
+                if line.strip() == "":
+                    continue
+                try:
+                    meal = json.loads(line)
+                except ValueError:
+                    meal = None
+                if not isinstance(meal, dict):
+                    yield line_number, None, "could not parse line"
+                    continue
+                problem = json_problem(meal)
+                if problem is not None:
+                    yield line_number, None, problem
+                    continue
+                yield line_number, meal, None
+    else:
+        with open(path, "r", newline="") as file:
+            reader = csv.DictReader(file)
+            for row in reader:
+                yield reader.line_num, row, None
+
+
+def json_problem(meal):
+    """Return why a JSON meal has values of the wrong type, or None."""
+    # bool passes float() (true would be 1 g), so only real numbers count
+    portion = meal.get("portion")
+    if isinstance(portion, bool) or not isinstance(portion, (int, float)):
+        return "portion must be a number"
+    if not isinstance(meal.get("food"), str):
+        return "food must be text"
+    if meal.get("date") is not None and not isinstance(meal["date"], str):
+        return "date must be text (YYYY-MM-DD)"
+    return None
+
+
+# ==========================================
+# Importing in Batches
+# ==========================================
+def import_meals(path, log_batch, batch_size=BATCH_SIZE):
+    """
+    Stream a meal file into log_batch in batches of batch_size meals.
+
+    log_batch(meals) must log a list of meals and return
+    (logged, errors) like final.log_meals or nutrition_planner.logMeals.
+    Returns (number logged, list of (line number, message)).
+    """
+    logged = 0
+    rejected = []
+    batch = []
+    lines = []
+
+    for line_number, meal, problem in read_meals(path):
+        if meal is None:
+            rejected.append((line_number, problem))
+            continue
+        batch.append(meal)
+        lines.append(line_number)
+        if len(batch) >= batch_size:
+            logged += _log_batch(log_batch, batch, lines, rejected)
+            batch = []
+            lines = []
+
+    if len(batch) > 0:
+        logged += _log_batch(log_batch, batch, lines, rejected)
+    rejected.sort()
+    return logged, rejected
+
+
+def _log_batch(log_batch, batch, lines, rejected):
+    """Log one batch and translate its errors back to file line numbers."""
+    done, errors = log_batch(batch)
+    for position, message in errors:
+        rejected.append((lines[position], message))
+    return len(done)
+
+
+# ==========================================
+# Command Line
+# ==========================================
+def main(args):
+    args = metrics.configure(args)
+    if len(args) == 0:
+        print("Usage: python meal_import.py FILE [--planner]")
+        return 1
+
+    path = args[0]
+    if "--planner" in args:
+        import nutrition_planner
+        # Creates the food database on a fresh folder
+        nutrition_planner.initialize_files()
+        log_batch = nutrition_planner.logMeals
+    else:
+        import final
+        data = final.load_data()
+
+        def log_batch(meals):
+            return final.log_meals(data, meals)
+
+    start = time.perf_counter()
+    try:
+        logged, rejected = import_meals(path, log_batch)
+    except OSError as error:
+        print("Error: Could not read " + path + ": " + str(error))
+        return 1
+    elapsed = time.perf_counter() - start
+
+    for line_number, message in rejected[:20]:
+        print("Line " + str(line_number) + ": " + message)
+    if len(rejected) > 20:
+        print("... and " + str(len(rejected) - 20) + " more rejected lines")
+
+    rate = logged / elapsed if elapsed > 0 else 0
+    print("Imported " + str(logged) + " meals (" + str(len(rejected)) + " rejected) in "
+          + str(round(elapsed, 2)) + "s, " + str(int(rate)) + " meals/sec")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,235 @@
+"""
+==============================================================================
+Athletic Nutrition Planner
+Meal Plan Optimizer
+
+Description:
+    Suggests portions of a few foods that fill the gap between an
+    athlete's goals and what they have eaten so far today.
+
+    The gap in protein, carbs, fat and calories is scaled by the goal of
+    each, so missing 20g of protein counts as much as missing the same
+    share of the carbs goal. Foods are then picked one at a time: each
+    step scores every allowed food by how much its best single portion
+    would shrink the gap, adds the best one, and re-fits all chosen
+    portions together (a small bounded least-squares problem), until
+    the item limit is reached or no food helps.
+
+    The per-gram macros of the catalog (see portions.py) are kept in one
+    typed array per macro (a macro table), built once and reused for
+    every plan. With NumPy installed each scoring step is a few vector
+    operations over the whole table, which keeps a 100,000-food catalog
+    well under 100 ms; without NumPy the same steps run as plain loops.
+
+Plan layout (returned by plan_meals):
+    {
+        "items":     [{"name", "grams", "calories", "protein", "carbs", "fat"}, ...],
+        "remaining": gap before the plan {"calories", "protein", "carbs", "fat"},
+        "after":     gap left after eating the plan (negative = over the goal)
+    }
+==============================================================================
+"""
+
+from array import array
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+import food_search
+import metrics
+import portions
+
+MACROS = ("protein", "carbs", "fat")
+
+# Columns of the macro table (calories come from 4/4/9 calories per gram)
+COLUMNS = MACROS + ("calories",)
+
+# Default constraints
+MAX_GRAMS = 500
+MAX_ITEMS = 3
+
+# Bounded least-squares refit: passes of coordinate descent over the chosen foods
+REFIT_PASSES = 50
+
+
+# ==========================================
+# Macro Table
+# ==========================================
+def build_table(foods):
+    """Return the per-gram macro table of a food list (foods as in final.py)."""
+    table = {"count": len(foods), "names": [], "keys": {}}
+    for key in COLUMNS:
+        table[key] = array("d")
+    for i in range(len(foods)):
+        food = foods[i]
+        calories, protein, carbs, fat = portions.vector(food["protein"], food["carbs"], food["fat"])
+        table["names"].append(food["name"])
+        # Keyed like final.food_key (final imports this module, so not final itself)
+        table["keys"].setdefault(food_search.normalize(food["name"]), i)
+        table["protein"].append(protein)
+        table["carbs"].append(carbs)
+        table["fat"].append(fat)
+        table["calories"].append(calories)
+    return table
+
+
+def _column(table, key):
+    """Return a table column (a NumPy view when NumPy is installed)."""
+    if numpy is not None:
+        return numpy.frombuffer(table[key], dtype="d")
+    return table[key]
+
+
+def _norms(table, weights):
+    """Return every food's squared weighted length, cached while the weights stay the same."""
+    cached = table.get("norms")
+    if cached is not None and cached[0] == weights:
+        return cached[1]
+
+    squares = [w * w for w in weights]
+    if numpy is not None:
+        norms = sum(_column(table, key) ** 2 * squares[k] for k, key in enumerate(COLUMNS))
+        # Foods with no macros at all can never help
+        norms[norms == 0] = numpy.inf
+    else:
+        norms = [p * p * squares[0] + c * c * squares[1] + f * f * squares[2] + k * k * squares[3]
+                 for p, c, f, k in zip(*[table[key] for key in COLUMNS])]
+    table["norms"] = (list(weights), norms)
+    return norms
+
+
+# ==========================================
+# Planning
+# ==========================================
+def remaining_macros(goals, totals):
+    """Return what is left of the goals after today's totals."""
+    return {key: goals[key] - totals[key] for key in ("calories",) + MACROS}
+
+
+@metrics.timed("meal_optimizer.plan_meals")
+def plan_meals(table, goals, totals, max_items=MAX_ITEMS, max_grams=MAX_GRAMS, exclude=()):
+    """
+    Return a plan (see the module description) for the rest of the day.
+
+    goals and totals are final.py goal / daily totals records; exclude
+    is a list of food names (matched like final.find_food) that may not be used.
+    """
+    remaining = remaining_macros(goals, totals)
+
+    # Scale every macro by its goal so they weigh the same
+    weights = [1.0 / max(float(goals[key]), 1.0) for key in COLUMNS]
+    target = [max(remaining[key], 0) * weights[k] for k, key in enumerate(COLUMNS)]
+
+    excluded = set()
+    for name in exclude:
+        index = table["keys"].get(food_search.normalize(str(name)))
+        if index is not None:
+            excluded.add(index)
+
+    chosen = []
+    grams = []
+    if table["count"] > 0 and max(target) > 0 and max_grams > 0:
+        chosen, grams = _pick_foods(table, weights, target, max_items, max_grams, excluded)
+
+    # Report whole grams, leaving out anything under one gram
+    items = []
+    after = dict(remaining)
+    for index, amount in zip(chosen, grams):
+        amount = round(amount)
+        if amount < 1:
+            continue
+        item = {"name": table["names"][index], "grams": amount}
+        for key in MACROS:
+            item[key] = round(table[key][index] * amount, 1)
+        item["calories"] = round(item["protein"] * 4 + item["carbs"] * 4 + item["fat"] * 9)
+        for key in ("calories",) + MACROS:
+            after[key] = after[key] - item[key]
+        items.append(item)
+
+    for key in MACROS:
+        after[key] = round(after[key], 1)
+    after["calories"] = round(after["calories"])
+    return {"items": items, "remaining": remaining, "after": after}
+
+
+def _pick_foods(table, weights, target, max_items, max_grams, excluded):
+    """Greedily choose up to max_items foods and fit their grams to target."""
+    norms = _norms(table, weights)
+    if numpy is not None:
+        blocked = numpy.zeros(table["count"], dtype=bool)
+    else:
+        blocked = [False] * table["count"]
+    for index in excluded:
+        blocked[index] = True
+
+    chosen = []
+    grams = []
+    residual = list(target)
+    while len(chosen) < max_items:
+        index = _best_food(table, weights, norms, blocked, residual, max_grams)
+        if index is None:
+            break
+        chosen.append(index)
+        blocked[index] = True
+
+        # Weighted macros per gram of every chosen food
+        rows = [[weights[k] * table[key][i] for k, key in enumerate(COLUMNS)] for i in chosen]
+        grams = _refit(rows, grams + [0.0], target, max_grams)
+        residual = list(target)
+        for row, amount in zip(rows, grams):
+            for k in range(4):
+                residual[k] -= row[k] * amount
+    return chosen, grams
+
+
+def _best_food(table, weights, norms, blocked, residual, max_grams):
+    """Return the food whose best single portion shrinks the gap most, or None."""
+    # Dot product of each weighted food with the weighted residual
+    coeffs = [weights[k] * residual[k] for k in range(4)]
+
+    if numpy is not None:
+        dots = sum(_column(table, key) * coeffs[k] for k, key in enumerate(COLUMNS))
+        grams = numpy.clip(dots / norms, 0, max_grams)
+        gains = grams * (2 * dots - grams * norms)
+        gains[blocked] = -1.0
+        best = int(numpy.argmax(gains))
+        if gains[best] <= 0:
+            return None
+        return best
+
+    best = None
+    best_gain = 0.0
+    a, b, c, d = coeffs
+    columns = zip(table["protein"], table["carbs"], table["fat"], table["calories"], norms, blocked)
+    for i, (p, cb, f, k, norm, skip) in enumerate(columns):
+        dot = p * a + cb * b + f * c + k * d
+        if dot <= 0 or skip or norm == 0:
+            continue
+        portion = min(dot / norm, max_grams)
+        gain = portion * (2 * dot - portion * norm)
+        if gain > best_gain:
+            best = i
+            best_gain = gain
+    return best
+
+
+def _refit(rows, grams, target, max_grams):
+    """Fit the grams of the chosen foods together, each between 0 and max_grams."""
+    grams = list(grams)
+    for _ in range(REFIT_PASSES):
+        for j in range(len(rows)):
+            # Gap left by all other chosen foods, then the best grams of food j for it
+            gap = list(target)
+            for other in range(len(rows)):
+                if other != j:
+                    for k in range(4):
+                        gap[k] -= rows[other][k] * grams[other]
+            norm = sum(value * value for value in rows[j])
+            if norm == 0:
+                grams[j] = 0.0
+                continue
+            best = sum(rows[j][k] * gap[k] for k in range(4)) / norm
+            grams[j] = min(max(best, 0.0), max_grams)
+    return grams
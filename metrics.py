@@ -0,0 +1,383 @@
+"""
+==============================================================================
+Athletic Nutrition Planner
+Metrics and Profiling
+
+Description:
+    Opt-in instrumentation of the hot paths (loading, saving, food
+    lookups, logging meals and building reports) in both programs and the
+    API server.
+
+    Functions are marked with the @timed("name") decorator. Each call of a
+    timed function adds to a call counter, an error counter, the total and
+    longest time, a latency histogram (BUCKETS) and the bytes the calling
+    thread read and wrote during the call (rchar / wchar from
+    /proc/thread-self/io, so on Linux only; elsewhere the byte counts stay
+    0). Timings include the timed functions called inside.
+
+    Metrics are off until a program's main calls configure with its
+    arguments, so importing this module (or a module that uses it)
+    changes nothing. When they are off, a timed function only checks one
+    setting before calling the function itself. They are switched on by
+    an environment variable or a command line flag (configure returns
+    the arguments without the flags, for the program to read its own):
+
+        NUTRITION_METRICS=FILE   or  --metrics FILE    collect metrics and
+            write them to FILE at exit (Prometheus text for .prom / .txt,
+            JSON otherwise, a summary table on the screen for -)
+        NUTRITION_PROFILE=MODE   or  --profile MODE    also capture a
+            cProfile (cpu) or tracemalloc (memory) profile of the whole run;
+            without a metrics FILE the metrics are shown as with -
+
+    The CPU profile is written to PROFILE_FILE (open it with pstats or
+    snakeviz) and the memory profile to MEMORY_FILE; the top lines of
+    each are printed at exit. Only the main thread is profiled by cProfile,
+    and the worker processes of batch_reports.py are not measured.
+
+Metrics layout (snapshot()):
+    {
+        "process":   {"seconds", "max_rss_kb", "bytes_read", "bytes_written"},
+        "functions": {name: {"calls", "errors", "seconds", "max_seconds",
+                             "bytes_read", "bytes_written",
+                             "buckets": [calls per BUCKETS bound, ..., over the last]}}
+    }
+==============================================================================
+"""
+
+import atexit
+import bisect
+import functools
+import json
+import os
+import sys
+import threading
+import time
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+METRICS_VARIABLE = "NUTRITION_METRICS"
+PROFILE_VARIABLE = "NUTRITION_PROFILE"
+PROFILE_MODES = ("cpu", "memory")
+
+PROFILE_FILE = "nutrition_profile.prof"
+MEMORY_FILE = "nutrition_memory.txt"
+
+# Histogram upper bounds in seconds (Prometheus "le" labels)
+BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+           0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Lines of the profiles printed at exit
+PROFILE_LINES = 15
+
+IO_FILE = "/proc/thread-self/io"
+
+# Settings, decided by the program's main (see configure)
+_settings = {"enabled": False, "output": None, "profile": None, "started": time.time()}
+
+_functions = {}
+_lock = threading.Lock()
+
+# Per-thread descriptor of IO_FILE (it describes the thread that opened it)
+_io = threading.local()
+
+# Running profiler (cProfile.Profile) in the cpu profile mode
+_profiler = None
+
+
+# ==========================================
+# Switching Metrics On
+# ==========================================
+def configure(args, environ=None):
+    """
+    Read the metrics settings from the environment (os.environ by
+    default) and from a program's command line arguments, and switch
+    metrics on if they ask for it: start the profile and write the
+    metrics at exit. Called by each program's main. Returns the
+    arguments without --metrics and --profile and their values (args
+    itself is not changed).
+    """
+    if environ is None:
+        environ = os.environ
+    output = environ.get(METRICS_VARIABLE) or None
+    profile = environ.get(PROFILE_VARIABLE) or None
+    rest = []
+    i = 0
+    while i < len(args):
+        if args[i] in ("--metrics", "--profile") and i + 1 < len(args):
+            if args[i] == "--metrics":
+                output = args[i + 1]
+            else:
+                profile = args[i + 1]
+            i += 2
+        else:
+            rest.append(args[i])
+            i += 1
+
+    if profile is not None and profile not in PROFILE_MODES:
+        print("Warning: unknown profile mode " + profile + " (use cpu or memory), not profiling")
+        profile = None
+    if _settings["enabled"] or (output is None and profile is None):
+        # Already on (configure was called before), or not asked for
+        return rest
+    if output is None:
+        # A profile alone still collects metrics: show them with it
+        output = "-"
+    _settings["output"] = output
+    _settings["profile"] = profile
+    _settings["enabled"] = True
+    _settings["started"] = time.time()
+    if profile is not None:
+        start_profile(profile)
+    atexit.register(finish)
+    return rest
+
+
+def enabled():
+    """Return True if metrics are being collected."""
+    return _settings["enabled"]
+
+
+def timed(name):
+    """
+    Decorator that records every call of a function under name. When
+    metrics are off the function is called straight away.
+    """
+    def decorate(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not _settings["enabled"]:
+                return function(*args, **kwargs)
+            read, written = io_counters()
+            start = time.perf_counter()
+            failed = True
+            try:
+                result = function(*args, **kwargs)
+                failed = False
+                return result
+            finally:
+                seconds = time.perf_counter() - start
+                read_after, written_after = io_counters()
+                record(name, seconds, read_after - read, written_after - written, failed)
+        return wrapper
+    return decorate
+
+
+# ==========================================
+# Collecting
+# ==========================================
+def io_counters():
+    """Return (bytes read, bytes written) by the calling thread so far, or (0, 0)."""
+    fd = getattr(_io, "fd", None)
+    if fd is None:
+        try:
+            fd = os.open(IO_FILE, os.O_RDONLY)
+        except OSError:
+            fd = -1
+        _io.fd = fd
+    if fd < 0:
+        return 0, 0
+    raw = os.pread(fd, 512, 0)
+    read = 0
+    written = 0
+    for line in raw.split(b"\n"):
+        if line.startswith(b"rchar:"):
+            read = int(line[6:])
+        elif line.startswith(b"wchar:"):
+            written = int(line[6:])
+    # Reading the counters is itself a read: leave it out
+    _io.own = getattr(_io, "own", 0) + len(raw)
+    return read - _io.own, written
+
+
+def new_function():
+    """Return an empty function record (see the module description)."""
+    return {"calls": 0, "errors": 0, "seconds": 0.0, "max_seconds": 0.0,
+            "bytes_read": 0, "bytes_written": 0, "buckets": [0] * (len(BUCKETS) + 1)}
+
+
+def record(name, seconds, bytes_read=0, bytes_written=0, failed=False):
+    """Add one call of name (used by @timed, or directly for code that is not a function)."""
+    with _lock:
+        stats = _functions.get(name)
+        if stats is None:
+            stats = _functions[name] = new_function()
+        stats["calls"] += 1
+        if failed:
+            stats["errors"] += 1
+        stats["seconds"] += seconds
+        if seconds > stats["max_seconds"]:
+            stats["max_seconds"] = seconds
+        stats["bytes_read"] += max(bytes_read, 0)
+        stats["bytes_written"] += max(bytes_written, 0)
+        stats["buckets"][bisect.bisect_left(BUCKETS, seconds)] += 1
+
+
+def reset():
+    """Forget everything recorded so far."""
+    with _lock:
+        _functions.clear()
+    _settings["started"] = time.time()
+
+
+# ==========================================
+# Reporting
+# ==========================================
+def snapshot():
+    """Return a copy of all metrics (see the module description)."""
+    with _lock:
+        functions = {}
+        for name in _functions:
+            functions[name] = dict(_functions[name])
+            functions[name]["buckets"] = list(_functions[name]["buckets"])
+
+    max_rss = 0
+    if resource is not None:
+        # Kilobytes on Linux, bytes on macOS
+        max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        if sys.platform == "darwin":
+            max_rss = max_rss // 1024
+    process = {"seconds": round(time.time() - _settings["started"], 3), "max_rss_kb": max_rss,
+               "bytes_read": 0, "bytes_written": 0}
+    try:
+        with open("/proc/self/io", "rb") as file:
+            for line in file:
+                if line.startswith(b"rchar:"):
+                    process["bytes_read"] = int(line[6:])
+                elif line.startswith(b"wchar:"):
+                    process["bytes_written"] = int(line[6:])
+    except OSError:
+        pass
+    return {"process": process, "functions": functions}
+
+
+def to_json(metrics=None):
+    """Return the metrics as a JSON string."""
+    if metrics is None:
+        metrics = snapshot()
+    return json.dumps(metrics, indent=2, sort_keys=True)
+
+
+def to_prometheus(metrics=None, prefix="nutrition"):
+    """Return the metrics in the Prometheus text exposition format."""
+    if metrics is None:
+        metrics = snapshot()
+    lines = []
+    process = metrics["process"]
+    for key, kind in (("seconds", "gauge"), ("max_rss_kb", "gauge"),
+                      ("bytes_read", "counter"), ("bytes_written", "counter")):
+        metric = prefix + "_process_" + key
+        if kind == "counter":
+            metric = metric + "_total"
+        lines.append("# TYPE " + metric + " " + kind)
+        lines.append(metric + " " + str(process[key]))
+
+    functions = metrics["functions"]
+    names = sorted(functions)
+    histogram = prefix + "_call_seconds"
+    lines.append("# HELP " + histogram + " Time spent in instrumented functions.")
+    lines.append("# TYPE " + histogram + " histogram")
+    for name in names:
+        stats = functions[name]
+        label = 'function="' + name + '"'
+        count = 0
+        for bound, calls in zip(BUCKETS, stats["buckets"]):
+            count += calls
+            lines.append(histogram + '_bucket{' + label + ',le="' + repr(bound) + '"} ' + str(count))
+        lines.append(histogram + '_bucket{' + label + ',le="+Inf"} ' + str(stats["calls"]))
+        lines.append(histogram + "_sum{" + label + "} " + repr(stats["seconds"]))
+        lines.append(histogram + "_count{" + label + "} " + str(stats["calls"]))
+
+    for key in ("errors", "bytes_read", "bytes_written"):
+        metric = prefix + "_call_" + key + "_total"
+        lines.append("# TYPE " + metric + " counter")
+        for name in names:
+            lines.append(metric + '{function="' + name + '"} ' + str(functions[name][key]))
+    return "\n".join(lines) + "\n"
+
+
+def summary_table(metrics=None):
+    """Return the function metrics as a text table, slowest total first."""
+    if metrics is None:
+        metrics = snapshot()
+    functions = metrics["functions"]
+    lines = ["Function".ljust(34) + "Calls".rjust(8) + "Total ms".rjust(11) + "Mean ms".rjust(10)
+             + "Max ms".rjust(10) + "KB read".rjust(10) + "KB written".rjust(11)]
+    for name in sorted(functions, key=lambda name: functions[name]["seconds"], reverse=True):
+        stats = functions[name]
+        lines.append(name.ljust(34) + str(stats["calls"]).rjust(8)
+                     + format(stats["seconds"] * 1000, ".1f").rjust(11)
+                     + format(stats["seconds"] * 1000 / stats["calls"], ".3f").rjust(10)
+                     + format(stats["max_seconds"] * 1000, ".1f").rjust(10)
+                     + format(stats["bytes_read"] / 1024, ".1f").rjust(10)
+                     + format(stats["bytes_written"] / 1024, ".1f").rjust(11))
+    return "\n".join(lines)
+
+
+def write_metrics(path):
+    """Write the metrics to path (Prometheus text for .prom / .txt, JSON otherwise; - prints a table)."""
+    metrics = snapshot()
+    if path == "-":
+        print("\n--- Metrics ---")
+        print(summary_table(metrics))
+        return
+    if path.endswith((".prom", ".txt")):
+        text = to_prometheus(metrics)
+    else:
+        text = to_json(metrics)
+    with open(path, "w") as file:
+        file.write(text)
+
+
+# ==========================================
+# Profiling
+# ==========================================
+def start_profile(mode):
+    """Start a cpu (cProfile) or memory (tracemalloc) profile of this process."""
+    global _profiler
+    if mode == "cpu":
+        import cProfile
+        _profiler = cProfile.Profile()
+        _profiler.enable()
+    elif mode == "memory":
+        import tracemalloc
+        tracemalloc.start(10)
+
+
+def stop_profile(mode):
+    """Stop the profile, write it to PROFILE_FILE / MEMORY_FILE and print its top lines."""
+    global _profiler
+    if mode == "cpu" and _profiler is not None:
+        import pstats
+        _profiler.disable()
+        _profiler.dump_stats(PROFILE_FILE)
+        _profiler = None
+        print("\n--- CPU Profile (" + PROFILE_FILE + ") ---")
+        pstats.Stats(PROFILE_FILE).sort_stats("cumulative").print_stats(PROFILE_LINES)
+    elif mode == "memory":
+        import tracemalloc
+        if not tracemalloc.is_tracing():
+            return
+        current, peak = tracemalloc.get_traced_memory()
+        statistics = tracemalloc.take_snapshot().statistics("lineno")
+        tracemalloc.stop()
+        lines = ["Traced memory: " + str(current // 1024) + " KB now, " + str(peak // 1024) + " KB peak"]
+        for stat in statistics:
+            lines.append(str(stat))
+        with open(MEMORY_FILE, "w") as file:
+            file.write("\n".join(lines) + "\n")
+        print("\n--- Memory Profile (" + MEMORY_FILE + ") ---")
+        print("\n".join(lines[:PROFILE_LINES + 1]))
+
+
+def finish():
+    """Stop profiling and write the metrics (run at exit when metrics are on)."""
+    if _settings["profile"] is not None:
+        stop_profile(_settings["profile"])
+    if _settings["output"] is not None:
+        try:
+            write_metrics(_settings["output"])
+        except OSError as error:
+            print("Error: Could not write metrics: " + str(error))
@@ -7,6 +7,188 @@ This program helps athletes and fitness amateur track their daily nutrition inta
 calculate macronutrients (protein, carbohydrates, and fat), to help them achieve their fitness goals.
 """
 
+import datetime
+import os
+import sys
+
+import aggregates
+import file_lock
+import food_search
+import food_store
+import metrics
+import partitions
+import portions
+import sqlite_store
+
+DAILY_LOG = "daily_log.txt"
+DAILY_TOTALS = "daily_totals.json"
+DAILY_GOALS = "daily_goals.txt"
+
+# Storage: "files" (the text files above) or "sqlite" (DATABASE, see sqlite_store.py)
+STORAGE = "files"
+DATABASE = "nutrition_planner.db"
+
+# In the database, today's log is stored under this athlete key (it cannot
+# be a real athlete name); clearing the log moves its meals to ATHLETE
+LOG_ATHLETE = "#daily_log"
+
+DEFAULT_FOODS = [
+    ("chicken_breast", 31.0, 0.0, 3.6),
+    ("brown_rice", 2.6, 23.0, 0.9),
+    ("broccoli", 2.8, 7.0, 0.4),
+    ("salmon", 20.0, 0.0, 13.0),
+    ("oatmeal", 13.2, 67.7, 6.7),
+    ("banana", 1.1, 22.8, 0.3),
+    ("eggs", 13.0, 1.1, 11.0),
+]
+
+# Cleared logs are kept as history in the team storage under this athlete name
+ATHLETE = "default"
+
+# Meals written at a time when a whole log is copied (archive, migration)
+COPY_BATCH = 10000
+
+# Food database index, loaded on first use (see get_food_store)
+_food_store = None
+
+# Name search index over the food database, built on first use
+_search_index = None
+
+# Database connection pool, opened on first use (STORAGE = "sqlite")
+_db = None
+
+
+# ===== Food Store =====
+def get_food_store():
+    """Load the food database index once and reuse it for every lookup"""
+    global _food_store
+    if _food_store is None:
+        _food_store = food_store.load_store(food_store.FOOD_DATABASE)
+    return _food_store
+
+
+def get_db():
+    """Open the database once and reuse it"""
+    global _db
+    if _db is None:
+        _db = sqlite_store.open_db(DATABASE)
+    return _db
+
+
+@metrics.timed("nutrition_planner.lookup_food")
+def lookup_food(food_name):
+    """Return (protein, carbs, fat) per 100g, or None (OSError if there is no database file)"""
+    if STORAGE == "sqlite":
+        return sqlite_store.lookup_food(get_db(), food_name)
+    return food_store.lookup_food(get_food_store(), food_name)
+
+
+def food_names():
+    """Yield every food name in the database"""
+    if STORAGE == "sqlite":
+        for food in sqlite_store.load_foods(get_db()):
+            yield food['name']
+    else:
+        yield from food_store.food_names(get_food_store())
+
+
+def get_search_index():
+    """Build the food name search index once and reuse it"""
+    global _search_index
+    if _search_index is None:
+        _search_index = food_search.build_index((name, name) for name in food_names())
+    return _search_index
+
+
+def find_food(food_name):
+    """Return the database name for a typed food name, letting the user pick from close matches"""
+    try:
+        if lookup_food(food_name) is not None:
+            return food_name
+    except OSError:
+        print("Error: Database file not found!")
+        return None
+    
+    matches = food_search.search(get_search_index(), food_name, 10)
+    if len(matches) == 0:
+        print(f"Error: '{food_name}' not found in database!")
+        return None
+    
+    print(f"\n'{food_name}' is not in the database. Did you mean:")
+    for i in range(len(matches)):
+        print(f"{i + 1}. {matches[i]}")
+    
+    try:
+        choice = int(input(f"Select food (1-{len(matches)}): "))
+    except ValueError:
+        print("Error: Please enter a valid number!")
+        return None
+    
+    if choice < 1 or choice > len(matches):
+        print("Error: Invalid selection!")
+        return None
+    return matches[choice - 1]
+
+
+# ===== Daily Log Totals =====
+def parse_log_line(line):
+    """Split a 'food,grams,calories,protein,carbs,fat' log line into a meal, or None if malformed"""
+    parts = line.strip().split(",")
+    if len(parts) < 6:
+        return None
+    try:
+        float(parts[1])
+        return {
+            'food': parts[0],
+            'grams': parts[1],
+            'calories': float(parts[2]),
+            'protein': float(parts[3]),
+            'carbs': float(parts[4]),
+            'fat': float(parts[5])
+        }
+    except ValueError:
+        return None
+
+
+@metrics.timed("nutrition_planner.load_daily_totals")
+def load_daily_totals():
+    """Return today's running totals ({'log_size', 'totals'}), or None if there is no log"""
+    if STORAGE == "sqlite":
+        # Added up by SQLite; there is no log file to measure
+        return {'log_size': None, 'totals': sqlite_store.totals(get_db(), LOG_ATHLETE)}
+    return aggregates.load_log_totals(DAILY_TOTALS, DAILY_LOG, parse_log_line)
+
+
+def iter_daily_meals():
+    """Yield the meals in today's log (parse_log_line format) one at a time, nothing if there is no log"""
+    if STORAGE == "sqlite":
+        for entry in sqlite_store.load_meals(get_db(), LOG_ATHLETE):
+            yield {'food': entry['name'], 'grams': str(entry['portion']),
+                   'calories': entry['calories'], 'protein': entry['protein'],
+                   'carbs': entry['carbs'], 'fat': entry['fat']}
+        return
+    
+    # Streamed in chunks, so even a huge log is read in constant memory
+    try:
+        file = open(DAILY_LOG, "rb")
+    except OSError:
+        return
+    with file:
+        yield from aggregates.read_meals(file, parse_log_line)
+
+
+def clear_daily_log():
+    """Move today's meals into the history, then empty the log and reset its running totals"""
+    if STORAGE == "sqlite":
+        sqlite_store.move_meals(get_db(), LOG_ATHLETE, ATHLETE)
+        return
+    with file_lock.locked(DAILY_LOG):
+        archive_daily_log()
+        file = open(DAILY_LOG, "w")
+        file.close()
+        aggregates.save_log_totals(DAILY_TOTALS, {"log_size": 0, "totals": aggregates.new_totals()})
+
+
 # ===== Function 1: Add Food to Database =====
 def addFood():
     """Add a new food item to the database"""
@@ -14,6 +196,18 @@ def addFood():
     
     # Get user input
     food_name = input("Food name: ").strip().lower()
+    if food_name == "":
+        print("Error: Food name cannot be empty!")
+        return
+    
+    # Each name is in the database once (an indexed lookup, not a file scan)
+    try:
+        if lookup_food(food_name) is not None:
+            print(f"Error: '{food_name}' is already in the database!")
+            return
+    except OSError:
+        print("Error: Database file not found!")
+        return
     
     # Input validation - using try-except error handling
     try:
@@ -29,15 +223,26 @@ def addFood():
         print("Error: Please enter valid numbers!")
         return
     
-    # Open file and add new food - using append mode
-    file = open("food_database.txt", "a")
-    file.write(f"{food_name},{protein},{carbs},{fat}\n")
-    file.close()
+    # Append to the database file and update the in-memory index
+    try:
+        if STORAGE == "sqlite":
+            sqlite_store.add_foods(get_db(), [{'name': food_name, 'protein': protein,
+                                               'carbs': carbs, 'fat': fat}])
+        else:
+            food_store.add_food(get_food_store(), food_name, protein, carbs, fat)
+    except OSError:
+        print("Error: Database file not found!")
+        return
+    
+    # Keep the search index up to date
+    if _search_index is not None:
+        food_search.add_name(_search_index, food_name, food_name)
     
     print(f"Success: '{food_name}' has been added to the database!")
 
 
 # ===== Function 2: Calculate Calories =====
+@metrics.timed("nutrition_planner.calculateCalories")
 def calculateCalories(food_name, portion_grams):
     """
     Calculate calories and macronutrients for a specific food portion
@@ -48,53 +253,182 @@ def calculateCalories(food_name, portion_grams):
         print("Error: Portion size must be greater than 0!")
         return None
     
-    # Read food database
+    # Look up the food in the in-memory index (no file reads)
     try:
-        file = open("food_database.txt", "r")
-        lines = file.readlines()
-        file.close()
-    except:
+        macros = lookup_food(food_name)
+    except OSError:
         print("Error: Database file not found!")
         return None
     
-    # Search for food in database
-    found = False
-    for line in lines:
-        # Split each line: name,protein,carbs,fat
-        parts = line.strip().split(",")
-        name = parts[0]
-        
-        if name == food_name.lower():
-            found = True
-            # Get nutritional values per 100g
-            protein_per_100 = float(parts[1])
-            carbs_per_100 = float(parts[2])
-            fat_per_100 = float(parts[3])
-            
-            # Calculate actual nutritional values based on portion
-            protein = (protein_per_100 * portion_grams) / 100
-            carbs = (carbs_per_100 * portion_grams) / 100
-            fat = (fat_per_100 * portion_grams) / 100
-            
-            # Calculate total calories
-            calories = (protein * 4) + (carbs * 4) + (fat * 9)
-            
-            # Log to daily log file
-            log_file = open("daily_log.txt", "a")
-            log_file.write(f"{food_name},{portion_grams},{calories:.1f},{protein:.1f},{carbs:.1f},{fat:.1f}\n")
-            log_file.close()
-            
-            # Return results
-            return {
-                'calories': calories,
-                'protein': protein,
-                'carbs': carbs,
-                'fat': fat
-            }
-    
-    if not found:
+    if macros is None:
         print(f"Error: '{food_name}' not found in database!")
         return None
+    
+    result = portion_nutrition(macros, portion_grams)
+    
+    # Log to daily log file
+    append_log_lines([format_log_line(food_name, portion_grams, result)])
+    
+    # Return results
+    return result
+
+
+def portion_nutrition(macros, portion_grams):
+    """Scale per-100g (protein, carbs, fat) to a portion and add its calories"""
+    # Cached by food values and portion (see portions.py)
+    protein_per_100, carbs_per_100, fat_per_100 = macros
+    calories, protein, carbs, fat = portions.portion(protein_per_100, carbs_per_100, fat_per_100,
+                                                     portion_grams)
+    
+    return {
+        'calories': calories,
+        'protein': protein,
+        'carbs': carbs,
+        'fat': fat
+    }
+
+
+def format_log_line(food_name, portion_grams, result):
+    """Build the daily log line for one meal"""
+    return f"{food_name},{portion_grams},{result['calories']:.1f},{result['protein']:.1f},{result['carbs']:.1f},{result['fat']:.1f}\n"
+
+
+def append_log_lines(lines):
+    """Append meal lines to the daily log in one write and update the running totals"""
+    if STORAGE == "sqlite":
+        today = aggregates.today()
+        entries = []
+        for line in lines:
+            meal = parse_log_line(line)
+            entries.append({'name': meal['food'], 'portion': float(meal['grams']),
+                            'calories': meal['calories'], 'protein': meal['protein'],
+                            'carbs': meal['carbs'], 'fat': meal['fat'], 'date': today})
+        sqlite_store.add_meals(get_db(), LOG_ATHLETE, entries)
+        return
+    
+    # Other processes may be logging too: hold the log lock until the totals match the log
+    with file_lock.locked(DAILY_LOG):
+        # Load the running totals before the log grows
+        saved = load_daily_totals()
+        
+        text = "".join(lines)
+        log_file = open(DAILY_LOG, "a")
+        log_file.write(text)
+        log_file.close()
+        
+        # Add the meals to the running totals (a missing log is rebuilt on next load)
+        if saved is not None:
+            for line in lines:
+                aggregates.add_meal(saved['totals'], parse_log_line(line))
+            saved['log_size'] += len(text.encode("utf-8"))
+            aggregates.save_log_totals(DAILY_TOTALS, saved)
+
+
+def archive_daily_log():
+    """Append the meals in the daily log to the partitioned history"""
+    if not os.path.exists(DAILY_LOG):
+        return
+    
+    # The log has no dates, so use the day the last meal was written
+    day = datetime.date.fromtimestamp(os.path.getmtime(DAILY_LOG)).isoformat()
+    entries = []
+    for meal in iter_daily_meals():
+        entries.append(history_entry(meal, day))
+        if len(entries) == COPY_BATCH:
+            partitions.append_meals(partitions.TEAM_DIR, ATHLETE, entries)
+            entries = []
+    
+    if len(entries) > 0:
+        partitions.append_meals(partitions.TEAM_DIR, ATHLETE, entries)
+
+
+def history_entry(meal, day):
+    """Turn a daily log meal into a dated log entry (final.py format)"""
+    return {
+        'name': meal['food'],
+        'portion': float(meal['grams']),
+        'calories': round(meal['calories']),
+        'protein': meal['protein'],
+        'carbs': meal['carbs'],
+        'fat': meal['fat'],
+        'date': day
+    }
+
+
+# ===== Batch Meal Logging =====
+@metrics.timed("nutrition_planner.logMeals")
+def logMeals(meals):
+    """
+    Log many meals with a single write to the daily log
+    Each meal is a dictionary with 'food' and 'portion' (grams).
+    Returns (results, errors): one nutrition dictionary per logged meal,
+    and (position in meals, message) for every meal that was skipped.
+    """
+    lines = []
+    results = []
+    errors = []
+    for i in range(len(meals)):
+        food_name = str(meals[i].get('food', '')).strip().lower()
+        try:
+            portion_grams = portions.check_grams(meals[i].get('portion'))
+        except ValueError as error:
+            errors.append((i, str(error)))
+            continue
+        
+        macros = lookup_food(food_name)
+        if macros is None:
+            errors.append((i, f"unknown food: {food_name}"))
+            continue
+        
+        result = portion_nutrition(macros, portion_grams)
+        lines.append(format_log_line(food_name, portion_grams, result))
+        results.append(result)
+    
+    if len(lines) > 0:
+        append_log_lines(lines)
+    return results, errors
+
+
+# ===== Batch Food Import =====
+@metrics.timed("nutrition_planner.addFoods")
+def addFoods(foods, reindex=True):
+    """
+    Add many checked foods with a single write to the database
+    Each food is a dictionary with 'name', 'protein', 'carbs' and 'fat' per 100g.
+    Names already in the database (or repeated in foods) are skipped.
+    With reindex=False the index is left alone, so a long import can add
+    batches (with no name repeated between them) and call indexFoods() once.
+    Returns the number of foods added.
+    """
+    seen = set()
+    new = []
+    for food in foods:
+        food_name = food['name'].strip().lower()
+        if food_name in seen or lookup_food(food_name) is not None:
+            continue
+        seen.add(food_name)
+        new.append((food_name, food['protein'], food['carbs'], food['fat']))
+
+    if len(new) == 0:
+        return 0
+    if STORAGE == "sqlite":
+        sqlite_store.add_foods(get_db(), [{'name': name, 'protein': protein, 'carbs': carbs, 'fat': fat}
+                                          for name, protein, carbs, fat in new])
+    else:
+        food_store.append_foods(get_food_store(), new)
+    if reindex:
+        indexFoods()
+    return len(new)
+
+
+def indexFoods():
+    """Index the foods added since the last index update and rebuild the search index on next use"""
+    global _search_index
+    if STORAGE != "sqlite":
+        store = get_food_store()
+        if food_store.refresh_store(store) > 0:
+            food_store.save_index(store)
+    _search_index = None
 
 
 # ===== Function 3: Set Daily Goal =====
@@ -143,11 +477,7 @@ def setDailyGoal():
     fat_grams = (daily_calories * fat_percent / 100) / 9
     
     # Save to file
-    file = open("daily_goals.txt", "w")
-    file.write(f"{goal_type}\n")
-    file.write(f"{daily_calories}\n")
-    file.write(f"{protein_grams},{carbs_grams},{fat_grams}\n")
-    file.close()
+    save_daily_goal(goal_type, daily_calories, protein_grams, carbs_grams, fat_grams)
     
     print(f"\nSuccess: Daily goals have been set!")
     print(f"Goal Type: {goal_type}")
@@ -157,52 +487,60 @@ def setDailyGoal():
     print(f"Fat: {fat_grams:.1f}g")
 
 
+def save_daily_goal(goal_type, calories, protein, carbs, fat):
+    """Store the daily goal (replacing the previous one)"""
+    if STORAGE == "sqlite":
+        sqlite_store.save_goals(get_db(), LOG_ATHLETE, {'calories': calories, 'protein': protein,
+                                                        'carbs': carbs, 'fat': fat, 'mode': goal_type})
+        return
+    file = open(DAILY_GOALS, "w")
+    file.write(f"{goal_type}\n")
+    file.write(f"{calories}\n")
+    file.write(f"{protein},{carbs},{fat}\n")
+    file.close()
+
+
+def load_daily_goal():
+    """Return (goal type, calories, protein, carbs, fat); raises an error if no goal is set"""
+    if STORAGE == "sqlite":
+        goals = sqlite_store.load_goals(get_db(), LOG_ATHLETE)
+        return (goals['mode'], float(goals['calories']), float(goals['protein']),
+                float(goals['carbs']), float(goals['fat']))
+    return read_goal_file()
+
+
+def read_goal_file():
+    """Read (goal type, calories, protein, carbs, fat) from DAILY_GOALS"""
+    file = open(DAILY_GOALS, "r")
+    lines = file.readlines()
+    file.close()
+    
+    goal_type = lines[0].strip()
+    goal_calories = float(lines[1].strip())
+    macros = lines[2].strip().split(",")
+    return goal_type, goal_calories, float(macros[0]), float(macros[1]), float(macros[2])
+
+
 # ===== Function 4: Calculate Daily Nutrition =====
 def calculateDailyNutrition():
     """Display all meals logged for today"""
     print("\n--- Daily Nutrition Summary ---")
     
-    try:
-        file = open("daily_log.txt", "r")
-        lines = file.readlines()
-        file.close()
-    except:
-        print("No meals have been logged today")
-        return
+    # One pass over the log: print each meal and add it up as it is read
+    totals = aggregates.new_totals()
+    for meal in iter_daily_meals():
+        if totals['meals'] == 0:
+            print("\nToday's Food Log:")
+            print("-" * 70)
+        print(f"{meal['food']} ({meal['grams']}g): {meal['calories']:.0f} cal | P: {meal['protein']:.1f}g C: {meal['carbs']:.1f}g F: {meal['fat']:.1f}g")
+        aggregates.add_meal(totals, meal)
     
-    if len(lines) == 0:
+    if totals['meals'] == 0:
         print("No meals have been logged today")
         return
     
-    # Initialize totals
-    total_calories = 0
-    total_protein = 0
-    total_carbs = 0
-    total_fat = 0
-    
-    print("\nToday's Food Log:")
     print("-" * 70)
-    
-    # Iterate through each line
-    for line in lines:
-        parts = line.strip().split(",")
-        food = parts[0]
-        grams = parts[1]
-        calories = float(parts[2])
-        protein = float(parts[3])
-        carbs = float(parts[4])
-        fat = float(parts[5])
-        
-        print(f"{food} ({grams}g): {calories:.0f} cal | P: {protein:.1f}g C: {carbs:.1f}g F: {fat:.1f}g")
-        
-        # Accumulate totals
-        total_calories += calories
-        total_protein += protein
-        total_carbs += carbs
-        total_fat += fat
-    
-    print("-" * 70)
-    print(f"TOTAL: {total_calories:.0f} cal | P: {total_protein:.1f}g C: {total_carbs:.1f}g F: {total_fat:.1f}g")
+    print(f"TOTAL: {totals['calories']:.0f} cal | P: {totals['protein']:.1f}g C: {totals['carbs']:.1f}g F: {totals['fat']:.1f}g")
 
 
 # ===== Function 5: Calculate Deficit/Surplus =====
@@ -212,41 +550,22 @@ def calculateDeficit():
     
     # Read goals
     try:
-        file = open("daily_goals.txt", "r")
-        lines = file.readlines()
-        file.close()
-        
-        goal_type = lines[0].strip()
-        goal_calories = float(lines[1].strip())
-        macros = lines[2].strip().split(",")
-        goal_protein = float(macros[0])
-        goal_carbs = float(macros[1])
-        goal_fat = float(macros[2])
+        goal_type, goal_calories, goal_protein, goal_carbs, goal_fat = load_daily_goal()
     except:
         print("Error: Please set your daily goals first!")
         return
     
-    # Read today's intake
-    try:
-        file = open("daily_log.txt", "r")
-        lines = file.readlines()
-        file.close()
-        
-        total_calories = 0
-        total_protein = 0
-        total_carbs = 0
-        total_fat = 0
-        
-        for line in lines:
-            parts = line.strip().split(",")
-            total_calories += float(parts[2])
-            total_protein += float(parts[3])
-            total_carbs += float(parts[4])
-            total_fat += float(parts[5])
-    except:
+    # Read today's running totals
+    saved = load_daily_totals()
+    if saved is None:
         print("No meals have been logged today")
         return
     
+    total_calories = saved['totals']['calories']
+    total_protein = saved['totals']['protein']
+    total_carbs = saved['totals']['carbs']
+    total_fat = saved['totals']['fat']
+    
     # Calculate differences
     cal_diff = total_calories - goal_calories
     protein_diff = total_protein - goal_protein
@@ -271,6 +590,7 @@ def calculateDeficit():
 
 
 # ===== Function 6: Generate Report =====
+@metrics.timed("nutrition_planner.generateReport")
 def generateReport():
     """Generate detailed report with progress bars"""
     print("\n" + "=" * 70)
@@ -279,42 +599,23 @@ def generateReport():
     
     # Read goals
     try:
-        file = open("daily_goals.txt", "r")
-        lines = file.readlines()
-        file.close()
-        
-        goal_type = lines[0].strip()
-        goal_calories = float(lines[1].strip())
-        macros = lines[2].strip().split(",")
-        goal_protein = float(macros[0])
-        goal_carbs = float(macros[1])
-        goal_fat = float(macros[2])
+        goal_type, goal_calories, goal_protein, goal_carbs, goal_fat = load_daily_goal()
     except:
         print("Error: Please set your daily goals first!")
         return
     
-    # Read today's intake
-    try:
-        file = open("daily_log.txt", "r")
-        lines = file.readlines()
-        file.close()
-        
-        total_calories = 0
-        total_protein = 0
-        total_carbs = 0
-        total_fat = 0
-        meal_count = len(lines)
-        
-        for line in lines:
-            parts = line.strip().split(",")
-            total_calories += float(parts[2])
-            total_protein += float(parts[3])
-            total_carbs += float(parts[4])
-            total_fat += float(parts[5])
-    except:
+    # Read today's running totals
+    saved = load_daily_totals()
+    if saved is None:
         print("No meals have been logged today")
         return
     
+    total_calories = saved['totals']['calories']
+    total_protein = saved['totals']['protein']
+    total_carbs = saved['totals']['carbs']
+    total_fat = saved['totals']['fat']
+    meal_count = saved['totals']['meals']
+    
     # Calculate percentages
     cal_percent = (total_calories / goal_calories) * 100
     protein_percent = (total_protein / goal_protein) * 100
@@ -348,30 +649,88 @@ def generateReport():
 # ===== Initialize Files =====
 def initialize_files():
     """Create default files if they don't exist"""
+    if STORAGE == "sqlite":
+        # Creates the tables and adds the default foods to an empty database
+        sqlite_store.load_foods(get_db(), default_food_dicts())
+        return
+    
     # Create food database
-    try:
-        file = open("food_database.txt", "r")
-        file.close()
-    except:
-        file = open("food_database.txt", "w")
+    if not os.path.exists(food_store.FOOD_DATABASE):
+        file = open(food_store.FOOD_DATABASE, "w")
         # Add some default foods
-        file.write("chicken_breast,31.0,0.0,3.6\n")
-        file.write("brown_rice,2.6,23.0,0.9\n")
-        file.write("broccoli,2.8,7.0,0.4\n")
-        file.write("salmon,20.0,0.0,13.0\n")
-        file.write("oatmeal,13.2,67.7,6.7\n")
-        file.write("banana,1.1,22.8,0.3\n")
-        file.write("eggs,13.0,1.1,11.0\n")
+        for name, protein, carbs, fat in DEFAULT_FOODS:
+            file.write(f"{name},{protein},{carbs},{fat}\n")
         file.close()
         print("Success: Food database has been created with default foods")
     
     # Create daily log file
-    try:
-        file = open("daily_log.txt", "r")
+    if not os.path.exists(DAILY_LOG):
+        file = open(DAILY_LOG, "w")
         file.close()
-    except:
-        file = open("daily_log.txt", "w")
+
+
+def default_food_dicts():
+    """Return DEFAULT_FOODS as food dictionaries"""
+    return [{'name': name, 'protein': protein, 'carbs': carbs, 'fat': fat}
+            for name, protein, carbs, fat in DEFAULT_FOODS]
+
+
+# ===== Migration to SQLite =====
+def migrate_to_sqlite():
+    """
+    Copy the food database, daily log and goals files into DATABASE; return counts
+    The log and goals are copied once: running the migration again skips them
+    """
+    db = get_db()
+    counts = {'foods': 0, 'meals': 0}
+    
+    if os.path.exists(food_store.FOOD_DATABASE):
+        foods = []
+        file = open(food_store.FOOD_DATABASE, "r")
+        for line in file:
+            parsed = food_store.parse_food_line(line)
+            if parsed is not None:
+                protein, carbs, fat = parsed[1]
+                foods.append({'name': parsed[0], 'protein': protein, 'carbs': carbs, 'fat': fat})
+        file.close()
+        sqlite_store.add_foods(db, foods)
+        counts['foods'] = len(foods)
+    
+    goals = None
+    if os.path.exists(DAILY_GOALS):
+        try:
+            goal_type, calories, protein, carbs, fat = read_goal_file()
+            goals = {'calories': calories, 'protein': protein, 'carbs': carbs, 'fat': fat,
+                     'mode': goal_type}
+        except (OSError, ValueError, IndexError):
+            goals = None
+    
+    batches = []
+    if os.path.exists(DAILY_LOG):
+        batches = daily_log_batches()
+    if goals is not None or os.path.exists(DAILY_LOG):
+        counts['meals'] = sqlite_store.copy_meals(db, "planner", LOG_ATHLETE, batches, goals)
+    return counts
+
+
+def daily_log_batches():
+    """Yield the daily log file as lists of up to COPY_BATCH dated log entries (final.py format)"""
+    # The log has no dates, so use the day the last meal was written
+    day = datetime.date.fromtimestamp(os.path.getmtime(DAILY_LOG)).isoformat()
+    entries = []
+    file = open(DAILY_LOG, "rb")
+    try:
+        for meal in aggregates.read_meals(file, parse_log_line):
+            entries.append({'name': meal['food'], 'portion': float(meal['grams']),
+                            'calories': meal['calories'], 'protein': meal['protein'],
+                            'carbs': meal['carbs'], 'fat': meal['fat'], 'date': day})
+            if len(entries) == COPY_BATCH:
+                yield entries
+                entries = []
+    finally:
         file.close()
+    if len(entries) > 0:
+        yield entries
 
 
 # ===== Main Menu =====
@@ -394,6 +753,7 @@ def print_menu():
 # ===== Main Program =====
 def main():
     """Main program loop"""
+    metrics.configure(sys.argv[1:])
     initialize_files()
     
     print("\nWelcome to Athletic Nutrition Planner!")
@@ -408,7 +768,9 @@ def main():
             addFood()
             
         elif choice == "2":
-            food_name = input("Food name: ").strip().lower()
+            food_name = find_food(input("Food name: ").strip().lower())
+            if food_name is None:
+                continue
             try:
                 portion = float(input("Portion size (grams): "))
                 result = calculateCalories(food_name, portion)
@@ -435,8 +797,7 @@ def main():
             
         elif choice == "7":
             # Clear today's log
-            file = open("daily_log.txt", "w")
-            file.close()
+            clear_daily_log()
             print("Success: Today's log has been cleared")
             
         elif choice == "8":
@@ -0,0 +1,464 @@
+"""
+==============================================================================
+Athletic Nutrition Planner
+Team Storage (partitioned by athlete and date)
+
+Description:
+    Stores meals for a whole team, one file per athlete per day, so the
+    history is never rewritten and reading one athlete's day (or the last
+    few weeks) only opens the files for that athlete and those days.
+    Whole weeks older than a few weeks can be rolled into compressed week
+    files (archive_days, see meal_archive.py); reading a day looks in both.
+
+Layout:
+    team_data/
+    ├── foods.jsonl                      # shared food catalog, one food per line
+    └── <athlete>/
+        ├── goals.json                   # the athlete's current goals
+        ├── rollups/
+        │   └── YYYY-MM.json             # the month's daily/weekly/monthly summaries (rollups.py)
+        ├── meals/
+        │   └── YYYY-MM-DD.jsonl         # one meal entry per line
+        └── archive/                     # older weeks, compressed (meal_archive.py)
+
+    Meal entries use the same dictionaries as final.py's log
+    (name, portion, calories, protein, carbs, fat, date). All writes are
+    appends, except goals.json and the rollup files which are small and
+    replaced atomically. The rollups are kept per month so a meal write
+    only rewrites its own month's file: a week that spans two months has
+    a part in each, added together when the rollups are loaded. They are
+    built from the meal files the first time they are needed. Writes hold
+    a lock per athlete (meals.lock, goals.json.lock) or on foods.jsonl, so
+    several processes can share the folder.
+==============================================================================
+"""
+
+import datetime
+import json
+import os
+import shutil
+
+import aggregates
+import file_lock
+import meal_archive
+import metrics
+import rollups
+
+TEAM_DIR = "team_data"
+
+# Folder of an athlete's rollups, one file per month
+ROLLUPS_DIR = "rollups"
+
+
+# ==========================================
+# Paths
+# ==========================================
+def safe_name(athlete):
+    """Turn an athlete name into a directory name (letters, digits, - and _)."""
+    name = ""
+    for char in athlete.strip().lower():
+        if char.isalnum() or char in "-_":
+            name += char
+        elif char == " ":
+            name += "_"
+    if name == "":
+        raise ValueError("athlete name must contain letters or digits")
+    return name
+
+
+def athlete_dir(root, athlete):
+    """Return the directory that holds one athlete's data."""
+    return os.path.join(root, safe_name(athlete))
+
+
+def day_path(root, athlete, day):
+    """Return the meal file of one athlete and day (YYYY-MM-DD)."""
+    # Parsing the date keeps odd strings from escaping the meals directory
+    day = datetime.date.fromisoformat(day).isoformat()
+    return os.path.join(athlete_dir(root, athlete), "meals", day + ".jsonl")
+
+
+def list_athletes(root):
+    """Return the directory names of all athletes with stored data."""
+    if not os.path.isdir(root):
+        return []
+    names = []
+    for name in sorted(os.listdir(root)):
+        if os.path.isdir(os.path.join(root, name)):
+            names.append(name)
+    return names
+
+
+# ==========================================
+# Meals
+# ==========================================
+@metrics.timed("partitions.append_meals")
+def append_meals(root, athlete, entries):
+    """Append meal entries to their day files (one write per day touched)."""
+    by_day = {}
+    for entry in entries:
+        if entry["date"] not in by_day:
+            by_day[entry["date"]] = []
+        by_day[entry["date"]].append(json.dumps(entry, separators=(",", ":")) + "\n")
+
+    folder = athlete_dir(root, athlete)
+    os.makedirs(os.path.join(folder, "meals"), exist_ok=True)
+    with file_lock.locked(os.path.join(folder, "meals")):
+        # Never append to a day file an interrupted archive run left behind
+        if len(meal_archive.load_index(folder)["pending"]) > 0:
+            _settle_archive(root, athlete, meal_archive.load_index(folder, fresh=True))
+        built = os.path.isdir(os.path.join(folder, ROLLUPS_DIR))
+        for day in by_day:
+            with open(day_path(root, athlete, day), "a") as file:
+                file.write("".join(by_day[day]))
+
+        # Missing rollups are built after the write, so they include these meals
+        if not built:
+            _build_rollups(root, athlete)
+            return
+        by_month = {}
+        for entry in entries:
+            by_month.setdefault(rollups.month_start(entry["date"]), []).append(entry)
+        for month in by_month:
+            summaries = _read_rollups(root, athlete, month)
+            for entry in by_month[month]:
+                rollups.add_meal(summaries, entry)
+            _save_rollups(root, athlete, month, summaries)
+
+
+@metrics.timed("partitions.read_day")
+def read_day(root, athlete, day):
+    """Return the meal entries of one athlete and day (empty if none)."""
+    path = day_path(root, athlete, day)
+    folder = athlete_dir(root, athlete)
+    index = meal_archive.load_index(folder)
+    entries = []
+    if meal_archive.archived(index, day):
+        entries = _read_archived(folder, index, day)
+    if not os.path.exists(path):
+        return entries
+    if day in index["pending"] and meal_archive.is_leftover(index, day, os.path.getsize(path)):
+        return entries
+    return entries + _read_day_file(path)
+
+
+def _read_archived(folder, index, day):
+    """Return a day's meals from the archive."""
+    try:
+        days = meal_archive.read_week(folder, index, rollups.week_start(day))
+    except FileNotFoundError:
+        # The archive was rewritten since the index was read
+        index = meal_archive.load_index(folder)
+        days = meal_archive.read_week(folder, index, rollups.week_start(day))
+    return list(days.get(day, ()))
+
+
+def _read_day_file(path):
+    """Return the meal entries in one day file."""
+    entries = []
+    with open(path, "r") as file:
+        for line in file:
+            # An unfinished last line means a write was cut short
+            if not line.endswith("\n"):
+                break
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                continue
+    return entries
+
+
+def list_days(root, athlete):
+    """Return the days (YYYY-MM-DD) that have meals for an athlete, oldest first."""
+    folder = athlete_dir(root, athlete)
+    index = meal_archive.load_index(folder)
+    days = set(meal_archive.archived_days(index))
+    days.update(_day_files(root, athlete, index))
+    return sorted(days)
+
+
+def _day_files(root, athlete, index):
+    """Return the days that have a day file (not counting ones already archived)."""
+    folder = os.path.join(athlete_dir(root, athlete), "meals")
+    if not os.path.isdir(folder):
+        return []
+    days = []
+    for name in sorted(os.listdir(folder)):
+        if name.endswith(".jsonl"):
+            day = name[:-len(".jsonl")]
+            if day in index["pending"] and meal_archive.is_leftover(
+                    index, day, os.path.getsize(os.path.join(folder, name))):
+                continue
+            days.append(day)
+    return days
+
+
+def read_range(root, athlete, start_day, end_day):
+    """Yield (day, entries) for every day from start_day to end_day with meals."""
+    day = datetime.date.fromisoformat(start_day)
+    last = datetime.date.fromisoformat(end_day)
+    while day <= last:
+        entries = read_day(root, athlete, day.isoformat())
+        if len(entries) > 0:
+            yield day.isoformat(), entries
+        day = day + datetime.timedelta(days=1)
+
+
+def last_days(root, athlete, count, end_day=None):
+    """Yield (day, entries) for the last count days up to end_day (default today)."""
+    if end_day is None:
+        end_day = datetime.date.today().isoformat()
+    start = datetime.date.fromisoformat(end_day) - datetime.timedelta(days=count - 1)
+    return read_range(root, athlete, start.isoformat(), end_day)
+
+
+def clear_day(root, athlete, day):
+    """Delete one athlete's meals for one day (archived or not); other days are untouched."""
+    path = day_path(root, athlete, day)
+    folder = athlete_dir(root, athlete)
+    if not os.path.exists(path) and not meal_archive.archived(meal_archive.load_index(folder), day):
+        return
+    with file_lock.locked(os.path.join(folder, "meals")):
+        built = os.path.isdir(os.path.join(folder, ROLLUPS_DIR))
+        index = meal_archive.load_index(folder, fresh=True)
+        if meal_archive.archived(index, day):
+            # Rewrite the day's week without it
+            monday = rollups.week_start(day)
+            days = dict(meal_archive.read_week(folder, index, monday))
+            days.pop(day, None)
+            old_file = meal_archive.write_week(folder, index, monday, days, _compression(index, monday))
+            meal_archive.save_index(folder, index)
+            meal_archive.remove_files(folder, [old_file])
+        if os.path.exists(path):
+            os.remove(path)
+        if not built:
+            _build_rollups(root, athlete)
+            return
+        month = rollups.month_start(day)
+        summaries = _read_rollups(root, athlete, month)
+        rollups.clear_day(summaries, day)
+        _save_rollups(root, athlete, month, summaries)
+
+
+# ==========================================
+# Archive
+# ==========================================
+def archive_days(root, athlete, keep_days=meal_archive.KEEP_DAYS, compression=meal_archive.COMPRESSION,
+                 today=None):
+    """
+    Roll the day files of every whole week that ended more than keep_days
+    before today into the compressed archive (see meal_archive.py), merging
+    days logged late into their week. Returns the number of day files moved.
+    """
+    if today is None:
+        today = datetime.date.today().isoformat()
+    cutoff = rollups.week_start((datetime.date.fromisoformat(today)
+                                 - datetime.timedelta(days=keep_days)).isoformat())
+    folder = athlete_dir(root, athlete)
+    if not os.path.isdir(os.path.join(folder, "meals")):
+        return 0
+
+    with file_lock.locked(os.path.join(folder, "meals")):
+        index = meal_archive.load_index(folder, fresh=True)
+        _settle_archive(root, athlete, index)
+
+        weeks = {}
+        for day in _day_files(root, athlete, index):
+            if day < cutoff:
+                weeks.setdefault(rollups.week_start(day), []).append(day)
+        if len(weeks) == 0:
+            return 0
+
+        old_files = []
+        for monday in sorted(weeks):
+            days = {}
+            for day, entries in meal_archive.read_week(folder, index, monday).items():
+                days[day] = list(entries)
+            for day in weeks[monday]:
+                path = day_path(root, athlete, day)
+                entries = _read_day_file(path)
+                days.setdefault(day, []).extend(entries)
+                index["pending"][day] = os.path.getsize(path)
+            old_files.append(meal_archive.write_week(folder, index, monday, days, compression))
+
+        # The index is the switch-over point; the old files go after it
+        meal_archive.save_index(folder, index)
+        meal_archive.remove_files(folder, old_files)
+        moved = len(index["pending"])
+        _settle_archive(root, athlete, index)
+    return moved
+
+
+def range_totals(root, athlete, start, end):
+    """
+    Return the totals (see aggregates.py) of an athlete's meals from start
+    to end (inclusive): archived days from the archive index without
+    decompressing anything, plus the day files in the range.
+    """
+    index = meal_archive.load_index(athlete_dir(root, athlete))
+    totals = meal_archive.range_totals(index, start, end)
+    for day in _day_files(root, athlete, index):
+        if start <= day <= end:
+            for entry in _read_day_file(day_path(root, athlete, day)):
+                aggregates.add_meal(totals, entry)
+    return totals
+
+
+def _settle_archive(root, athlete, index):
+    """
+    Delete the day files and week files an archive write has replaced
+    (the caller holds the meals lock and passes a fresh index).
+    """
+    folder = athlete_dir(root, athlete)
+    if len(index["pending"]) == 0 and len(meal_archive.unused_files(folder, index)) == 0:
+        return
+    for day in list(index["pending"]):
+        path = day_path(root, athlete, day)
+        if os.path.exists(path) and meal_archive.is_leftover(index, day, os.path.getsize(path)):
+            os.remove(path)
+    index["pending"] = {}
+    meal_archive.save_index(folder, index)
+    meal_archive.remove_files(folder, meal_archive.unused_files(folder, index))
+
+
+def _compression(index, monday):
+    """Return the compression an archived week was written with."""
+    if index["weeks"][monday]["file"].endswith(meal_archive.SUFFIXES["zlib"]):
+        return "zlib"
+    return "lzma"
+
+
+# ==========================================
+# Rollups
+# ==========================================
+def load_rollups(root, athlete):
+    """Return an athlete's rollups (see rollups.py), building them on first use."""
+    folder = athlete_dir(root, athlete)
+    if not os.path.isdir(os.path.join(folder, ROLLUPS_DIR)):
+        if not os.path.isdir(os.path.join(folder, "meals")):
+            return rollups.new_rollups()
+        with file_lock.locked(os.path.join(folder, "meals")):
+            if not os.path.isdir(os.path.join(folder, ROLLUPS_DIR)):
+                _build_rollups(root, athlete)
+
+    summaries = rollups.new_rollups()
+    for name in sorted(os.listdir(os.path.join(folder, ROLLUPS_DIR))):
+        if name.endswith(".json"):
+            rollups.merge_rollups(summaries, _read_rollups(root, athlete, name[:7] + "-01"))
+    return summaries
+
+
+def _rollups_path(root, athlete, month):
+    """Return the rollup file of one month (given by its first day)."""
+    return os.path.join(athlete_dir(root, athlete), ROLLUPS_DIR, month[:7] + ".json")
+
+
+def _read_rollups(root, athlete, month):
+    """Return the saved rollups of one month's days (empty if it has none)."""
+    try:
+        with open(_rollups_path(root, athlete, month), "r") as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return rollups.new_rollups()
+
+
+def _build_rollups(root, athlete):
+    """
+    Add up every meal of an athlete into the month files (used once, when
+    they are missing; the caller holds the meals lock).
+    """
+    folder = athlete_dir(root, athlete)
+    months = {}
+    for day in list_days(root, athlete):
+        summaries = months.setdefault(rollups.month_start(day), rollups.new_rollups())
+        for entry in read_day(root, athlete, day):
+            rollups.add_meal(summaries, entry)
+
+    # Written aside and renamed, so the folder is either complete or missing
+    building = os.path.join(folder, ROLLUPS_DIR + ".tmp")
+    shutil.rmtree(building, ignore_errors=True)
+    os.makedirs(building)
+    for month in months:
+        with open(os.path.join(building, month[:7] + ".json"), "w") as file:
+            json.dump(months[month], file, separators=(",", ":"))
+    os.replace(building, os.path.join(folder, ROLLUPS_DIR))
+    # The single rollups.json of older versions
+    if os.path.exists(os.path.join(folder, "rollups.json")):
+        os.remove(os.path.join(folder, "rollups.json"))
+
+
+def _save_rollups(root, athlete, month, summaries):
+    """Replace one month's rollup file (the caller holds the meals lock)."""
+    path = _rollups_path(root, athlete, month)
+    if len(summaries["day"]) == 0:
+        # The month's last day was cleared
+        if os.path.exists(path):
+            os.remove(path)
+        return
+    temp_path = path + ".tmp"
+    with open(temp_path, "w") as file:
+        json.dump(summaries, file, separators=(",", ":"))
+    os.replace(temp_path, path)
+
+
+# ==========================================
+# Goals and Shared Foods
+# ==========================================
+def load_goals(root, athlete, default):
+    """Return an athlete's goals, or a copy of default if none are saved."""
+    path = os.path.join(athlete_dir(root, athlete), "goals.json")
+    try:
+        with open(path, "r") as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return dict(default)
+
+
+def save_goals(root, athlete, goals):
+    """Replace an athlete's goals file."""
+    folder = athlete_dir(root, athlete)
+    os.makedirs(folder, exist_ok=True)
+    path = os.path.join(folder, "goals.json")
+    with file_lock.locked(path):
+        temp_path = path + ".tmp"
+        with open(temp_path, "w") as file:
+            json.dump(goals, file)
+        os.replace(temp_path, path)
+
+
+def load_foods(root, default):
+    """Return the shared food catalog, or a copy of default if there is none."""
+    path = os.path.join(root, "foods.jsonl")
+    if not os.path.exists(path):
+        return list(default)
+    foods = []
+    with open(path, "r") as file:
+        for line in file:
+            if not line.endswith("\n"):
+                break
+            try:
+                foods.append(json.loads(line))
+            except ValueError:
+                continue
+    return foods
+
+
+def append_food(root, food, default):
+    """Add a food to the shared catalog (seeding it with default the first time)."""
+    append_foods(root, [food], default)
+
+
+def append_foods(root, foods, default):
+    """Add foods to the shared catalog in one write (seeding it with default the first time)."""
+    path = os.path.join(root, "foods.jsonl")
+    os.makedirs(root, exist_ok=True)
+    with file_lock.locked(path):
+        # Seed the catalog only once, even if several processes add a food at once
+        lines = []
+        if not os.path.exists(path):
+            for seed in default:
+                lines.append(json.dumps(seed) + "\n")
+        for food in foods:
+            lines.append(json.dumps(food) + "\n")
+        with open(path, "a") as file:
+            file.write("".join(lines))
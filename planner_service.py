@@ -0,0 +1,274 @@
+"""
+==============================================================================
+Athletic Nutrition Planner
+Planner Service
+
+Description:
+    The food, meal log, goal and report operations of final.py without
+    any input() or print(), for programs that serve many athletes at
+    once (see api_server.py).
+
+    A store keeps the shared food catalog and every athlete's data in
+    memory. Athletes are loaded from the team storage (partitions.py, or
+    the SQLite database when final.STORAGE is "sqlite") the first time
+    they are used, and every change is written back to it, exactly like
+    final.py in team mode.
+
+    Bad input raises ValueError with a message that can be shown to the
+    user; a change that cannot be written raises OSError (sqlite3.Error
+    with SQLite storage).
+
+Changes:
+    Each write is a change record, like the records in final.py's
+    journal, with an extra "athlete" key (None for food changes). It is
+    made in four steps so a server can decide where each step runs:
+
+        record = meal_change(store, "jane", "Eggs", 150)   # validate input
+        check_change(store, record)                        # against the store
+        persist_change(store, record)                      # write files
+        apply_change(store, record)                        # update memory
+
+    The last three run one change at a time (per athlete, and for the
+    foods), so a check still holds when the change is applied. Memory is
+    only changed once the change is saved, so a change that cannot be
+    written leaves no trace.
+
+    log_meal, add_food, set_goals and reset_log do all three.
+
+Store layout (a plain dictionary, like `data` in final.py):
+    {
+        "foods":    shared food list (also data["foods"] of every athlete),
+        "by_name":  {final.food_key(name): food}, first copy of each name,
+        "athletes": {directory name: athlete data from final.load_data},
+        "loaded":   {directory name: day the athlete was loaded}
+    }
+==============================================================================
+"""
+
+import datetime
+import math
+
+import aggregates
+import final
+import food_search
+import meal_optimizer
+import metrics
+import partitions
+import rollups
+import sqlite_store
+
+
+# ==========================================
+# Store
+# ==========================================
+def open_store(team_dir=None):
+    """Load the shared food catalog (team_dir replaces final.TEAM_DIR)."""
+    if team_dir is not None:
+        final.TEAM_DIR = team_dir
+    store = {"foods": [], "by_name": {}, "athletes": {}, "loaded": {}}
+    if final.STORAGE == "sqlite":
+        foods = sqlite_store.load_foods(final.get_db(), final.DEFAULT_FOODS)
+    else:
+        foods = partitions.load_foods(final.TEAM_DIR, final.DEFAULT_FOODS)
+    for food in foods:
+        _add_to_catalog(store, food)
+    return store
+
+
+def _add_to_catalog(store, food):
+    # Older catalogs may repeat a name: only its first copy is used
+    key = final.food_key(food["name"])
+    if key not in store["by_name"]:
+        store["foods"].append(food)
+        store["by_name"][key] = food
+
+
+def athlete_key(athlete):
+    """Return the directory name of an athlete (ValueError if the name is unusable)."""
+    return partitions.safe_name(str(athlete))
+
+
+def athlete_data(store, athlete):
+    """Return an athlete's data, loading it on first use."""
+    key = athlete_key(athlete)
+    data = store["athletes"].get(key)
+    if data is None:
+        data = final.load_data(key)
+        data["foods"] = store["foods"]
+        store["loaded"][key] = aggregates.today()
+        store["athletes"][key] = data
+    return data
+
+
+def _check_day(day):
+    """Return day as YYYY-MM-DD (today if None), raising ValueError if invalid."""
+    if day is None:
+        return aggregates.today()
+    try:
+        return datetime.date.fromisoformat(str(day)).isoformat()
+    except ValueError:
+        raise ValueError("Date must be YYYY-MM-DD.")
+
+
+def _number(value, label):
+    # bool passes float() (true would be 1), and NaN passes every comparison
+    if isinstance(value, bool):
+        raise ValueError(label + " must be a number.")
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        raise ValueError(label + " must be a number.")
+    if not math.isfinite(number):
+        raise ValueError(label + " must be a number.")
+    return number
+
+
+# ==========================================
+# Reads
+# ==========================================
+def find_foods(store, query="", limit=10):
+    """Return up to limit foods whose names match query (all foods in order if empty)."""
+    if query.strip() == "":
+        return store["foods"][:limit]
+    index = final.get_search_index({"foods": store["foods"]})
+    return [store["foods"][i] for i in food_search.search(index, query, limit)]
+
+
+def get_goals(store, athlete):
+    """Return an athlete's goals."""
+    return dict(athlete_data(store, athlete)["goals"])
+
+
+@metrics.timed("planner_service.get_report")
+def get_report(store, athlete, day=None):
+    """Return an athlete's report for a day (see final.build_report)."""
+    data = athlete_data(store, athlete)
+    day = _check_day(day)
+    if day >= store["loaded"][athlete_key(athlete)]:
+        return final.build_report(data, day)
+
+    # Days before the athlete was loaded are only on disk
+    if final.STORAGE == "sqlite":
+        log = sqlite_store.load_day(final.get_db(), athlete_key(athlete), day)
+    else:
+        log = partitions.read_day(final.TEAM_DIR, athlete_key(athlete), day)
+    return final.build_report({"log": log, "totals": aggregates.build_day_totals(log),
+                               "goals": data["goals"]}, day)
+
+
+@metrics.timed("planner_service.get_trends")
+def get_trends(store, athlete, day=None):
+    """Return an athlete's rolling averages, adherence and weekly trend (see rollups.trend_report)."""
+    data = athlete_data(store, athlete)
+    return rollups.trend_report(final.get_rollups(data), data["goals"], _check_day(day))
+
+
+@metrics.timed("planner_service.get_plan")
+def get_plan(store, athlete, max_items=meal_optimizer.MAX_ITEMS,
+             max_grams=meal_optimizer.MAX_GRAMS, exclude=()):
+    """Return a plan for the rest of an athlete's day (see meal_optimizer.plan_meals)."""
+    max_items = _number(max_items, "Items")
+    max_grams = _number(max_grams, "Max grams")
+    if max_items <= 0 or max_items != int(max_items) or max_grams <= 0:
+        raise ValueError("Items must be a whole number and both values greater than 0.")
+    data = athlete_data(store, athlete)
+    totals = aggregates.day_totals(data["totals"], aggregates.today())
+    table = final.get_plan_table({"foods": store["foods"]})
+    return meal_optimizer.plan_meals(table, data["goals"], totals, int(max_items), max_grams, exclude)
+
+
+# ==========================================
+# Changes
+# ==========================================
+def food_change(store, name, protein, carbs, fat):
+    """Return the change that adds a food to the shared catalog (check_change refuses a name already there)."""
+    food = final.make_food(str(name), _number(protein, "Protein"),
+                           _number(carbs, "Carbs"), _number(fat, "Fat"))
+    return {"op": "add_food", "athlete": None, "food": food}
+
+
+def meal_change(store, athlete, food_name, portion, day=None):
+    """Return the change that logs a portion (grams) of a food by name (any case)."""
+    food = store["by_name"].get(final.food_key(str(food_name)))
+    if food is None:
+        raise ValueError("Unknown food: " + str(food_name))
+    portion = _number(portion, "Portion")
+    if portion <= 0:
+        raise ValueError("Portion must be greater than 0.")
+    entry = final.make_entry(food, portion, _check_day(day))
+    athlete_data(store, athlete)
+    return {"op": "log_meal", "athlete": athlete_key(athlete), "entry": entry}
+
+
+def goals_change(store, athlete, mode, calories):
+    """Return the change that sets an athlete's goals from a mode and calorie target."""
+    goals = final.make_goals(str(mode).lower(), _number(calories, "Calories"))
+    athlete_data(store, athlete)
+    return {"op": "set_goals", "athlete": athlete_key(athlete), "goals": goals}
+
+
+def reset_change(store, athlete, day=None):
+    """Return the change that clears one day of an athlete's meals."""
+    athlete_data(store, athlete)
+    return {"op": "reset_log", "athlete": athlete_key(athlete), "date": _check_day(day)}
+
+
+def check_change(store, record):
+    """Raise ValueError if a change conflicts with the store (a food name already in the catalog)."""
+    if record["op"] == "add_food":
+        existing = store["by_name"].get(final.food_key(record["food"]["name"]))
+        if existing is not None:
+            raise ValueError(existing["name"] + " is already in the catalog.")
+
+
+def apply_change(store, record):
+    """Apply a change that persist_change has saved to the data in memory."""
+    if record["op"] == "add_food":
+        _add_to_catalog(store, record["food"])
+        return
+    final.apply_change(store["athletes"][record["athlete"]], record)
+
+
+@metrics.timed("planner_service.persist_change")
+def persist_change(store, record):
+    """Give a change its seq and write it to the team storage (raises OSError)."""
+    if record["athlete"] is not None:
+        record["seq"] = store["athletes"][record["athlete"]]["seq"] + 1
+    if record["op"] == "add_food" and final.STORAGE == "sqlite":
+        sqlite_store.add_foods(final.get_db(), [record["food"]])
+        return
+    if record["op"] == "add_food":
+        partitions.append_food(final.TEAM_DIR, record["food"], final.DEFAULT_FOODS)
+        return
+    final.persist_change(store["athletes"][record["athlete"]], record)
+
+
+def commit(store, record):
+    """Check a change, write it, then apply it."""
+    check_change(store, record)
+    persist_change(store, record)
+    apply_change(store, record)
+    return record
+
+
+# ==========================================
+# Operations
+# ==========================================
+def add_food(store, name, protein, carbs, fat):
+    """Add a food to the shared catalog and return it."""
+    return commit(store, food_change(store, name, protein, carbs, fat))["food"]
+
+
+def log_meal(store, athlete, food_name, portion, day=None):
+    """Log a meal for an athlete and return its log entry."""
+    return commit(store, meal_change(store, athlete, food_name, portion, day))["entry"]
+
+
+def set_goals(store, athlete, mode, calories):
+    """Set an athlete's goals and return them."""
+    return commit(store, goals_change(store, athlete, mode, calories))["goals"]
+
+
+def reset_log(store, athlete, day=None):
+    """Clear one day (default today) of an athlete's meals."""
+    commit(store, reset_change(store, athlete, day))
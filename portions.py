@@ -0,0 +1,149 @@
+"""
+==============================================================================
+Athletic Nutrition Planner
+Portion Nutrition
+
+Description:
+    Turns a food's macros per 100g into the calories and macros of a
+    portion (calories from 4/4/9 calories per gram of protein, carbs and
+    fat), for both programs and the meal optimizer.
+
+    Results are cached (least recently used) by the food's per-100g values
+    and the portion, so logging the same food and portion again is a
+    single dictionary lookup, and a food whose values change can never
+    get a stale result: its new values are a new key.
+
+    recompute() and entry_columns() work out many portions at once (NumPy
+    when installed, plain loops otherwise), which final.correct_food uses
+    to re-derive every logged meal of a corrected food in one pass and
+    food_refs.py to rebuild a whole meal log from food references.
+
+    Each function keeps the exact arithmetic its program has always used,
+    so cached and recomputed values are identical, to the last digit, to
+    the values already in the logs.
+
+Results are tuples in aggregates.MACROS order:
+    (calories, protein, carbs, fat)
+==============================================================================
+"""
+
+import functools
+import math
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Cached (food, portion) results of each kind
+PORTION_CACHE = 4096
+
+
+# ==========================================
+# Per-Gram Vectors
+# ==========================================
+def vector(protein, carbs, fat):
+    """Return the per-gram (calories, protein, carbs, fat) of per-100g macros (meal_optimizer.py)."""
+    protein = float(protein) / 100
+    carbs = float(carbs) / 100
+    fat = float(fat) / 100
+    return (protein * 4 + carbs * 4 + fat * 9, protein, carbs, fat)
+
+
+# ==========================================
+# Portions
+# ==========================================
+@functools.lru_cache(maxsize=PORTION_CACHE)
+def portion(protein, carbs, fat, grams):
+    """Return the unrounded nutrition of grams of a food (nutrition_planner.py)."""
+    protein = (protein * grams) / 100
+    carbs = (carbs * grams) / 100
+    fat = (fat * grams) / 100
+    return ((protein * 4) + (carbs * 4) + (fat * 9), protein, carbs, fat)
+
+
+@functools.lru_cache(maxsize=PORTION_CACHE)
+def entry_values(protein, carbs, fat, grams):
+    """Return the nutrition of grams of a food rounded for a final.py log entry."""
+    ratio = grams / 100
+    protein = protein * ratio
+    carbs = carbs * ratio
+    fat = fat * ratio
+    calories = (protein * 4) + (carbs * 4) + (fat * 9)
+    return (round(calories), round(protein, 1), round(carbs, 1), round(fat, 1))
+
+
+def check_grams(value):
+    """
+    Return a portion as grams (a float), raising ValueError unless it is
+    a finite number above 0. Text such as "150" (a CSV field) counts as a
+    number; True and False do not, although float() takes them.
+    """
+    if isinstance(value, bool):
+        raise ValueError("portion must be a number")
+    try:
+        grams = float(value)
+    except (TypeError, ValueError):
+        raise ValueError("portion must be a number")
+    if not math.isfinite(grams):
+        raise ValueError("portion must be a number")
+    if grams <= 0:
+        raise ValueError("portion must be greater than 0")
+    return grams
+
+
+def food_entry_values(food, grams):
+    """entry_values for a final.py food."""
+    return entry_values(food["protein"], food["carbs"], food["fat"], grams)
+
+
+def recompute(food, grams):
+    """
+    Return food_entry_values for many portions of one food at once, as
+    four lists (calories, protein, carbs, fat) in the order of grams.
+    """
+    count = len(grams)
+    return entry_columns([food["protein"]] * count, [food["carbs"]] * count,
+                         [food["fat"]] * count, grams)
+
+
+def entry_columns(protein, carbs, fat, grams):
+    """
+    Return entry_values for many (food, portion) pairs at once, as four
+    lists (calories, protein, carbs, fat); protein, carbs and fat are the
+    per-100g values of each pair's food.
+    """
+    if numpy is None:
+        columns = ([], [], [], [])
+        for values in map(entry_values, protein, carbs, fat, grams):
+            for column, value in zip(columns, values):
+                column.append(value)
+        return columns
+
+    ratio = numpy.asarray(grams, dtype="d") / 100
+    protein = numpy.asarray(protein, dtype="d") * ratio
+    carbs = numpy.asarray(carbs, dtype="d") * ratio
+    fat = numpy.asarray(fat, dtype="d") * ratio
+    calories = (protein * 4) + (carbs * 4) + (fat * 9)
+    # rint rounds half to even like Python's round, so whole numbers match exactly
+    return (numpy.rint(calories).astype("q").tolist(), _round_tenths(protein),
+            _round_tenths(carbs), _round_tenths(fat))
+
+
+def _round_tenths(values):
+    """Return [round(value, 1) for value in values] for a NumPy array, with NumPy doing most of it."""
+    scaled = values * 10
+    result = (numpy.rint(scaled) / 10).tolist()
+    # values * 10 is not exact, which only matters right next to a tie
+    # (x.x5): Python's round decides those from the exact value
+    near = numpy.abs(scaled - numpy.floor(scaled) - 0.5) < 1e-6
+    near |= numpy.abs(scaled) >= 1e9
+    for i in numpy.flatnonzero(near).tolist():
+        result[i] = round(float(values[i]), 1)
+    return result
+
+
+def clear_caches():
+    """Forget every cached portion."""
+    portion.cache_clear()
+    entry_values.cache_clear()
@@ -0,0 +1,170 @@
+"""
+==============================================================================
+Athletic Nutrition Planner
+Compact Records
+
+Description:
+    Small record classes for foods, meal log entries and goals, used by
+    final.py instead of dictionaries when LOG_BACKEND = "records".
+
+    A dictionary keeps a hash table of its keys in every entry; a record
+    with __slots__ keeps only one pointer per field. The food names and
+    dates of meal entries are interned, so every meal of the same food
+    (or day) shares one string. Measured with benchmarks/record_memory.py
+    (64-bit CPython 3.11, entries parsed from JSON):
+
+        meal entry   dictionary ~520 bytes   MealEntry ~230 bytes   ColumnarLog ~45 bytes
+        food         dictionary ~320 bytes   Food      ~200 bytes
+        goals        dictionary ~280 bytes   Goals     ~110 bytes
+
+    Records can be read like the dictionaries they replace
+    (entry["calories"], entry.get("date"), dict(entry)), so code that
+    only reads entries works with either. Dictionaries are converted to
+    records where they come in (RecordList, from_dict) and records back
+    to dictionaries where they go out (to_dict, to_json for json.dump).
+==============================================================================
+"""
+
+import sys
+
+
+# ==========================================
+# Records
+# ==========================================
+class Record:
+    """Base class: fixed fields in __slots__, read like a dictionary."""
+
+    __slots__ = ()
+    FIELDS = ()
+
+    @classmethod
+    def from_dict(cls, values):
+        """Build a record from a dictionary (a record is returned as it is)."""
+        if isinstance(values, cls):
+            return values
+        return cls(*[values[name] for name in cls.FIELDS])
+
+    def to_dict(self):
+        """Return the record as a plain dictionary."""
+        return {name: getattr(self, name) for name in self.FIELDS}
+
+    # Dictionary-style reading
+    def __getitem__(self, key):
+        try:
+            return getattr(self, key)
+        except (AttributeError, TypeError):
+            raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        if key not in self.FIELDS:
+            raise KeyError(key)
+        setattr(self, key, value)
+
+    def get(self, key, default=None):
+        return getattr(self, key, default) if key in self.FIELDS else default
+
+    def keys(self):
+        return self.FIELDS
+
+    def __contains__(self, key):
+        return key in self.FIELDS
+
+    def __iter__(self):
+        return iter(self.FIELDS)
+
+    def __len__(self):
+        return len(self.FIELDS)
+
+    def __eq__(self, other):
+        if isinstance(other, (Record, dict)):
+            return self.to_dict() == dict(other)
+        return NotImplemented
+
+    def __repr__(self):
+        return type(self).__name__ + "(" + ", ".join(repr(getattr(self, name)) for name in self.FIELDS) + ")"
+
+    def __reduce__(self):
+        return (type(self), tuple(getattr(self, name) for name in self.FIELDS))
+
+
+class Food(Record):
+    """A food with protein, carbs and fat per 100g."""
+
+    __slots__ = FIELDS = ("name", "protein", "carbs", "fat")
+
+    def __init__(self, name, protein, carbs, fat):
+        # Not interned: catalog names are unique, so interning would only add to Python's table
+        self.name = str(name)
+        self.protein = protein
+        self.carbs = carbs
+        self.fat = fat
+
+
+class MealEntry(Record):
+    """One meal log entry (see final.make_entry)."""
+
+    __slots__ = FIELDS = ("name", "portion", "calories", "protein", "carbs", "fat", "date")
+
+    def __init__(self, name, portion, calories, protein, carbs, fat, date):
+        self.name = sys.intern(str(name))
+        self.portion = portion
+        self.calories = calories
+        self.protein = protein
+        self.carbs = carbs
+        self.fat = fat
+        self.date = sys.intern(str(date))
+
+
+class Goals(Record):
+    """Daily goals: calories, grams of each macro and the fitness mode."""
+
+    __slots__ = FIELDS = ("calories", "protein", "carbs", "fat", "mode")
+
+    def __init__(self, calories, protein, carbs, fat, mode):
+        self.calories = calories
+        self.protein = protein
+        self.carbs = carbs
+        self.fat = fat
+        self.mode = sys.intern(str(mode))
+
+
+# ==========================================
+# Lists of Records
+# ==========================================
+class RecordList(list):
+    """A list of records that turns dictionaries into records as they are added."""
+
+    def __init__(self, record_class, items=()):
+        list.__init__(self)
+        self.record_class = record_class
+        self.extend(items)
+
+    def append(self, item):
+        list.append(self, self.record_class.from_dict(item))
+
+    def extend(self, items):
+        list.extend(self, [self.record_class.from_dict(item) for item in items])
+
+    def insert(self, index, item):
+        list.insert(self, index, self.record_class.from_dict(item))
+
+    def __setitem__(self, index, value):
+        if isinstance(index, slice):
+            value = [self.record_class.from_dict(item) for item in value]
+        else:
+            value = self.record_class.from_dict(value)
+        list.__setitem__(self, index, value)
+
+    def to_list(self):
+        """Return the records as a list of dictionaries."""
+        return [item.to_dict() for item in self]
+
+    def __reduce__(self):
+        return (RecordList, (self.record_class, list(self)))
+
+
+def to_json(value):
+    """json.dump default= hook that writes records as dictionaries."""
+    if isinstance(value, Record):
+        return value.to_dict()
+    raise TypeError("Object of type " + type(value).__name__ + " is not JSON serializable")
@@ -0,0 +1,314 @@
+"""
+==============================================================================
+Athletic Nutrition Planner
+Multi-Day Rollups and Trends
+
+Description:
+    Keeps daily, weekly and monthly summaries of an athlete's meals up to
+    date as meals are logged or days are cleared, so multi-day reports
+    (7/28/90-day averages, adherence, weekly trends, top foods) read a
+    handful of summaries instead of every meal in the history.
+
+    A range of days is answered with the fewest summaries that cover it:
+    whole months, then whole weeks (Monday to Sunday), then single days
+    for the ragged ends. A 90-day window reads about a dozen summaries
+    for its totals and food ranking; adherence looks at each day summary
+    in the window (one per logged day, never the meals themselves).
+
+    final.py keeps the rollups in data["rollups"] (JSON storage), the
+    team storage in one file per month in <athlete>/rollups/ (see
+    partitions.py) and the SQLite storage in its rollups table (see
+    sqlite_store.py).
+
+Rollups layout (a plain dictionary, saved as JSON):
+    {
+        "day":   {"YYYY-MM-DD": summary},   # keyed by the day
+        "week":  {"YYYY-MM-DD": summary},   # keyed by the week's Monday
+        "month": {"YYYY-MM-DD": summary}    # keyed by the 1st of the month
+    }
+    summary = {"totals": totals record (see aggregates.py),
+               "foods":  {food name: totals record}}
+==============================================================================
+"""
+
+import datetime
+
+import aggregates
+import metrics
+
+PERIODS = ("day", "week", "month")
+
+# Report windows in days, and the number of weeks in a trend line
+WINDOWS = (7, 28, 90)
+TREND_WEEKS = 12
+
+# A logged day meets a goal when it is within this share of it
+TOLERANCE = 0.10
+
+# Foods listed in each window's ranking
+TOP_FOODS = 5
+
+
+# ==========================================
+# Period Keys
+# ==========================================
+def _date(day):
+    return datetime.date.fromisoformat(day)
+
+
+def week_start(day):
+    """Return the Monday (YYYY-MM-DD) of the week a day falls in."""
+    date = _date(day)
+    return (date - datetime.timedelta(days=date.weekday())).isoformat()
+
+
+def month_start(day):
+    """Return the first day (YYYY-MM-DD) of the month a day falls in."""
+    return day[:8] + "01"
+
+
+def period_keys(day):
+    """Return (period, key) for the day, week and month summaries a day belongs to."""
+    return (("day", day), ("week", week_start(day)), ("month", month_start(day)))
+
+
+# ==========================================
+# Keeping the Rollups Up to Date
+# ==========================================
+def new_rollups():
+    """Return empty rollups."""
+    return {"day": {}, "week": {}, "month": {}}
+
+
+def new_summary():
+    """Return an empty summary."""
+    return {"totals": aggregates.new_totals(), "foods": {}}
+
+
+def add_meal(rollups, meal):
+    """Add one meal (a final.py log entry) to its day, week and month."""
+    for period, key in period_keys(meal["date"]):
+        summary = rollups[period].get(key)
+        if summary is None:
+            summary = rollups[period][key] = new_summary()
+        aggregates.add_meal(summary["totals"], meal)
+        if meal["name"] not in summary["foods"]:
+            summary["foods"][meal["name"]] = aggregates.new_totals()
+        aggregates.add_meal(summary["foods"][meal["name"]], meal)
+
+
+def remove_meal(rollups, meal):
+    """Take one meal back out of its day, week and month (used when a meal is re-derived)."""
+    for period, key in period_keys(meal["date"]):
+        summary = rollups[period].get(key)
+        if summary is None:
+            continue
+        _remove(summary["totals"], meal)
+        food = summary["foods"].get(meal["name"])
+        if food is not None:
+            _remove(food, meal)
+            if food["meals"] <= 0:
+                del summary["foods"][meal["name"]]
+        if summary["totals"]["meals"] <= 0:
+            del rollups[period][key]
+
+
+def _remove(totals, meal):
+    for key in aggregates.MACROS:
+        totals[key] = totals[key] - meal[key]
+    totals["meals"] = totals["meals"] - 1
+
+
+def clear_day(rollups, day):
+    """Take one day's meals out of the rollups (nothing happens if it has none)."""
+    summary = rollups["day"].pop(day, None)
+    if summary is None:
+        return
+    for period, key in period_keys(day)[1:]:
+        parent = rollups[period].get(key)
+        if parent is None:
+            continue
+        _subtract(parent["totals"], summary["totals"])
+        for name in summary["foods"]:
+            if name in parent["foods"]:
+                _subtract(parent["foods"][name], summary["foods"][name])
+                if parent["foods"][name]["meals"] <= 0:
+                    del parent["foods"][name]
+        if parent["totals"]["meals"] <= 0:
+            del rollups[period][key]
+
+
+def _subtract(totals, other):
+    for key in aggregates.MACROS + ("meals",):
+        totals[key] = totals[key] - other[key]
+
+
+def apply_change(rollups, record):
+    """Apply a final.py change record (only meal changes affect the rollups)."""
+    op = record["op"]
+    if op == "log_meal":
+        add_meal(rollups, record["entry"])
+    elif op == "log_meals":
+        for entry in record["entries"]:
+            add_meal(rollups, entry)
+    elif op == "reset_log" and "date" in record:
+        clear_day(rollups, record["date"])
+    elif op == "reset_log":
+        for period in PERIODS:
+            rollups[period].clear()
+
+
+def build_rollups(meals):
+    """Build rollups from a whole meal history (used once for older data)."""
+    rollups = new_rollups()
+    for meal in meals:
+        add_meal(rollups, meal)
+    return rollups
+
+
+def merge_rollups(rollups, other):
+    """Add the rollups of other days into rollups (the team storage keeps one part per month)."""
+    for period in PERIODS:
+        for key in other[period]:
+            if key in rollups[period]:
+                _add_summary(rollups[period][key], other[period][key])
+            else:
+                rollups[period][key] = other[period][key]
+
+
+# ==========================================
+# Range Queries
+# ==========================================
+def _add_summary(summary, other):
+    for key in aggregates.MACROS + ("meals",):
+        summary["totals"][key] += other["totals"][key]
+    for name in other["foods"]:
+        if name not in summary["foods"]:
+            summary["foods"][name] = aggregates.new_totals()
+        for key in aggregates.MACROS + ("meals",):
+            summary["foods"][name][key] += other["foods"][name][key]
+
+
+def range_summary(rollups, start, end):
+    """Return the combined summary of the days from start to end (inclusive)."""
+    summary = new_summary()
+    day = _date(start)
+    last = _date(end)
+    while day <= last:
+        # Use the biggest period that starts here and ends inside the range
+        next_month = (day.replace(day=28) + datetime.timedelta(days=4)).replace(day=1)
+        if day.day == 1 and next_month - datetime.timedelta(days=1) <= last:
+            period, step = "month", next_month - day
+        elif day.weekday() == 0 and day + datetime.timedelta(days=6) <= last:
+            period, step = "week", datetime.timedelta(days=7)
+        else:
+            period, step = "day", datetime.timedelta(days=1)
+        part = rollups[period].get(day.isoformat())
+        if part is not None:
+            _add_summary(summary, part)
+        day = day + step
+    return summary
+
+
+def logged_days(rollups, start, end):
+    """Return the day summaries (oldest first) of the days from start to end that have meals."""
+    days = []
+    day = _date(start)
+    last = _date(end)
+    while day <= last:
+        summary = rollups["day"].get(day.isoformat())
+        if summary is not None and summary["totals"]["meals"] > 0:
+            days.append(summary)
+        day = day + datetime.timedelta(days=1)
+    return days
+
+
+def food_ranking(summary, key="calories", limit=TOP_FOODS):
+    """Return the foods of a summary that contributed most of key, with their share."""
+    total = summary["totals"][key]
+    ranking = []
+    for name in summary["foods"]:
+        food = summary["foods"][name]
+        share = 0.0
+        if total > 0:
+            share = round(food[key] / total * 100, 1)
+        ranking.append({"name": name, key: round(food[key], 1), "meals": food["meals"], "share": share})
+    ranking.sort(key=lambda item: item[key], reverse=True)
+    return ranking[:limit]
+
+
+def _average(totals, days):
+    average = {"calories": round(totals["calories"] / days) if days > 0 else 0}
+    for key in aggregates.MACROS[1:]:
+        average[key] = round(totals[key] / days, 1) if days > 0 else 0
+    return average
+
+
+def adherence(days, goals, tolerance=TOLERANCE):
+    """Return the percentage of the given day summaries within tolerance of each goal."""
+    result = {}
+    for key in aggregates.MACROS:
+        hits = 0
+        for summary in days:
+            if goals[key] > 0 and abs(summary["totals"][key] - goals[key]) <= goals[key] * tolerance:
+                hits = hits + 1
+        result[key] = round(hits / len(days) * 100) if len(days) > 0 else 0
+    return result
+
+
+def window_report(rollups, goals, end, days):
+    """Return averages per logged day, adherence and top foods for the days up to end."""
+    start = (_date(end) - datetime.timedelta(days=days - 1)).isoformat()
+    summary = range_summary(rollups, start, end)
+    logged = logged_days(rollups, start, end)
+    return {
+        "days": days,
+        "start": start,
+        "end": end,
+        "logged_days": len(logged),
+        "average": _average(summary["totals"], len(logged)),
+        "adherence": adherence(logged, goals),
+        "top_foods": food_ranking(summary)
+    }
+
+
+def weekly_trend(rollups, end, weeks=TREND_WEEKS):
+    """
+    Return the average per logged day of each of the last weeks up to end,
+    and the trend (change per week, least squares) of each macro.
+    """
+    points = []
+    monday = _date(week_start(end))
+    for i in range(weeks - 1, -1, -1):
+        start = monday - datetime.timedelta(days=7 * i)
+        summary = rollups["week"].get(start.isoformat(), new_summary())
+        count = len(logged_days(rollups, start.isoformat(),
+                                (start + datetime.timedelta(days=6)).isoformat()))
+        points.append({"week": start.isoformat(), "logged_days": count,
+                       "average": _average(summary["totals"], count)})
+
+    # Fit a line through the weeks that have meals
+    used = [(i, point) for i, point in enumerate(points) if point["logged_days"] > 0]
+    slope = {}
+    for key in aggregates.MACROS:
+        slope[key] = 0.0
+        if len(used) < 2:
+            continue
+        mean_x = sum(i for i, _ in used) / len(used)
+        mean_y = sum(point["average"][key] for _, point in used) / len(used)
+        spread = sum((i - mean_x) ** 2 for i, _ in used)
+        slope[key] = round(sum((i - mean_x) * (point["average"][key] - mean_y)
+                               for i, point in used) / spread, 1)
+    return {"weeks": points, "per_week": slope}
+
+
+@metrics.timed("rollups.trend_report")
+def trend_report(rollups, goals, end=None):
+    """Return the rolling windows (WINDOWS) and the weekly trend up to end (default today)."""
+    if end is None:
+        end = aggregates.today()
+    return {
+        "date": end,
+        "windows": [window_report(rollups, goals, end, days) for days in WINDOWS],
+        "trend": weekly_trend(rollups, end)
+    }
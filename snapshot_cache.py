@@ -0,0 +1,164 @@
+"""
+==============================================================================
+Athletic Nutrition Planner
+Snapshot Cache
+
+Description:
+    A binary (pickle) copy of nutrition_data.json that makes start-up
+    fast. The cache is stamped with the modification time and size of
+    the JSON file it was made from, and is ignored as soon as the JSON
+    file changes.
+
+    Each big section (foods, log) is pickled separately, so on start-up
+    only the small values (goals, daily totals) are read. The foods and
+    the meal history are read from the cache the first time the program
+    uses them (see LazyData).
+
+File layout:
+    pickled sections, one after another
+    pickled header {"version", "mtime_ns", "size", "eager", "sections"}
+    8 bytes: offset of the header
+==============================================================================
+"""
+
+import os
+import pickle
+import struct
+
+# 2: the daily totals moved from the sections to the eager values
+CACHE_VERSION = 2
+FOOTER = struct.Struct("<Q")
+
+
+# ==========================================
+# Lazily Loaded Data
+# ==========================================
+class LazyData(dict):
+    """
+    A data dictionary whose big sections are loaded on first use. file is
+    the open cache the sections are read from; it is closed once the last
+    section is loaded (or the data is replaced, see replace_data).
+    """
+
+    def __init__(self, values, loaders, file=None):
+        dict.__init__(self, values)
+        self.loaders = loaders
+        self.file = file
+
+    def __missing__(self, key):
+        if key not in self.loaders:
+            raise KeyError(key)
+        value = self.loaders.pop(key)()
+        self[key] = value
+        if len(self.loaders) == 0:
+            self.close()
+        return value
+
+    def close(self):
+        """Close the cache file (nothing is left to read from it)."""
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def load_all(self):
+        """Load every section that has not been used yet."""
+        for key in list(self.loaders):
+            self[key]
+
+
+def load_all(data):
+    """Make sure every section of data is loaded (no-op for a plain dict)."""
+    if isinstance(data, LazyData):
+        data.load_all()
+
+
+def replace_data(data, fresh):
+    """Replace everything in data with fresh (unloaded sections stay lazy)."""
+    loaders = getattr(fresh, "loaders", {})
+    dict.clear(data)
+    dict.update(data, fresh)
+    if isinstance(data, LazyData):
+        # The old cache file is no longer needed; fresh's is taken over
+        data.close()
+        data.loaders = dict(loaders)
+        data.file = getattr(fresh, "file", None)
+        if isinstance(fresh, LazyData):
+            fresh.file = None
+            fresh.loaders = {}
+        if len(data.loaders) == 0:
+            data.close()
+    elif len(loaders) > 0:
+        fresh.load_all()
+        dict.update(data, fresh)
+
+
+# ==========================================
+# Reading and Writing the Cache
+# ==========================================
+def _stamp(data_path):
+    """Return (mtime_ns, size) of the JSON file a cache belongs to."""
+    info = os.stat(data_path)
+    return info.st_mtime_ns, info.st_size
+
+
+def write_cache(data_path, cache_path, eager, sections):
+    """
+    Write a cache for data_path.
+
+    eager holds the small values read at start-up; sections maps names
+    to the big values that are only read when first used.
+    """
+    mtime_ns, size = _stamp(data_path)
+    temp_path = cache_path + ".tmp"
+    try:
+        with open(temp_path, "wb") as file:
+            offsets = {}
+            for name in sections:
+                offsets[name] = file.tell()
+                pickle.dump(sections[name], file, protocol=pickle.HIGHEST_PROTOCOL)
+            header_at = file.tell()
+            header = {"version": CACHE_VERSION, "mtime_ns": mtime_ns, "size": size,
+                      "eager": eager, "sections": offsets}
+            pickle.dump(header, file, protocol=pickle.HIGHEST_PROTOCOL)
+            file.write(FOOTER.pack(header_at))
+        os.replace(temp_path, cache_path)
+    except (OSError, pickle.PicklingError, TypeError):
+        # Only a cache: the next start-up just reads the JSON file again
+        pass
+
+
+def open_cache(data_path, cache_path):
+    """
+    Return the cache header for data_path, or None if there is no valid cache.
+
+    The header keeps the cache file open (header["file"]) so sections
+    can still be read if the cache is replaced in the meantime; whoever
+    reads the sections closes it (LazyData does once they are all read).
+    """
+    try:
+        stamp = _stamp(data_path)
+        file = open(cache_path, "rb")
+    except OSError:
+        return None
+
+    try:
+        file.seek(-FOOTER.size, os.SEEK_END)
+        file.seek(FOOTER.unpack(file.read(FOOTER.size))[0])
+        header = pickle.load(file)
+        valid = (header["version"] == CACHE_VERSION
+                 and (header["mtime_ns"], header["size"]) == stamp)
+    except (OSError, EOFError, ValueError, KeyError, TypeError, struct.error, pickle.UnpicklingError):
+        valid = False
+
+    if not valid:
+        file.close()
+        return None
+    header["file"] = file
+    return header
+
+
+def read_section(header, name):
+    """Read one big section from an open cache."""
+    file = header["file"]
+    file.seek(header["sections"][name])
+    return pickle.load(file)
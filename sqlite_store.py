@@ -0,0 +1,578 @@
+"""
+==============================================================================
+Athletic Nutrition Planner
+SQLite Storage
+
+Description:
+    An optional storage backend that keeps foods, meals and goals in an
+    SQLite database instead of JSON / text files. final.py uses it when
+    STORAGE = "sqlite" and nutrition_planner.py when STORAGE = "sqlite".
+
+    Every change is one small transaction (a meal is one INSERT, plus
+    the upserts that keep its day/week/month rollups current), the
+    database runs in WAL mode so readers never block the writer, and
+    daily totals are added up by SQLite with GROUP BY instead of a Python
+    loop over the log. All SQL text is kept in module constants so the
+    sqlite3 statement cache prepares each statement once per connection.
+
+    Connections come from a small pool, so the API server's worker
+    threads (or any other threads) can share one database.
+
+Tables:
+    foods  (id, name, name_key UNIQUE, protein, carbs, fat)   per 100g
+           name_key is food_search.normalize(name), final.food_key
+    meals  (id, athlete, date, food, portion, calories, protein, carbs, fat)
+           indexed by (athlete, date) and by food
+    goals  (athlete PRIMARY KEY, calories, protein, carbs, fat, mode)
+    rollups (athlete, period, start, food, calories, protein, carbs, fat, meals)
+           day/week/month summaries (see rollups.py); food '' is the
+           period's total
+    meta   (key PRIMARY KEY, value)                           e.g. seq, migrated:SOURCE
+
+    athlete is the team-mode athlete name, DEFAULT_ATHLETE for final.py
+    without --athlete.
+
+Migration:
+    python sqlite_store.py [FOLDER]
+    copies nutrition_data.json (+ journal), team_data/ and the
+    nutrition_planner.py files in FOLDER into the SQLite databases.
+    Each source (the final.py data, each team athlete, the planner's log)
+    is copied in one transaction that also records it in meta, so running
+    the migration again is safe: sources already copied are skipped.
+==============================================================================
+"""
+
+import contextlib
+import os
+import queue
+import sqlite3
+import sys
+import threading
+
+import food_search
+import metrics
+import rollups
+
+DEFAULT_ATHLETE = ""
+POOL_SIZE = 4
+
+# meta key set once the rollups table has been filled from the meals
+# (databases made before it existed are filled when first opened)
+ROLLUPS_KEY = "rollups"
+
+# meta key prefix of the sources the migration has copied
+MIGRATED_KEY = "migrated:"
+
+# meta key set once name_key holds food_search.normalize(name) (older
+# databases kept name.lower() and are re-keyed when first opened)
+NAME_KEYS_KEY = "name_keys"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS foods (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    name_key TEXT NOT NULL UNIQUE,
+    protein NUMERIC NOT NULL,
+    carbs NUMERIC NOT NULL,
+    fat NUMERIC NOT NULL
+);
+CREATE TABLE IF NOT EXISTS meals (
+    id INTEGER PRIMARY KEY,
+    athlete TEXT NOT NULL,
+    date TEXT NOT NULL,
+    food TEXT NOT NULL,
+    portion NUMERIC NOT NULL,
+    calories NUMERIC NOT NULL,
+    protein NUMERIC NOT NULL,
+    carbs NUMERIC NOT NULL,
+    fat NUMERIC NOT NULL
+);
+CREATE INDEX IF NOT EXISTS meals_by_athlete_date ON meals (athlete, date);
+CREATE INDEX IF NOT EXISTS meals_by_food ON meals (food);
+CREATE TABLE IF NOT EXISTS goals (
+    athlete TEXT PRIMARY KEY,
+    calories NUMERIC NOT NULL,
+    protein NUMERIC NOT NULL,
+    carbs NUMERIC NOT NULL,
+    fat NUMERIC NOT NULL,
+    mode TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS rollups (
+    athlete TEXT NOT NULL,
+    period TEXT NOT NULL,
+    start TEXT NOT NULL,
+    food TEXT NOT NULL,
+    calories NUMERIC NOT NULL,
+    protein NUMERIC NOT NULL,
+    carbs NUMERIC NOT NULL,
+    fat NUMERIC NOT NULL,
+    meals INTEGER NOT NULL,
+    PRIMARY KEY (athlete, period, start, food)
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+INSERT_FOOD = ("INSERT OR IGNORE INTO foods (name, name_key, protein, carbs, fat) "
+               "VALUES (?, ?, ?, ?, ?)")
+SELECT_FOODS = "SELECT name, protein, carbs, fat FROM foods ORDER BY id"
+SELECT_FOOD = "SELECT protein, carbs, fat FROM foods WHERE name_key = ?"
+COUNT_FOODS = "SELECT COUNT(*) FROM foods"
+SELECT_FOOD_NAMES = "SELECT id, name FROM foods ORDER BY id"
+UPDATE_NAME_KEY = "UPDATE foods SET name_key = ? WHERE id = ?"
+DELETE_FOOD = "DELETE FROM foods WHERE id = ?"
+
+INSERT_MEAL = ("INSERT INTO meals (athlete, date, food, portion, calories, protein, carbs, fat) "
+               "VALUES (?, ?, ?, ?, ?, ?, ?, ?)")
+SELECT_MEALS = ("SELECT food, portion, calories, protein, carbs, fat, date FROM meals "
+                "WHERE athlete = ? AND date >= ? ORDER BY id")
+SELECT_DAY = ("SELECT food, portion, calories, protein, carbs, fat, date FROM meals "
+              "WHERE athlete = ? AND date = ? ORDER BY id")
+DELETE_DAY = "DELETE FROM meals WHERE athlete = ? AND date = ?"
+DELETE_MEALS = "DELETE FROM meals WHERE athlete = ?"
+MOVE_MEALS = "UPDATE meals SET athlete = ? WHERE athlete = ?"
+TOTALS_BY_DAY = ("SELECT date, SUM(calories), SUM(protein), SUM(carbs), SUM(fat), COUNT(*) "
+                 "FROM meals WHERE athlete = ? AND date >= ? GROUP BY date")
+TOTALS = ("SELECT SUM(calories), SUM(protein), SUM(carbs), SUM(fat), COUNT(*) "
+          "FROM meals WHERE athlete = ?")
+
+UPSERT_GOALS = ("INSERT OR REPLACE INTO goals (athlete, calories, protein, carbs, fat, mode) "
+                "VALUES (?, ?, ?, ?, ?, ?)")
+SELECT_GOALS = "SELECT calories, protein, carbs, fat, mode FROM goals WHERE athlete = ?"
+
+SELECT_ALL_MEALS = ("SELECT athlete, food, portion, calories, protein, carbs, fat, date "
+                    "FROM meals ORDER BY athlete, id")
+SELECT_ATHLETE_MEALS = ("SELECT food, portion, calories, protein, carbs, fat, date FROM meals "
+                        "WHERE athlete = ?")
+
+UPSERT_ROLLUP = ("INSERT INTO rollups (athlete, period, start, food, calories, protein, carbs, fat, meals) "
+                 "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                 "ON CONFLICT (athlete, period, start, food) DO UPDATE SET "
+                 "calories = calories + excluded.calories, protein = protein + excluded.protein, "
+                 "carbs = carbs + excluded.carbs, fat = fat + excluded.fat, meals = meals + excluded.meals")
+DELETE_EMPTY_ROLLUPS = "DELETE FROM rollups WHERE athlete = ? AND meals <= 0"
+DELETE_ROLLUPS = "DELETE FROM rollups WHERE athlete = ?"
+DELETE_ALL_ROLLUPS = "DELETE FROM rollups"
+SELECT_ROLLUPS = ("SELECT period, start, food, calories, protein, carbs, fat, meals "
+                  "FROM rollups WHERE athlete = ?")
+
+SELECT_ATHLETES = ("SELECT athlete FROM goals UNION SELECT DISTINCT athlete FROM meals "
+                   "ORDER BY athlete")
+
+SELECT_SEQ = "SELECT value FROM meta WHERE key = ?"
+UPSERT_SEQ = "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)"
+
+
+# ==========================================
+# Connection Pool
+# ==========================================
+class ConnectionPool:
+    """A fixed number of connections to one database, shared between threads."""
+
+    def __init__(self, path, size=POOL_SIZE):
+        self.path = path
+        self.idle = queue.LifoQueue()
+        self.lock = threading.Lock()
+        self.size = size
+        self.opened = 0
+        with self.connection() as conn:
+            conn.executescript(SCHEMA)
+            if conn.execute(SELECT_SEQ, (ROLLUPS_KEY,)).fetchone() is None:
+                _rebuild_rollups(conn)
+            if conn.execute(SELECT_SEQ, (NAME_KEYS_KEY,)).fetchone() is None:
+                _rekey_foods(conn)
+
+    def _open(self):
+        conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False,
+                               cached_statements=256)
+        # WAL: readers keep going while one writer commits
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    @contextlib.contextmanager
+    def connection(self):
+        """Borrow a connection; the with block is one transaction."""
+        conn = None
+        with self.lock:
+            if self.idle.empty() and self.opened < self.size:
+                self.opened += 1
+                conn = self._open()
+        if conn is None:
+            conn = self.idle.get()
+        try:
+            with conn:
+                yield conn
+        finally:
+            self.idle.put(conn)
+
+    def close(self):
+        """Close the idle connections."""
+        while not self.idle.empty():
+            self.idle.get().close()
+            self.opened -= 1
+
+
+def open_db(path):
+    """Open (and create if needed) a database and return its connection pool."""
+    return ConnectionPool(path)
+
+
+# ==========================================
+# Rows and Dictionaries
+# ==========================================
+def _food_row(food):
+    name = str(food["name"])
+    return (name, food_search.normalize(name), food["protein"], food["carbs"], food["fat"])
+
+
+def _meal_row(athlete, entry):
+    return (athlete, entry["date"], entry["name"], entry["portion"], entry["calories"],
+            entry["protein"], entry["carbs"], entry["fat"])
+
+
+def _meals(rows):
+    return [{"name": row[0], "portion": row[1], "calories": row[2], "protein": row[3],
+             "carbs": row[4], "fat": row[5], "date": row[6]} for row in rows]
+
+
+def _totals(row):
+    """Turn (calories, protein, carbs, fat, count) into a totals record."""
+    return {"calories": row[0] or 0, "protein": row[1] or 0, "carbs": row[2] or 0,
+            "fat": row[3] or 0, "meals": row[4]}
+
+
+# ==========================================
+# Foods
+# ==========================================
+def add_foods(pool, foods):
+    """Insert foods; a name that is already stored (see final.food_key) keeps its first copy."""
+    with pool.connection() as conn:
+        conn.executemany(INSERT_FOOD, [_food_row(food) for food in foods])
+
+
+def _rekey_foods(conn):
+    """Give every food the name_key of final.food_key; of names that now match, the first copy stays."""
+    keys = {}
+    for food_id, name in conn.execute(SELECT_FOOD_NAMES).fetchall():
+        key = food_search.normalize(name)
+        if key in keys:
+            conn.execute(DELETE_FOOD, (food_id,))
+        else:
+            keys[key] = food_id
+    # After the repeats are gone no two new keys match, and a new key can
+    # only equal an old key of the same food
+    conn.executemany(UPDATE_NAME_KEY, [(key, food_id) for key, food_id in keys.items()])
+    conn.execute(UPSERT_SEQ, (NAME_KEYS_KEY, 1))
+
+
+def load_foods(pool, default=()):
+    """Return every food (seeding the table with default when it is empty)."""
+    with pool.connection() as conn:
+        if conn.execute(COUNT_FOODS).fetchone()[0] == 0 and len(default) > 0:
+            conn.executemany(INSERT_FOOD, [_food_row(food) for food in default])
+        rows = conn.execute(SELECT_FOODS).fetchall()
+    return [{"name": row[0], "protein": row[1], "carbs": row[2], "fat": row[3]} for row in rows]
+
+
+@metrics.timed("sqlite_store.lookup_food")
+def lookup_food(pool, food_name):
+    """Return (protein, carbs, fat) per 100g for a food name (see final.food_key), or None."""
+    with pool.connection() as conn:
+        row = conn.execute(SELECT_FOOD, (food_search.normalize(food_name),)).fetchone()
+    if row is None:
+        return None
+    return tuple(row)
+
+
+# ==========================================
+# Meals and Totals
+# ==========================================
+def add_meals(pool, athlete, entries):
+    """Insert final.py style log entries for an athlete."""
+    with pool.connection() as conn:
+        _insert_meals(conn, athlete, entries)
+
+
+def _insert_meals(conn, athlete, entries):
+    conn.executemany(INSERT_MEAL, [_meal_row(athlete, entry) for entry in entries])
+    _add_rollups(conn, athlete, entries, 1)
+
+
+def load_meals(pool, athlete, since=""):
+    """Return an athlete's meals on or after since (YYYY-MM-DD, default all), oldest first."""
+    with pool.connection() as conn:
+        return _meals(conn.execute(SELECT_MEALS, (athlete, since)).fetchall())
+
+
+@metrics.timed("sqlite_store.load_day")
+def load_day(pool, athlete, day):
+    """Return an athlete's meals of one day, oldest first."""
+    with pool.connection() as conn:
+        return _meals(conn.execute(SELECT_DAY, (athlete, day)).fetchall())
+
+
+def totals_by_day(pool, athlete, since=""):
+    """Return {date: totals record} for an athlete, added up by SQLite."""
+    with pool.connection() as conn:
+        rows = conn.execute(TOTALS_BY_DAY, (athlete, since)).fetchall()
+    return {row[0]: _totals(row[1:]) for row in rows}
+
+
+def totals(pool, athlete):
+    """Return the totals record of all of an athlete's meals."""
+    with pool.connection() as conn:
+        return _totals(conn.execute(TOTALS, (athlete,)).fetchone())
+
+
+def clear_day(pool, athlete, day):
+    with pool.connection() as conn:
+        _delete_day(conn, athlete, day)
+
+
+def _delete_day(conn, athlete, day):
+    _add_rollups(conn, athlete, _meals(conn.execute(SELECT_DAY, (athlete, day)).fetchall()), -1)
+    conn.execute(DELETE_DAY, (athlete, day))
+
+
+def move_meals(pool, from_athlete, to_athlete):
+    """Give all meals of one athlete key to another (used to archive a log)."""
+    with pool.connection() as conn:
+        moved = _meals(conn.execute(SELECT_ATHLETE_MEALS, (from_athlete,)).fetchall())
+        conn.execute(MOVE_MEALS, (to_athlete, from_athlete))
+        conn.execute(DELETE_ROLLUPS, (from_athlete,))
+        _add_rollups(conn, to_athlete, moved, 1)
+
+
+# ==========================================
+# Rollups
+# ==========================================
+def _add_rollups(conn, athlete, entries, sign):
+    """Add (sign 1) or take away (sign -1) the rollups of some meals."""
+    summaries = rollups.build_rollups(entries)
+    rows = []
+    for period in rollups.PERIODS:
+        for start, summary in summaries[period].items():
+            parts = [("", summary["totals"])] + list(summary["foods"].items())
+            for food, totals in parts:
+                rows.append((athlete, period, start, food, sign * totals["calories"],
+                             sign * totals["protein"], sign * totals["carbs"],
+                             sign * totals["fat"], sign * totals["meals"]))
+    conn.executemany(UPSERT_ROLLUP, rows)
+    if sign < 0:
+        conn.execute(DELETE_EMPTY_ROLLUPS, (athlete,))
+
+
+def _rebuild_rollups(conn):
+    """Fill the rollups table from every stored meal."""
+    conn.execute(DELETE_ALL_ROLLUPS)
+    by_athlete = {}
+    for row in conn.execute(SELECT_ALL_MEALS):
+        by_athlete.setdefault(row[0], []).append(row[1:])
+    for athlete in by_athlete:
+        _add_rollups(conn, athlete, _meals(by_athlete[athlete]), 1)
+    conn.execute(UPSERT_SEQ, (ROLLUPS_KEY, 1))
+
+
+def load_rollups(pool, athlete):
+    """Return an athlete's rollups as a rollups.py dictionary."""
+    summaries = rollups.new_rollups()
+    with pool.connection() as conn:
+        rows = conn.execute(SELECT_ROLLUPS, (athlete,)).fetchall()
+    for period, start, food, calories, protein, carbs, fat, meals in rows:
+        summary = summaries[period].get(start)
+        if summary is None:
+            summary = summaries[period][start] = rollups.new_summary()
+        totals = {"calories": calories, "protein": protein, "carbs": carbs, "fat": fat, "meals": meals}
+        if food == "":
+            summary["totals"] = totals
+        else:
+            summary["foods"][food] = totals
+    return summaries
+
+
+def list_athletes(pool):
+    """Return the keys of the team athletes with stored goals or meals."""
+    with pool.connection() as conn:
+        rows = conn.execute(SELECT_ATHLETES).fetchall()
+    # Leave out final.py's own data and other reserved keys (like "#daily_log")
+    return [row[0] for row in rows if row[0] != DEFAULT_ATHLETE and not row[0].startswith("#")]
+
+
+# ==========================================
+# Goals
+# ==========================================
+def load_goals(pool, athlete, default=None):
+    """Return an athlete's goals, or a copy of default (None if no default)."""
+    with pool.connection() as conn:
+        row = conn.execute(SELECT_GOALS, (athlete,)).fetchone()
+    if row is None:
+        return None if default is None else dict(default)
+    return {"calories": row[0], "protein": row[1], "carbs": row[2], "fat": row[3], "mode": row[4]}
+
+
+def save_goals(pool, athlete, goals):
+    with pool.connection() as conn:
+        conn.execute(UPSERT_GOALS, (athlete, goals["calories"], goals["protein"], goals["carbs"],
+                                    goals["fat"], goals["mode"]))
+
+
+# ==========================================
+# final.py Data
+# ==========================================
+def load_data(pool, athlete, default_foods, default_goals, since=""):
+    """Return a final.py data dictionary for an athlete (meals on or after since)."""
+    with pool.connection() as conn:
+        row = conn.execute(SELECT_SEQ, ("seq:" + athlete,)).fetchone()
+    return {
+        "foods": load_foods(pool, default_foods),
+        "log": load_meals(pool, athlete, since),
+        "goals": load_goals(pool, athlete, default_goals),
+        "totals": totals_by_day(pool, athlete, since),
+        "seq": 0 if row is None else row[0]
+    }
+
+
+@metrics.timed("sqlite_store.save_change")
+def save_change(pool, athlete, record):
+    """Write one final.py change record (add_food(s), log_meal(s), set_goals, reset_log)."""
+    op = record["op"]
+    with pool.connection() as conn:
+        if op == "add_food":
+            conn.execute(INSERT_FOOD, _food_row(record["food"]))
+        elif op == "add_foods":
+            conn.executemany(INSERT_FOOD, [_food_row(food) for food in record["foods"]])
+        elif op == "log_meal":
+            _insert_meals(conn, athlete, [record["entry"]])
+        elif op == "log_meals":
+            _insert_meals(conn, athlete, record["entries"])
+        elif op == "set_goals":
+            goals = record["goals"]
+            conn.execute(UPSERT_GOALS, (athlete, goals["calories"], goals["protein"], goals["carbs"],
+                                        goals["fat"], goals["mode"]))
+        elif op == "reset_log" and "date" in record:
+            _delete_day(conn, athlete, record["date"])
+        elif op == "reset_log":
+            conn.execute(DELETE_MEALS, (athlete,))
+            conn.execute(DELETE_ROLLUPS, (athlete,))
+        conn.execute(UPSERT_SEQ, ("seq:" + athlete, record["seq"]))
+
+
+def save_data(pool, athlete, data, source=None):
+    """
+    Replace an athlete's meals and goals (and add missing foods) in one
+    transaction. source: mark that migration source as copied in the same
+    transaction.
+    """
+    with pool.connection() as conn:
+        conn.executemany(INSERT_FOOD, [_food_row(food) for food in data["foods"]])
+        conn.execute(DELETE_MEALS, (athlete,))
+        conn.execute(DELETE_ROLLUPS, (athlete,))
+        _insert_meals(conn, athlete, data["log"])
+        goals = data["goals"]
+        conn.execute(UPSERT_GOALS, (athlete, goals["calories"], goals["protein"], goals["carbs"],
+                                    goals["fat"], goals["mode"]))
+        conn.execute(UPSERT_SEQ, ("seq:" + athlete, data.get("seq", 0)))
+        if source is not None:
+            conn.execute(UPSERT_SEQ, (MIGRATED_KEY + source, 1))
+
+
+# ==========================================
+# Migration From the Files
+# ==========================================
+def migrated(pool, source):
+    """Return True if a migration source (see copy_meals) has been copied already."""
+    with pool.connection() as conn:
+        return conn.execute(SELECT_SEQ, (MIGRATED_KEY + source,)).fetchone() is not None
+
+
+def copy_meals(pool, source, athlete, batches, goals=None):
+    """
+    Copy the meals of one migration source (lists of final.py style log
+    entries, a batch at a time) and its goals into an athlete's data, in
+    one transaction that marks the source as copied. A source copied
+    before is skipped. Returns the number of meals copied.
+    """
+    count = 0
+    with pool.connection() as conn:
+        if conn.execute(SELECT_SEQ, (MIGRATED_KEY + source,)).fetchone() is not None:
+            return 0
+        for entries in batches:
+            _insert_meals(conn, athlete, entries)
+            count += len(entries)
+        if goals is not None:
+            conn.execute(UPSERT_GOALS, (athlete, goals["calories"], goals["protein"], goals["carbs"],
+                                        goals["fat"], goals["mode"]))
+        conn.execute(UPSERT_SEQ, (MIGRATED_KEY + source, 1))
+    return count
+
+
+def migrate(folder):
+    """
+    Copy the JSON / text data in folder into the SQLite databases; return
+    counts of what was copied (sources copied before are skipped).
+    """
+    # Imported here: both programs import this module
+    import final
+    import nutrition_planner
+    import partitions
+
+    old_dir = os.getcwd()
+    os.chdir(folder)
+    counts = {"foods": 0, "meals": 0, "athletes": 0}
+    try:
+        storage = final.STORAGE
+        final.STORAGE = "json"
+        pool = open_db(final.DATABASE)
+        try:
+            # final.py: nutrition_data.json plus its journal
+            if os.path.exists(final.DATA_FILE) and not migrated(pool, "data"):
+                data = final.load_data()
+                save_data(pool, DEFAULT_ATHLETE, data, "data")
+                counts["foods"] += len(data["foods"])
+                counts["meals"] += len(data["log"])
+
+            # Team storage shares the final.py database
+            athletes = partitions.list_athletes(final.TEAM_DIR)
+            if len(athletes) > 0:
+                add_foods(pool, partitions.load_foods(final.TEAM_DIR, final.DEFAULT_FOODS))
+            for athlete in athletes:
+                if migrated(pool, "team:" + athlete):
+                    continue
+                days = (partitions.read_day(final.TEAM_DIR, athlete, day)
+                        for day in partitions.list_days(final.TEAM_DIR, athlete))
+                goals = partitions.load_goals(final.TEAM_DIR, athlete, final.DEFAULT_GOALS)
+                counts["meals"] += copy_meals(pool, "team:" + athlete, athlete, days, goals)
+                counts["athletes"] += 1
+        finally:
+            final.STORAGE = storage
+            pool.close()
+
+        # nutrition_planner.py: food database, daily log and goals
+        counts_planner = nutrition_planner.migrate_to_sqlite()
+        counts["foods"] += counts_planner["foods"]
+        counts["meals"] += counts_planner["meals"]
+    finally:
+        os.chdir(old_dir)
+    return counts
+
+
+def main(args):
+    args = metrics.configure(args)
+    folder = "."
+    if len(args) > 0:
+        folder = args[0]
+    try:
+        counts = migrate(folder)
+    except (OSError, ValueError, KeyError, sqlite3.Error) as error:
+        print("Error: Could not migrate " + folder + ": " + str(error))
+        return 1
+    print("Migrated " + str(counts["foods"]) + " foods, " + str(counts["meals"]) + " meals and "
+          + str(counts["athletes"]) + " team athletes")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))